@@ -2,15 +2,21 @@
 
 from __future__ import print_function
 import numpy as np
-import tensorflow as tf
 import cv2
 
 DEBUG = False
 
+#Tensorflow is imported only when a CnnHeadPoseEstimator object is created
+tf = None
+
 
 class CnnHeadPoseEstimator:
 
     def __init__(self, YawFilePath, PitchFilePath):
+        global tf
+        if(tf is None):
+            import tensorflow
+            tf = tensorflow
         self._init_yaw_(YawFilePath)
         self._init_pitch_(PitchFilePath)
 
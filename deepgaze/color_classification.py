@@ -12,6 +12,50 @@ import numpy as np
 import cv2
 import sys
 
+#The flags of cv2.compareHist are read only once, OpenCV 2 keeps them in cv2.cv
+if hasattr(cv2, 'HISTCMP_INTERSECT'):
+    HISTCMP_METHODS = {"intersection": cv2.HISTCMP_INTERSECT, "correlation": cv2.HISTCMP_CORREL,
+                       "chisqr": cv2.HISTCMP_CHISQR, "bhattacharyya": cv2.HISTCMP_BHATTACHARYYA}
+else:
+    HISTCMP_METHODS = {"intersection": cv2.cv.CV_COMP_INTERSECT, "correlation": cv2.cv.CV_COMP_CORREL,
+                       "chisqr": cv2.cv.CV_COMP_CHISQR, "bhattacharyya": cv2.cv.CV_COMP_BHATTACHARYYA}
+
+#Methods where the lowest value is the best match
+DISTANCE_METHODS = ["chisqr", "bhattacharyya"]
+
+#Max number of elements of the temporary (queries x models x bins)
+#arrays used when computing the histogram intersection
+MAX_CHUNK_ELEMENTS = 2**18
+
+
+def _histogram_intersection(query_matrix, model_matrix):
+    """Return the intersection sum(min(q, m)) of all the pairs query-model (for internal use)
+
+    The minimum is computed on blocks of queries and models at once,
+    each block has at most MAX_CHUNK_ELEMENTS elements.
+    @param query_matrix float32 array of shape (Q, bins)
+    @param model_matrix float32 array of shape (M, bins)
+    @return a float64 array of shape (Q, M)
+    """
+    queries_number, bins = query_matrix.shape
+    models_number = model_matrix.shape[0]
+    comparison = np.zeros((queries_number, models_number))
+    if(queries_number == 0 or models_number == 0): return comparison
+    #Square blocks of pairs, the buffer of the minimum is reused
+    pairs_number = max(1, MAX_CHUNK_ELEMENTS // bins)
+    query_chunk = max(1, min(queries_number, int(np.sqrt(pairs_number))))
+    model_chunk = max(1, min(models_number, pairs_number // query_chunk))
+    minimum_buffer = np.empty((query_chunk, model_chunk, bins), dtype=np.float32)
+    for q_start in range(0, queries_number, query_chunk):
+        queries = query_matrix[q_start:q_start+query_chunk, np.newaxis, :]
+        for m_start in range(0, models_number, model_chunk):
+            models = model_matrix[np.newaxis, m_start:m_start+model_chunk, :]
+            minimum = minimum_buffer[0:queries.shape[0], 0:models.shape[1]]
+            np.minimum(queries, models, out=minimum)
+            np.sum(minimum, axis=2, dtype=np.float64, out=comparison[q_start:q_start+query_chunk, m_start:m_start+model_chunk])
+    return comparison
+
+
 class HistogramColorClassifier:
     """Classifier for comparing an image I with a model M. The comparison is based on color
     histograms. It included an implementation of the Histogram Intersection algorithm.
@@ -57,8 +101,152 @@ class HistogramColorClassifier:
         self.hist_size = hist_size
         self.hist_range = hist_range
         self.hist_type = hist_type
-        self.model_list = list()
+        #The histograms of the models are the first rows of a float32 matrix
+        #of shape (capacity, bins), the capacity is doubled when it is full
+        self.bins = int(np.prod(hist_size))
+        self.model_matrix = np.zeros((16, self.bins), dtype=np.float32)
+        self.model_number = 0
+        #name of the model in each row, and row of each name
         self.name_list = list()
+        self.name_dict = dict()
+        #Random projections of the models used by the approximate search
+        #(see buildApproximateIndex), None when the index is not built
+        self.projection_matrix = None
+        self.projected_matrix = None
+        #Quantities obtained from the models used by the comparison methods,
+        #computed when needed and cleared when the models change
+        self.model_cache = dict()
+
+    def _return_histogram(self, frame):
+        """Return the normalised and flattened histogram of a BGR frame.
+
+        @param frame the BGR frame
+        @return a float32 array of shape (bins)
+        """
+        if(self.hist_type=='HSV'): frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        elif(self.hist_type=='GRAY'): frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        elif(self.hist_type=='RGB'): frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        hist = cv2.calcHist([frame], self.channels, None, self.hist_size, self.hist_range)
+        return cv2.normalize(hist, hist).flatten()
+
+    def _return_model_cache(self, rows, key):
+        """Return a quantity obtained from the model histograms.
+
+        @param rows the rows of the models to return (a slice or an array of indices)
+        @param key one of 'sum', 'sum_square' (float64 vectors with one value per model),
+            'square' (float32 matrix) and 'sqrt' (float64 matrix)
+        @return the array, computed only if the models changed since the last call
+        """
+        if key not in self.model_cache:
+            models = self.model_matrix[0:self.model_number]
+            if(key == 'sum'): self.model_cache[key] = np.sum(models, axis=1, dtype=np.float64)
+            elif(key == 'sum_square'): self.model_cache[key] = np.sum(np.square(models), axis=1, dtype=np.float64)
+            elif(key == 'square'): self.model_cache[key] = np.square(models)
+            elif(key == 'sqrt'): self.model_cache[key] = np.sqrt(models, dtype=np.float64)
+        return self.model_cache[key][rows]
+
+    def _return_projection(self, hist_matrix):
+        """Return the random projection of the Hellinger transform of some histograms.
+
+        The Hellinger transform sqrt(h / sum(h)) gives unit vectors where the
+        dot product is the Bhattacharyya coefficient, the random projection
+        approximately preserves the distances between them.
+        @param hist_matrix an array of shape (H, bins)
+        @return a float32 array of shape (H, projection_size)
+        """
+        hist_sum = np.sum(hist_matrix, axis=1, dtype=np.float64, keepdims=True)
+        hellinger = np.sqrt(hist_matrix / np.where(hist_sum > 0, hist_sum, 1.0)).astype(np.float32)
+        return np.dot(hellinger, self.projection_matrix)
+
+    def buildApproximateIndex(self, projection_size=64, seed=0):
+        """Build the index used by returnTopMatches for the approximate search.
+
+        The models are projected on projection_size random directions after
+        the Hellinger transform. The index is updated when models are added
+        or removed, it is not necessary to build it again.
+        @param projection_size the number of random projections
+        @param seed the seed of the random projections
+        """
+        generator = np.random.default_rng(seed)
+        self.projection_matrix = (generator.standard_normal((self.bins, projection_size)) / np.sqrt(projection_size)).astype(np.float32)
+        self.projected_matrix = np.zeros((self.model_matrix.shape[0], projection_size), dtype=np.float32)
+        self.projected_matrix[0:self.model_number] = self._return_projection(self.model_matrix[0:self.model_number])
+
+    def returnModelMatrix(self):
+        """Return the histograms of all the models.
+
+        @return a float32 array of shape (number of models, bins)
+        """
+        return self.model_matrix[0:self.model_number]
+
+    def _make_writable(self):
+        """Copy the model matrix in memory if it is a read-only memory map (see loadModels).
+
+        """
+        if(self.model_matrix.flags.writeable == False):
+            self.model_matrix = np.array(self.model_matrix)
+
+    def _grow(self, rows):
+        """Reallocate the model matrix (and the projected matrix) with more rows.
+
+        @param rows the new number of rows
+        """
+        model_matrix = np.zeros((rows, self.bins), dtype=np.float32)
+        model_matrix[0:self.model_number] = self.model_matrix[0:self.model_number]
+        self.model_matrix = model_matrix
+        if(self.projected_matrix is not None):
+            projected_matrix = np.zeros((rows, self.projected_matrix.shape[1]), dtype=np.float32)
+            projected_matrix[0:self.model_number] = self.projected_matrix[0:self.model_number]
+            self.projected_matrix = projected_matrix
+
+    def saveModels(self, file_prefix):
+        """Save the models in two files which can be loaded with loadModels.
+
+        The histograms are saved in file_prefix.npy as a float32 matrix
+        of shape (number of models, bins). The names, the histogram parameters
+        and the approximate index (if built) are saved in file_prefix.npz.
+        @param file_prefix the path of the files without extension
+        """
+        np.save(file_prefix + '.npy', self.model_matrix[0:self.model_number])
+        arrays = dict(names=np.array(self.name_list, dtype=np.str_).reshape(-1),
+                      channels=np.array(self.channels), hist_size=np.array(self.hist_size),
+                      hist_range=np.array(self.hist_range), hist_type=np.array(self.hist_type))
+        if(self.projected_matrix is not None):
+            arrays['projection_matrix'] = self.projection_matrix
+            arrays['projected_matrix'] = self.projected_matrix[0:self.model_number]
+        np.savez(file_prefix + '.npz', **arrays)
+
+    def loadModels(self, file_prefix, mmap_mode='r'):
+        """Load the models saved with saveModels, replacing the current ones.
+
+        With the default mmap_mode the histograms are not read in memory,
+        the file is memory mapped in read-only mode and the processes which
+        load the same file share a single copy. The matrix is copied in
+        memory only when a model is added, replaced or removed.
+        @param file_prefix the path of the files without extension
+        @param mmap_mode the mmap_mode of np.load ('r' default, None to read the file in memory)
+        """
+        model_matrix = np.load(file_prefix + '.npy', mmap_mode=mmap_mode)
+        with np.load(file_prefix + '.npz') as arrays:
+            name_list = [str(name) for name in arrays['names']]
+            self.channels = arrays['channels'].tolist()
+            self.hist_size = arrays['hist_size'].tolist()
+            self.hist_range = arrays['hist_range'].tolist()
+            self.hist_type = str(arrays['hist_type'])
+            if('projection_matrix' in arrays):
+                self.projection_matrix = arrays['projection_matrix']
+                self.projected_matrix = arrays['projected_matrix']
+            else:
+                self.projection_matrix = None
+                self.projected_matrix = None
+        if(model_matrix.shape[0] != len(name_list)):
+            raise ValueError('[DEEPGAZE] color_classification.py: the number of models in ' + file_prefix + '.npy is different from the number of names.')
+        self.bins = int(np.prod(self.hist_size))
+        self.model_matrix = model_matrix
+        self.model_number = len(name_list)
+        self.name_list = name_list
+        self.name_dict = dict((name, row) for row, name in enumerate(name_list))
+        self.model_cache.clear()
 
     def addModelHistogram(self, model_frame, name=''):
         """Add the histogram to internal container. If the name of the object
@@ -69,34 +257,56 @@ class HistogramColorClassifier:
         @param name a string representing the name of the model.
             If nothing is specified then the name will be the index of the element.
         """
-        if(self.hist_type=='HSV'): model_frame = cv2.cvtColor(model_frame, cv2.COLOR_BGR2HSV)
-        elif(self.hist_type=='GRAY'): model_frame = cv2.cvtColor(model_frame, cv2.COLOR_BGR2GRAY)
-        elif(self.hist_type=='RGB'): model_frame = cv2.cvtColor(model_frame, cv2.COLOR_BGR2RGB)
-        hist = cv2.calcHist([model_frame], self.channels, None, self.hist_size, self.hist_range)
-        hist = cv2.normalize(hist, hist).flatten()
-        if name == '': name = str(len(self.model_list))
-        if name not in self.name_list:
-            self.model_list.append(hist)
+        hist = self._return_histogram(model_frame)
+        if name == '': name = str(self.model_number)
+        self._make_writable()
+        if name not in self.name_dict:
+            if(self.model_number == self.model_matrix.shape[0]):
+                self._grow(max(1, 2 * self.model_matrix.shape[0]))
+            row = self.model_number
+            self.model_number += 1
             self.name_list.append(name)
+            self.name_dict[name] = row
         else:
-            for i in range(len(self.name_list)):
-                if self.name_list[i] == name:
-                    self.model_list[i] = hist
-                    break
+            row = self.name_dict[name]
+        self.model_matrix[row] = hist
+        if(self.projected_matrix is not None):
+            self.projected_matrix[row] = self._return_projection(hist[np.newaxis, :])[0]
+        self.model_cache.clear()
 
-    def removeModelHistogramByName(self, name):
+    def removeModelHistogramByName(self, name, keep_order=False):
         """Remove the specific model using the name as index.
 
+        By default the last model is moved in the row of the removed one,
+        the removal does not depend on the number of models but the index
+        of that model changes (see returnNameList). With keep_order=True the
+        following models are shifted up by one row, so the order of the
+        models (and of the values returned by the comparison functions) is
+        the same of the insertion, the cost grows with the number of models.
         @param: name the index of the element to remove
+        @param: keep_order if True the order of the models is preserved (default False)
         @return: True if the object has been deleted, otherwise False.
         """
-        if name not in self.name_list:
+        if name not in self.name_dict:
             return False
-        for i in range(len(self.name_list)):
-            if self.name_list[i] == name:
-                del self.name_list[i]
-                del self.model_list[i]
-                return True
+        self._make_writable()
+        row = self.name_dict.pop(name)
+        last = self.model_number - 1
+        if(keep_order == True):
+            self.model_matrix[row:last] = self.model_matrix[row+1:last+1]
+            if(self.projected_matrix is not None): self.projected_matrix[row:last] = self.projected_matrix[row+1:last+1]
+            del self.name_list[row]
+            self.name_dict.update(zip(self.name_list[row:last], range(row, last)))
+        else:
+            if(row != last):
+                self.model_matrix[row] = self.model_matrix[last]
+                if(self.projected_matrix is not None): self.projected_matrix[row] = self.projected_matrix[last]
+                self.name_list[row] = self.name_list[last]
+                self.name_dict[self.name_list[row]] = row
+            self.name_list.pop()
+        self.model_number -= 1
+        self.model_cache.clear()
+        return True
 
     def returnHistogramComparison(self, hist_1, hist_2, method='intersection'):
         """Return the comparison value of two histograms.
@@ -107,28 +317,60 @@ class HistogramColorClassifier:
         @param method the comparison method.
             intersection: (default) the histogram intersection (Swain, Ballard)
         """
-        if cv2.__version__.split(".")[0] == '3':
-            if(method=="intersection"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.HISTCMP_INTERSECT)
-            elif(method=="correlation"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.HISTCMP_CORREL)
-            elif(method=="chisqr"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.HISTCMP_CHISQR)
-            elif(method=="bhattacharyya"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.HISTCMP_BHATTACHARYYA)
-            else:
-                raise ValueError('[DEEPGAZE] color_classification.py: the method specified ' + str(method) + ' is not supported.')
+        if method not in HISTCMP_METHODS:
+            raise ValueError('[DEEPGAZE] color_classification.py: the method specified ' + str(method) + ' is not supported.')
+        return cv2.compareHist(hist_1, hist_2, HISTCMP_METHODS[method])
+
+    def _compare_histograms(self, query_matrix, method='intersection', rows=None):
+        """Return the comparison values between some histograms and all the models.
+
+        The values are the same returned by cv2.compareHist(query, model, method)
+        but they are computed for all the pairs at once with matrix operations.
+        @param query_matrix an array of shape (Q, bins) containing the query histograms
+        @param method the comparison method.
+            intersection: (default) the histogram intersection (Swain, Ballard)
+            correlation, chisqr, bhattacharyya: the other methods of cv2.compareHist
+        @param rows the rows of the models to compare (default all the models)
+        @return an array of shape (Q, M) containing the comparison values
+        """
+        if(rows is None): rows = slice(0, self.model_number)
+        models = self.model_matrix[0:self.model_number][rows]
+        query_matrix = np.asarray(query_matrix, dtype=np.float32)
+        if(method=="intersection"):
+            #sum(min(q, m)) on blocks of queries and models to limit the memory
+            comparison = _histogram_intersection(query_matrix, models)
+        elif(method=="correlation"):
+            #sum((q - mean_q)(m - mean_m)) / sqrt(sum((q - mean_q)^2) sum((m - mean_m)^2))
+            #where sum((q - mean_q)(m - mean_m)) = sum(q m) - sum(q) sum(m) / bins
+            query_sum = np.sum(query_matrix, axis=1, dtype=np.float64)
+            query_sum_square = np.sum(np.square(query_matrix), axis=1, dtype=np.float64)
+            numerator = np.dot(query_matrix, models.T).astype(np.float64)
+            numerator -= np.outer(query_sum, self._return_model_cache(rows, 'sum')) / self.bins
+            denominator = np.outer(query_sum_square - np.square(query_sum) / self.bins,
+                                   self._return_model_cache(rows, 'sum_square') - np.square(self._return_model_cache(rows, 'sum')) / self.bins)
+            valid = np.absolute(denominator) > np.finfo(np.float64).eps
+            comparison = np.ones(denominator.shape)
+            comparison[valid] = numerator[valid] / np.sqrt(denominator[valid])
+        elif(method=="chisqr"):
+            #sum((q - m)^2 / q) on the bins where q != 0, expanded as
+            #sum(q) - 2 sum(m) + sum(m^2 / q) to use matrix products
+            nonzero = np.absolute(query_matrix) > np.finfo(np.float64).eps
+            query_inverse = np.zeros(query_matrix.shape, dtype=np.float32)
+            np.divide(1.0, query_matrix, out=query_inverse, where=nonzero)
+            comparison = np.sum(query_matrix, axis=1, dtype=np.float64)[:, np.newaxis] \
+                - 2.0 * np.dot(nonzero.astype(np.float32), models.T) \
+                + np.dot(query_inverse, self._return_model_cache(rows, 'square').T)
+        elif(method=="bhattacharyya"):
+            #sqrt(1 - sum(sqrt(q m)) / sqrt(sum(q) sum(m))), in double precision
+            #because the square root amplifies the error when the histograms are similar
+            coefficient = np.dot(np.sqrt(query_matrix, dtype=np.float64), self._return_model_cache(rows, 'sqrt').T)
+            normalization = np.outer(np.sum(query_matrix, axis=1, dtype=np.float64), self._return_model_cache(rows, 'sum'))
+            valid = np.absolute(normalization) > np.finfo(np.float32).eps
+            normalization[valid] = 1.0 / np.sqrt(normalization[valid])
+            normalization[~valid] = 1.0
+            comparison = np.sqrt(np.maximum(1.0 - coefficient * normalization, 0.0))
         else:
-            if(method=="intersection"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.cv.CV_COMP_INTERSECT)
-            elif(method=="correlation"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.cv.CV_COMP_CORREL)
-            elif(method=="chisqr"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.cv.CV_COMP_CHISQR)
-            elif(method=="bhattacharyya"):
-                comparison = cv2.compareHist(hist_1, hist_2, cv2.cv.CV_COMP_BHATTACHARYYA)
-            else:
-                raise ValueError('[DEEPGAZE] color_classification.py: the method specified ' + str(method) + ' is not supported.')
+            raise ValueError('[DEEPGAZE] color_classification.py: the method specified ' + str(method) + ' is not supported.')
         return comparison
 
     def returnHistogramComparisonArray(self, image, method='intersection'):
@@ -140,17 +382,23 @@ class HistogramColorClassifier:
             intersection: (default) the histogram intersection (Swain, Ballard)
         @return a numpy array containg the comparison value between each pair image-model
         """
-        if(self.hist_type=='HSV'): image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        elif(self.hist_type=='GRAY'): image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        elif(self.hist_type=='RGB'): image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        comparison_array = np.zeros(len(self.model_list))
-        image_hist = cv2.calcHist([image], self.channels, None, self.hist_size, self.hist_range)
-        image_hist = cv2.normalize(image_hist, image_hist).flatten()
-        counter = 0
-        for model_hist in self.model_list:
-            comparison_array[counter] = self.returnHistogramComparison(image_hist, model_hist, method=method)
-            counter += 1
-        return comparison_array
+        image_hist = self._return_histogram(image)
+        return self._compare_histograms(image_hist[np.newaxis, :], method=method)[0]
+
+    def returnHistogramComparisonMatrix(self, image_list, method='intersection'):
+        """Return the comparison matrix between all the models and a batch of images.
+
+        Row i of the matrix is the same array returned by
+        returnHistogramComparisonArray for the i-th image.
+        @param image_list a list of images to compare
+        @param method the comparison method.
+            intersection: (default) the histogram intersection (Swain, Ballard)
+        @return a numpy array of shape (number of images, number of models)
+        """
+        query_matrix = np.zeros((len(image_list), self.bins), dtype=np.float32)
+        for i, image in enumerate(image_list):
+            query_matrix[i] = self._return_histogram(image)
+        return self._compare_histograms(query_matrix, method=method)
 
     def returnHistogramComparisonProbability(self, image, method='intersection'):
         """Return the probability distribution of the comparison between 
@@ -191,6 +439,153 @@ class HistogramColorClassifier:
         arg_max = np.argmax(comparison_array)
         return self.name_list[arg_max]
 
+    def returnTopMatches(self, image, k=5, method='intersection', approximate=False, candidates_number=500):
+        """Return the k models which best match the image.
+
+        With approximate=True the index built with buildApproximateIndex
+        selects the candidates_number models closest to the image in the
+        projected Hellinger space, only these candidates are compared with
+        the given method. The search is approximate but it does not depend
+        on the number of bins of the histograms.
+        @param image the image to compare
+        @param k the number of models to return
+        @param method the comparison method.
+            intersection: (default) the histogram intersection (Swain, Ballard)
+            correlation, chisqr, bhattacharyya: the other methods of cv2.compareHist
+        @param approximate if True the approximate index is used
+        @param candidates_number the number of candidates compared with the method (approximate only)
+        @return a list of names and a numpy array with the comparison values, from the best match
+        """
+        image_hist = self._return_histogram(image)
+        rows = None
+        if(approximate == True):
+            if(self.projected_matrix is None):
+                raise ValueError('[DEEPGAZE] color_classification.py: the approximate index has not been built, call buildApproximateIndex() first.')
+            if(candidates_number < self.model_number):
+                projected_hist = self._return_projection(image_hist[np.newaxis, :])
+                distance = np.sum(np.square(self.projected_matrix[0:self.model_number] - projected_hist), axis=1)
+                rows = np.argpartition(distance, candidates_number-1)[0:candidates_number]
+        comparison_array = self._compare_histograms(image_hist[np.newaxis, :], method=method, rows=rows)[0]
+        #Sorting key where the lowest value is the best match
+        key = comparison_array if method in DISTANCE_METHODS else -comparison_array
+        k = min(k, comparison_array.shape[0])
+        if(k <= 0): return list(), np.zeros(0)
+        best = np.argpartition(key, k-1)[0:k]
+        best = best[np.argsort(key[best])]
+        best_rows = best if rows is None else rows[best]
+        return [self.name_list[row] for row in best_rows], comparison_array[best]
+
+    def _return_bin_image(self, frame):
+        """Return the histogram bin of each pixel of a BGR frame.
+
+        The bins are the same used by cv2.calcHist in _return_histogram,
+        the pixels outside hist_range get the value -1.
+        @param frame the BGR frame
+        @return an int32 array of shape (rows, cols)
+        """
+        if(self.hist_type=='HSV'): frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        elif(self.hist_type=='GRAY'): frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        elif(self.hist_type=='RGB'): frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if(frame.ndim == 2): frame = frame[:, :, np.newaxis]
+        bin_image = np.zeros(frame.shape[0:2], dtype=np.int32)
+        valid = np.ones(frame.shape[0:2], dtype=bool)
+        for i, channel in enumerate(self.channels):
+            low = self.hist_range[2*i]
+            high = self.hist_range[2*i+1]
+            scale = self.hist_size[i] / float(high - low)
+            if(frame.dtype == np.uint8):
+                #uniform bins of cv2.calcHist, evaluated on the 256 values
+                channel_bin = np.floor(np.arange(256) * scale - low * scale).astype(np.int32)[frame[:, :, channel]]
+            else:
+                channel_bin = np.floor(frame[:, :, channel] * scale - low * scale).astype(np.int32)
+            valid &= (channel_bin >= 0) & (channel_bin < self.hist_size[i])
+            bin_image *= self.hist_size[i]
+            bin_image += channel_bin
+        bin_image[~valid] = -1
+        return bin_image
+
+    def returnBestMatchMap(self, image, window_size=(64, 64), step=16, method='intersection'):
+        """Return the best match between each window of the image and the internal models.
+
+        The windows of size window_size are taken every step pixels.
+        An integral histogram is built once on the grid of the window
+        borders, the histogram of each window is then obtained with four
+        lookups, normalised as in _return_histogram and compared with all
+        the models. It is equivalent to calling returnHistogramComparisonArray
+        on each window, without computing the histograms from scratch.
+        @param image the image to classify
+        @param window_size the (width, height) of the windows
+        @param step the distance in pixels between two windows, an integer or a (x_step, y_step) tuple
+        @param method the comparison method.
+            intersection: (default) the histogram intersection (Swain, Ballard)
+            correlation, chisqr, bhattacharyya: the other methods of cv2.compareHist
+        @return the index map and the value map of shape (windows rows, windows cols),
+            window (i,j) starts at pixel (j*x_step, i*y_step). The names of the
+            indices are in returnNameList().
+        """
+        window_width, window_height = window_size
+        x_step, y_step = (step, step) if np.isscalar(step) else step
+        bin_image = self._return_bin_image(image)
+        rows, cols = bin_image.shape
+        if(window_width > cols or window_height > rows or window_width <= 0 or window_height <= 0):
+            raise ValueError('[DEEPGAZE] color_classification.py: the window size must be positive and not larger than the image.')
+        x_start = np.arange(0, cols - window_width + 1, x_step)
+        y_start = np.arange(0, rows - window_height + 1, y_step)
+        #Grid of the window borders, the cells between the borders
+        #are the elements of the integral histogram
+        x_border = np.union1d(x_start, x_start + window_width)
+        y_border = np.union1d(y_start, y_start + window_height)
+        cell_x = np.searchsorted(x_border, np.arange(cols), side='right') - 1
+        cell_y = np.searchsorted(y_border, np.arange(rows), side='right') - 1
+        cells_x_number = len(x_border) - 1
+        cells_y_number = len(y_border) - 1
+        #The pixels after the last border do not belong to any window
+        valid = (bin_image >= 0) & (cell_x < cells_x_number)[np.newaxis, :] & (cell_y < cells_y_number)[:, np.newaxis]
+        cell_index = (cell_y[:, np.newaxis] * cells_x_number + cell_x[np.newaxis, :]) * self.bins + bin_image
+        cell_hist = np.bincount(cell_index[valid], minlength=cells_y_number*cells_x_number*self.bins)
+        integral_hist = np.zeros((cells_y_number+1, cells_x_number+1, self.bins), dtype=np.int32)
+        integral_hist[1:, 1:] = np.cumsum(np.cumsum(cell_hist.reshape(cells_y_number, cells_x_number, self.bins), axis=0), axis=1)
+        x_0 = np.searchsorted(x_border, x_start)
+        x_1 = np.searchsorted(x_border, x_start + window_width)
+        y_0 = np.searchsorted(y_border, y_start)
+        y_1 = np.searchsorted(y_border, y_start + window_height)
+        index_map = np.zeros((len(y_start), len(x_start)), dtype=np.intp)
+        value_map = np.zeros((len(y_start), len(x_start)))
+        if(self.model_number == 0):
+            raise ValueError('[DEEPGAZE] color_classification.py: there are no models to compare with the windows.')
+        #The window histograms are computed on chunks of window rows and
+        #compared with chunks of models, the best match is updated after
+        #each chunk of models so that both the arrays are limited in memory
+        windows_x_number = len(x_start)
+        chunk = max(1, MAX_CHUNK_ELEMENTS // (windows_x_number * self.bins))
+        for start in range(0, len(y_start), chunk):
+            y_0_chunk = y_0[start:start+chunk, np.newaxis]
+            y_1_chunk = y_1[start:start+chunk, np.newaxis]
+            window_hist = integral_hist[y_1_chunk, x_1] - integral_hist[y_0_chunk, x_1] \
+                - integral_hist[y_1_chunk, x_0] + integral_hist[y_0_chunk, x_0]
+            window_hist = window_hist.reshape(-1, self.bins).astype(np.float32)
+            #L2 normalisation (as cv2.normalize)
+            norm = np.sqrt(np.sum(np.square(window_hist), axis=1, dtype=np.float64, keepdims=True))
+            window_hist /= np.where(norm > 0, norm, 1.0).astype(np.float32)
+            windows_number = window_hist.shape[0]
+            model_chunk = max(1, MAX_CHUNK_ELEMENTS // windows_number)
+            best_index = np.zeros(windows_number, dtype=np.intp)
+            best_value = np.full(windows_number, np.inf if method in DISTANCE_METHODS else -np.inf)
+            for model_start in range(0, self.model_number, model_chunk):
+                rows = slice(model_start, min(model_start + model_chunk, self.model_number))
+                comparison = self._compare_histograms(window_hist, method=method, rows=rows)
+                if method in DISTANCE_METHODS: best = np.argmin(comparison, axis=1)
+                else: best = np.argmax(comparison, axis=1)
+                value = comparison[np.arange(windows_number), best]
+                #Strict comparison, on ties the first model is kept as in argmax
+                if method in DISTANCE_METHODS: better = value < best_value
+                else: better = value > best_value
+                best_index[better] = best[better] + model_start
+                best_value[better] = value[better]
+            index_map[start:start+chunk] = best_index.reshape(-1, windows_x_number)
+            value_map[start:start+chunk] = best_value.reshape(-1, windows_x_number)
+        return index_map, value_map
+
     def returnNameList(self):
         """Return a list containing all the names stored in the model.
 
@@ -203,5 +598,5 @@ class HistogramColorClassifier:
 
         @return: an integer representing the number of elements stored
         """
-        return len(self.model_list)
+        return self.model_number
 
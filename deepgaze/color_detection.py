@@ -12,6 +12,62 @@ import numpy as np
 import cv2
 import sys
 
+
+def _return_hs_index(frame_hsv):
+    """Return the index H + 256*S of each pixel of an HSV frame.
+
+    The index is a uint16 view of the first two bytes of each pixel,
+    so it does not need any copy.
+    @param frame_hsv a C-contiguous HSV frame (uint8)
+    @return a uint16 array with the shape of the frame (rows, cols)
+    """
+    return np.ndarray(shape=frame_hsv.shape[0:2], dtype='<u2', buffer=frame_hsv,
+                      strides=(frame_hsv.strides[0], frame_hsv.strides[1]))
+
+
+def _return_hs_lut(template_hist, threshold):
+    """Return the binary lookup table of a normalised H/S histogram.
+
+    The table is indexed by H + 256*S and contains 255 where the
+    backprojection of the histogram is higher than the threshold.
+    @param template_hist the normalised histogram (H rows, S columns)
+    @param threshold the threshold applied to the backprojection
+    @return the flat lookup table with 65536 uint8 elements
+    """
+    #The backprojection is the histogram value rounded and saturated to uint8
+    backprojection = np.clip(np.rint(template_hist), 0, 255)
+    lut = np.zeros((256, 256), dtype=np.uint8)
+    lut[:, 0:backprojection.shape[0]] = np.where(backprojection.T > threshold, 255, 0)
+    return lut.ravel()
+
+
+def _return_kernels(kernel_dict, kernel_size):
+    """Return the kernels used for the convolution and the morph opening.
+
+    The kernels are created once for each kernel_size and stored in kernel_dict.
+    @param kernel_dict the dictionary of the kernels of a detector
+    @param kernel_size is the kernel dimension
+    @return the elliptic kernel and the square kernel
+    """
+    if kernel_size not in kernel_dict:
+        kernel_dict[kernel_size] = (cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size,kernel_size)),
+                                    np.ones((kernel_size,kernel_size), np.uint8))
+    return kernel_dict[kernel_size]
+
+
+def _return_buffer(buffer_dict, name, shape):
+    """Return a uint8 buffer of a detector, allocated only when the shape changes.
+
+    @param buffer_dict the dictionary of the buffers of a detector
+    @param name the name of the buffer
+    @param shape the shape of the buffer
+    @return the buffer
+    """
+    if name not in buffer_dict or buffer_dict[name].shape != shape:
+        buffer_dict[name] = np.empty(shape, dtype=np.uint8)
+    return buffer_dict[name]
+
+
 class BackProjectionColorDetector:
     """Implementation of the Histogram Backprojection algorithm.
 
@@ -33,16 +89,27 @@ class BackProjectionColorDetector:
 
     """
         self.template_hsv = None
+        self.template_hist = None
+        #Kernels for each kernel_size, lookup tables for
+        #each threshold and buffers reused between frames
+        self.kernel_dict = dict()
+        self.lut_dict = dict()
+        self.buffer_dict = dict()
 
     def setTemplate(self, frame):
         """Set the BGR image used as template during the pixel selection
  
         The template can be a spedific region of interest of the main
         frame or a representative color scheme to identify. the template
-        is internally stored as an HSV image.
+        is internally stored as an HSV image. The normalised histogram of the
+        template is computed here only once.
         @param frame the template to use in the algorithm
         """      
         self.template_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        #Set the template histogram and normalize it
+        self.template_hist = cv2.calcHist([self.template_hsv],[0, 1], None, [180, 256], [0, 180, 0, 256] )
+        cv2.normalize(self.template_hist, self.template_hist, 0, 255, cv2.NORM_MINMAX)
+        self.lut_dict = dict()
 
     def getTemplate(self):
         """Get the BGR image used as template during the pixel selection
@@ -55,50 +122,86 @@ class BackProjectionColorDetector:
         else:
             return cv2.cvtColor(self.template_hsv, cv2.COLOR_HSV2BGR)
 
-    def returnFiltered(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1):
+    def returnFiltered(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1, dst=None):
         """Given an input frame in BGR return the filtered version.
  
         @param frame the original frame (color)
         @param morph_opening it is a erosion followed by dilatation to remove noise
         @param blur to smoth the image it is possible to apply Gaussian Blur
         @param kernel_size is the kernel dimension used for morph and blur
+        @param dst optional uint8 array with the shape of frame where the output is written
         """
         if(self.template_hsv is None): return None
-        #Get the mask from the internal function
-        frame_threshold = self.returnMask(frame, morph_opening=morph_opening, blur=blur, kernel_size=kernel_size, iterations=iterations)
-        #Return the AND image
-        return cv2.bitwise_and(frame, frame_threshold)
+        #Get the single channel mask from the internal function
+        frame_threshold = self.returnMask(frame, morph_opening=morph_opening, blur=blur, kernel_size=kernel_size, iterations=iterations,
+                                          single_channel=True, dst=_return_buffer(self.buffer_dict, 'mask', frame.shape[0:2]))
+        #Return the AND image, the pixels outside the mask are not written in dst
+        if(dst is not None): dst.fill(0)
+        return cv2.bitwise_and(frame, frame, dst=dst, mask=frame_threshold)
 
-    def returnMask(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1):
+    def returnMask(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1, single_channel=False, dst=None):
         """Given an input frame in BGR return the black/white mask.
- 
+
+        The intermediate images are stored in internal buffers which are
+        reused for frames of the same size. If dst is given the mask is
+        written there, and a stream of frames does not allocate any memory.
         @param frame the original frame (color)
         @param morph_opening it is a erosion followed by dilatation to remove noise
         @param blur to smoth the image it is possible to apply Gaussian Blur
         @param kernel_size is the kernel dimension used for morph and blur
+        @param single_channel if True the mask has shape (rows, cols) instead of (rows, cols, 3)
+        @param dst optional uint8 array with the shape of the mask where the mask is written
         """
         if(self.template_hsv is None): return None
+        kernel_ellipse, kernel_square = _return_kernels(self.kernel_dict, kernel_size)
+        frame_hsv = _return_buffer(self.buffer_dict, 'hsv', frame.shape)
+        frame_back = _return_buffer(self.buffer_dict, 'back', frame.shape[0:2])
+        frame_clean = _return_buffer(self.buffer_dict, 'clean', frame.shape[0:2])
         #Convert the input framge from BGR -> HSV
-        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        #Set the template histogram
-        template_hist = cv2.calcHist([self.template_hsv],[0, 1], None, [180, 256], [0, 180, 0, 256] )
-        #Normalize the template histogram and apply backprojection
-        cv2.normalize(template_hist, template_hist, 0, 255, cv2.NORM_MINMAX)
-        frame_hsv = cv2.calcBackProject([frame_hsv], [0,1], template_hist, [0,180,0,256], 1)
-        #Get the kernel and apply a convolution
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size,kernel_size))
-        frame_hsv = cv2.filter2D(frame_hsv, -1, kernel)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=frame_hsv)
+        #Apply the backprojection using the cached template histogram
+        cv2.calcBackProject([frame_hsv], [0,1], self.template_hist, [0,180,0,256], 1, dst=frame_back)
+        #Apply a convolution with the elliptic kernel
+        cv2.filter2D(frame_back, -1, kernel_ellipse, dst=frame_clean)
         #Applying the morph open operation (erosion followed by dilation)
         if(morph_opening==True):
-            kernel = np.ones((kernel_size,kernel_size), np.uint8)
-            frame_hsv = cv2.morphologyEx(frame_hsv, cv2.MORPH_OPEN, kernel, iterations=iterations)
+            cv2.morphologyEx(frame_clean, cv2.MORPH_OPEN, kernel_square, dst=frame_back, iterations=iterations)
+            frame_back, frame_clean = frame_clean, frame_back
         #Applying Gaussian Blur
         if(blur==True): 
-            frame_hsv = cv2.GaussianBlur(frame_hsv, (kernel_size,kernel_size), 0)
+            cv2.GaussianBlur(frame_clean, (kernel_size,kernel_size), 0, dst=frame_back)
+            frame_back, frame_clean = frame_clean, frame_back
         #Get the threshold
-        ret, frame_threshold = cv2.threshold(frame_hsv, 50, 255, 0)
+        if(single_channel == True):
+            return cv2.threshold(frame_clean, 50, 255, 0, dst=dst)[1]
+        cv2.threshold(frame_clean, 50, 255, 0, dst=frame_back)
         #Merge the threshold matrices
-        return cv2.merge((frame_threshold,frame_threshold,frame_threshold))
+        return cv2.merge((frame_back,frame_back,frame_back), dst=dst)
+
+    def returnMaskLUT(self, frame, threshold=50, single_channel=False, dst=None):
+        """Given an input frame in BGR return the black/white mask using a lookup table.
+
+        The backprojection and the threshold are replaced by a single lookup
+        in a binary table indexed by the H and S values of each pixel. The
+        table is computed once for each threshold. The convolution, the
+        morph opening and the blur are not applied, the result is the
+        raw thresholded backprojection of the frame.
+        @param frame the original frame (color)
+        @param threshold a pixel is selected if its backprojection is higher than this value
+        @param single_channel if True the mask has shape (rows, cols) instead of (rows, cols, 3)
+        @param dst optional uint8 array with the shape of the mask where the mask is written
+        """
+        if(self.template_hsv is None): return None
+        if threshold not in self.lut_dict:
+            self.lut_dict[threshold] = _return_hs_lut(self.template_hist, threshold)
+        frame_hsv = _return_buffer(self.buffer_dict, 'hsv', frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=frame_hsv)
+        if(single_channel == True):
+            if(dst is None): dst = np.empty(frame.shape[0:2], dtype=np.uint8)
+            return np.take(self.lut_dict[threshold], _return_hs_index(frame_hsv), out=dst)
+        mask = _return_buffer(self.buffer_dict, 'back', frame.shape[0:2])
+        np.take(self.lut_dict[threshold], _return_hs_index(frame_hsv), out=mask)
+        return cv2.merge((mask,mask,mask), dst=dst)
 
 class MultiBackProjectionColorDetector:
     """Implementation of the Histogram Backprojection algorithm with multi-template.
@@ -109,6 +212,9 @@ class MultiBackProjectionColorDetector:
     different part of an object. Multiple version of the Backprojection algorithm
     are then run at the same time and the filtered output added togheter. The result
     of this process is much robust (but slower) than the standard class.
+    In the fused mode (opt-in) the templates are merged in a single histogram (the
+    maximum of the normalised histograms), then a single backprojection and
+    filtering is used for all the templates.
     """
 
     def __init__(self):
@@ -116,17 +222,35 @@ class MultiBackProjectionColorDetector:
 
     """
         self.template_hsv_list = list()
+        self.template_hist_list = list()
+        self.fused_hist = None
+        #Kernels for each kernel_size, lookup tables for
+        #each threshold and buffers reused between frames
+        self.kernel_dict = dict()
+        self.lut_dict = dict()
+        self.buffer_dict = dict()
 
     def setTemplateList(self, frame_list):
         """Set the BGR image list used as container for the templates
  
         The template can be a spedific region of interest of the main
         frame or a representative color scheme to identify. the template
-        is internally stored as an HSV image.
+        is internally stored as an HSV image. The normalised histograms
+        of the templates and their fusion are computed here only once.
         @param frame the template to use in the algorithm
         """ 
         for frame in frame_list:    
-            self.template_hsv_list.append(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+            template_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            #Set the template histogram and normalize it
+            template_hist = cv2.calcHist([template_hsv],[0, 1], None, [256, 256], [0, 256, 0, 256] )
+            cv2.normalize(template_hist, template_hist, 0, 255, cv2.NORM_MINMAX)
+            self.template_hsv_list.append(template_hsv)
+            self.template_hist_list.append(template_hist)
+        #The backprojection of the fused histogram is the
+        #maximum of the backprojections of the templates
+        if(len(self.template_hist_list) > 0):
+            self.fused_hist = np.maximum.reduce(self.template_hist_list)
+        self.lut_dict = dict()
 
     def getTemplateList(self):
         """Get the BGR image list used as container for the templates
@@ -139,59 +263,120 @@ class MultiBackProjectionColorDetector:
             output_list.append(cv2.cvtColor(frame, cv2.COLOR_HSV2BGR))
         return output_list
 
-    def returnFiltered(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1):
+    def _return_template_mask(self, frame_hsv, template_hist, morph_opening, blur, kernel_size, iterations, dst=None):
+        """Return the single channel threshold of a template histogram.
+
+        The threshold is stored in dst or in an internal buffer.
+        @param frame_hsv the frame in HSV
+        @param template_hist the normalised histogram of the template
+        @param morph_opening it is a erosion followed by dilatation to remove noise
+        @param blur to smoth the image it is possible to apply Gaussian Blur
+        @param kernel_size is the kernel dimension used for morph and blur
+        @param dst optional single channel uint8 array where the threshold is written
+        """
+        kernel_ellipse, kernel_square = _return_kernels(self.kernel_dict, kernel_size)
+        frame_back = _return_buffer(self.buffer_dict, 'back', frame_hsv.shape[0:2])
+        frame_clean = _return_buffer(self.buffer_dict, 'clean', frame_hsv.shape[0:2])
+        #Apply the backprojection
+        cv2.calcBackProject([frame_hsv], [0,1], template_hist, [0,256,0,256], 1, dst=frame_back)
+        #Apply a convolution with the elliptic kernel
+        cv2.filter2D(frame_back, -1, kernel_ellipse, dst=frame_clean)
+        #Applying the morph open operation (erosion followed by dilation)
+        if(morph_opening==True):
+            cv2.morphologyEx(frame_clean, cv2.MORPH_OPEN, kernel_square, dst=frame_back, iterations=iterations)
+            frame_back, frame_clean = frame_clean, frame_back
+        #Applying Gaussian Blur
+        if(blur==True): 
+            cv2.GaussianBlur(frame_clean, (kernel_size,kernel_size), 0, dst=frame_back)
+            frame_back, frame_clean = frame_clean, frame_back
+        #Get the threshold
+        if(dst is None): dst = frame_back
+        return cv2.threshold(frame_clean, 50, 255, 0, dst=dst)[1]
+
+    def returnFiltered(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1, fused=False, dst=None):
         """Given an input frame in BGR return the filtered version.
  
         @param frame the original frame (color)
         @param morph_opening it is a erosion followed by dilatation to remove noise
         @param blur to smoth the image it is possible to apply Gaussian Blur
         @param kernel_size is the kernel dimension used for morph and blur
+        @param fused if True a single backprojection of the fused histogram is used
+        @param dst optional uint8 array with the shape of frame where the output is written
         """
         if(len(self.template_hsv_list) == 0): return None
-        #Get the mask from the internal function
-        frame_threshold = self.returnMask(frame, morph_opening=morph_opening, blur=blur, kernel_size=kernel_size, iterations=iterations)
-        #Return the AND image
-        return cv2.bitwise_and(frame, frame_threshold)
+        #Get the single channel mask from the internal function
+        frame_threshold = self.returnMask(frame, morph_opening=morph_opening, blur=blur, kernel_size=kernel_size, iterations=iterations,
+                                          fused=fused, single_channel=True, dst=_return_buffer(self.buffer_dict, 'mask', frame.shape[0:2]))
+        #Return the AND image, the pixels outside the mask are not written in dst
+        if(dst is not None): dst.fill(0)
+        return cv2.bitwise_and(frame, frame, dst=dst, mask=frame_threshold)
 
-    def returnMask(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1):
+    def returnMask(self, frame, morph_opening=True, blur=True, kernel_size=5, iterations=1, fused=False, single_channel=False, dst=None):
         """Given an input frame in BGR return the black/white mask.
- 
+
+        By default the backprojection, the filtering and the threshold are
+        done for each template and the thresholds are merged with a bitwise OR.
+        In the fused mode the backprojection of the fused histogram is the
+        maximum of the backprojections of all the templates, and the filtering
+        is done only once. The cost does not depend on the number of templates
+        but the mask is not the same: the convolution and the blur are applied
+        before taking the maximum, so the fused mask contains the default one
+        plus the pixels close to a mix of colours of different templates.
+        The difference depends on the frame, it is below 1% of the selected
+        pixels when the colours of the templates are in separate regions, it
+        is 5-15% on real frames with adjacent template colours and it can
+        reach half of the mask when the colours are mixed pixel by pixel.
         @param frame the original frame (color)
         @param morph_opening it is a erosion followed by dilatation to remove noise
         @param blur to smoth the image it is possible to apply Gaussian Blur
         @param kernel_size is the kernel dimension used for morph and blur
+        @param fused if True a single backprojection of the fused histogram is used (default False, see above)
+        @param single_channel if True the mask has shape (rows, cols) instead of (rows, cols, 3)
+        @param dst optional uint8 array with the shape of the mask where the mask is written
         """
         if(len(self.template_hsv_list) == 0): return None
-        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask = np.zeros((frame.shape[0], frame.shape[1]))
-        for template_hsv in self.template_hsv_list:
-            #Set the template histogram
-            template_hist = cv2.calcHist([template_hsv],[0, 1], None, [256, 256], [0, 256, 0, 256] )
-            #Normalize the template histogram and apply backprojection
-            cv2.normalize(template_hist, template_hist, 0, 255, cv2.NORM_MINMAX)
-            frame_hsv_back = cv2.calcBackProject([frame_hsv], [0,1], template_hist, [0,256,0,256], 1)
-            #Get the kernel and apply a convolution
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size,kernel_size))
-            frame_hsv_clean = cv2.filter2D(frame_hsv_back, -1, kernel)
-            #Applying the morph open operation (erosion followed by dilation)
-            if(morph_opening==True):
-                kernel = np.ones((kernel_size,kernel_size), np.uint8)
-                frame_hsv_clean = cv2.morphologyEx(frame_hsv_clean, cv2.MORPH_OPEN, kernel, iterations=iterations)
-            #Applying Gaussian Blur
-            if(blur==True): 
-                frame_hsv_clean = cv2.GaussianBlur(frame_hsv_clean, (kernel_size,kernel_size), 0)
-            #Get the threshold
-            ret, frame_hsv_threshold = cv2.threshold(frame_hsv_clean, 50, 255, 0)
-            mask = np.add(mask, frame_hsv_threshold) #Add the threshold to the mask
-
-
-        #Normalize the mask because it contains
-        #values added during the previous loop
-        #Attention: here it is not necessary to normalize because the astype(np.uint8) method
-        #will resize to 255 each value which is higher that that...
-        #cv2.normalize(mask, mask, 0, 255, cv2.NORM_MINMAX) #Not necessary
-        ret, mask = cv2.threshold(mask.astype(np.uint8), 50, 255, 0)
-        return cv2.merge((mask,mask,mask))
+        frame_hsv = _return_buffer(self.buffer_dict, 'hsv', frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=frame_hsv)
+        if(single_channel == True):
+            if(dst is None): dst = np.empty(frame.shape[0:2], dtype=np.uint8)
+            mask = dst
+        else:
+            mask = _return_buffer(self.buffer_dict, 'or', frame.shape[0:2])
+        if(fused == True):
+            self._return_template_mask(frame_hsv, self.fused_hist, morph_opening, blur, kernel_size, iterations, dst=mask)
+        else:
+            mask.fill(0)
+            for template_hist in self.template_hist_list:
+                frame_hsv_threshold = self._return_template_mask(frame_hsv, template_hist, morph_opening, blur, kernel_size, iterations)
+                #Add the threshold to the mask, the thresholds contain only 0 and 255
+                cv2.bitwise_or(mask, frame_hsv_threshold, dst=mask)
+        if(single_channel == True): return mask
+        return cv2.merge((mask,mask,mask), dst=dst)
+
+    def returnMaskLUT(self, frame, threshold=50, single_channel=False, dst=None):
+        """Given an input frame in BGR return the black/white mask using a lookup table.
+
+        The backprojection and the threshold are replaced by a single lookup
+        in a binary table indexed by the H and S values of each pixel. The
+        table of the fused histogram selects the pixels selected by at least
+        one template, and it is computed once for each threshold. The
+        convolution, the morph opening and the blur are not applied.
+        @param frame the original frame (color)
+        @param threshold a pixel is selected if its backprojection is higher than this value
+        @param single_channel if True the mask has shape (rows, cols) instead of (rows, cols, 3)
+        @param dst optional uint8 array with the shape of the mask where the mask is written
+        """
+        if(len(self.template_hsv_list) == 0): return None
+        if threshold not in self.lut_dict:
+            self.lut_dict[threshold] = _return_hs_lut(self.fused_hist, threshold)
+        frame_hsv = _return_buffer(self.buffer_dict, 'hsv', frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=frame_hsv)
+        if(single_channel == True):
+            if(dst is None): dst = np.empty(frame.shape[0:2], dtype=np.uint8)
+            return np.take(self.lut_dict[threshold], _return_hs_index(frame_hsv), out=dst)
+        mask = _return_buffer(self.buffer_dict, 'back', frame.shape[0:2])
+        np.take(self.lut_dict[threshold], _return_hs_index(frame_hsv), out=mask)
+        return cv2.merge((mask,mask,mask), dst=dst)
 
 class RangeColorDetector:
     """Using this detector it is possible to isolate colors in a specified range.
@@ -12,6 +12,14 @@ import numpy
 import cv2
 import sys
 import os.path
+import threading
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer as timer
+
+#The flag was in cv2.cv in OpenCV 2 and it is in cv2 from OpenCV 3
+if(hasattr(cv2, 'CASCADE_SCALE_IMAGE')): HAAR_SCALE_IMAGE = cv2.CASCADE_SCALE_IMAGE
+elif(hasattr(cv2, 'cv')): HAAR_SCALE_IMAGE = cv2.cv.CV_HAAR_SCALE_IMAGE
+else: HAAR_SCALE_IMAGE = 2
 
 
 class HaarFaceDetector:
@@ -24,6 +32,10 @@ class HaarFaceDetector:
     (min size, scale factor) and use the lastFaceType parameter to start the
     chain of classifiers from the last face type detected. 
     IMPORTANT: Only the position of the face with the largest area is returned.
+    The passes of returnMultipleFacesPosition() can be run at the same time
+    in a pool of threads (OpenCV releases the GIL during the detection), and
+    large frames can be split in overlapping tiles processed in parallel.
+    Each thread of the pool uses its own copy of the classifiers.
     
 
     This class uses haar-like features to find faces in a image. In the detection 
@@ -39,11 +51,14 @@ class HaarFaceDetector:
     SOURCE: https://en.wikipedia.org/wiki/Haar-like_features
     """
 
-    def __init__(self, frontalFacePath, profileFacePath):
+    def __init__(self, frontalFacePath, profileFacePath, numberOfThreads=None):
         """Init the face detector object
 
         @param frontalFacePath path to the classifier config file
         @param profileFacePath path to the classifier config file
+        @param numberOfThreads size of the pool used in the parallel mode,
+            if None the number of CPUs is used. The pool is created the
+            first time the parallel mode is used.
         """
         self.is_face_present = False
 
@@ -57,6 +72,8 @@ class HaarFaceDetector:
         self.face_y = 0
         self.face_h = 0
         self.face_w = 0
+        #Rotation (degrees ccw) of the image where the face was found
+        self.face_angle = 0
 
         if(os.path.isfile(frontalFacePath) == False and os.path.isfile(profileFacePath)==False):
             raise ValueError('[DEEPGAZE] haarCascade: the files specified do not exist.') 
@@ -67,6 +84,15 @@ class HaarFaceDetector:
         self._frontalCascade = cv2.CascadeClassifier(frontalFacePath)
         self._profileCascade = cv2.CascadeClassifier(profileFacePath)
 
+        self._numberOfThreads = numberOfThreads
+        self._pool = None
+        #The classifiers of each thread, the creator thread uses the ones above
+        self._threadData = threading.local()
+        self._mainThread = threading.current_thread()
+        #Rotation matrices for each (rows, cols, angle) and the buffers of the rotated images
+        self._rotationDict = dict()
+        self._rotationBufferDict = dict()
+
 
     def returnFacePosition(self, inputImg, 
                            runFrontal=True, runFrontalRotated=True, 
@@ -75,7 +101,7 @@ class HaarFaceDetector:
                            leftScaleFactor=1.1, rightScaleFactor=1.1,
                            minSizeX=30, minSizeY=30, 
                            rotationAngleCCW=30, rotationAngleCW=-30, 
-                           lastFaceType=0):
+                           lastFaceType=0, rotationAngles=None, timeBudget=None):
         """Find a face (frontal or profile) in the input image 
 
         Find a face and return the position. To find the right profile the input 
@@ -83,6 +109,10 @@ class HaarFaceDetector:
         file for profile faces was trained only on left profile. When all the
         classifiers are working the computation can be slow. To solve the problem
         it is possible to accurately tune the minSize and ScaleFactor parameters.
+        The faces found in the rotated images are returned in the coordinates
+        of the input image (the box has the same size and its centre is rotated
+        back), the angle is stored in the face_angle variable. The chain stops
+        at the first face found or when the time budget is spent.
         @param inputImg the image where the cascade will be called
         @param runFrontal if True it looks for frontal faces
         @param runFrontalRotated if True it looks for frontal rotated faces
@@ -97,10 +127,19 @@ class HaarFaceDetector:
         @param rotationAngleCCW (positive) angle for rotated face detector
         @param rotationAngleCW (negative) angle for rotated face detector
         @param lastFaceType to speed up the chain of classifier
+        @param rotationAngles list of angles (degrees) for the rotated face detector,
+            if None [rotationAngleCCW, rotationAngleCW] is used. The positive angles
+            are tried in the FrontRotLeft step and the negative in the FrontRotRight step.
+        @param timeBudget maximum time in seconds, when it is spent no other classifier is
+            started and (0, 0, 0, 0) is returned if no face was found. None for no limit.
 
         Return code for face_type variable: 1=Frontal, 2=FrontRotLeft, 
         3=FronRotRight, 4=ProfileLeft, 5=ProfileRight.
         """
+        if(timeBudget is None): deadline = None
+        else: deadline = timer() + timeBudget
+        if(rotationAngles is None): rotationAngles = [rotationAngleCCW, rotationAngleCW]
+        self.face_angle = 0
 
         #To speed up the chain we start it
         # from the last face-type found
@@ -112,30 +151,26 @@ class HaarFaceDetector:
         if(lastFaceType == 5): order = (5, 1, 2, 3, 4)
 
         for position in order:
+            if(deadline is not None and timer() > deadline): break
             #Cascade: frontal faces
             if(runFrontal==True and position==1):
                 self._findFrontalFace(inputImg, frontalScaleFactor, minSizeX, minSizeY)
                 if(self.is_face_present == True):
                     self.face_type = 1
                     return (self.face_x, self.face_y, self.face_w, self.face_h)
-            #Cascade: frontal faces rotated (Left)
-            if(runFrontalRotated==True and position==2):
-                rows, cols = numpy.shape(inputImg)
-                M = cv2.getRotationMatrix2D((cols/2,rows/2),rotationAngleCCW,1) #30 degrees ccw rotation
-                inputImgRot = cv2.warpAffine(inputImg, M, (cols,rows))
-                self._findFrontalFace(inputImgRot, rotatedFrontalScaleFactor, minSizeX, minSizeY)
-                if(self.is_face_present == True):
-                    self.face_type = 2
-                    return (self.face_x, self.face_y, self.face_w, self.face_h)
-            #Cascade: frontal faces rotated (Right)
-            if(runFrontalRotated==True and position==3):
-                rows, cols = numpy.shape(inputImg)
-                M = cv2.getRotationMatrix2D((cols/2,rows/2),rotationAngleCW,1) #30 degrees cw rotation
-                inputImgRot = cv2.warpAffine(inputImg, M, (cols,rows))
-                self._findFrontalFace(inputImgRot, rotatedFrontalScaleFactor, minSizeX, minSizeY)
-                if(self.is_face_present == True):
-                    self.face_type = 3
-                    return (self.face_x, self.face_y, self.face_w, self.face_h)
+            #Cascade: frontal faces rotated (Left with positive angles, Right with negative angles)
+            if(runFrontalRotated==True and (position==2 or position==3)):
+                for rotationAngle in rotationAngles:
+                    if((position==2 and rotationAngle <= 0) or (position==3 and rotationAngle >= 0)): continue
+                    if(deadline is not None and timer() > deadline): break
+                    inputImgRot, M_inv = self._return_rotated_image(inputImg, rotationAngle)
+                    self._findFrontalFace(inputImgRot, rotatedFrontalScaleFactor, minSizeX, minSizeY)
+                    if(self.is_face_present == True):
+                        self.face_type = position
+                        self.face_angle = rotationAngle
+                        face = self._map_faces_back(numpy.array([[self.face_x, self.face_y, self.face_w, self.face_h]]), M_inv)[0]
+                        self.face_x, self.face_y, self.face_w, self.face_h = face.tolist()
+                        return (self.face_x, self.face_y, self.face_w, self.face_h)
             #Cascade: left profiles
             if(runLeft==True and position==4):
                 self._findProfileFace(inputImg, leftScaleFactor, minSizeX, minSizeY)
@@ -164,14 +199,24 @@ class HaarFaceDetector:
                                     leftScaleFactor=1.1, rightScaleFactor=1.1,
                                     minSizeX=30, minSizeY=30,
                                     rotationAngleCCW=30, rotationAngleCW=-30,
-                                    lastFaceType=0):
+                                    lastFaceType=0, parallel=False,
+                                    tileSize=0, tileOverlap=128,
+                                    rotationAngles=None, timeBudget=None):
         """Find multiple faces (frontal or profile) in the input image 
 
         Find a face and return the position. To find the right profile the input 
         image is vertically flipped, this is done because the training 
         file for profile faces was trained only on left profile. When all the
         classifiers are working the computation can be slow. To solve the problem
-        it is possible to accurately tune the minSize and ScaleFactor parameters.
+        it is possible to accurately tune the minSize and ScaleFactor parameters,
+        or to use the parallel mode. In the parallel mode the passes (and the tiles)
+        are run at the same time in a pool of threads. If tileSize is greater than
+        zero each pass is split in square tiles overlapping by tileOverlap pixels.
+        The faces smaller than tileOverlap are searched in the tiles and the larger
+        faces in the whole image (only the large scales), then the detections
+        of the same face in different tiles are merged.
+        The faces found in the rotated and flipped images are returned in the
+        coordinates of the input image.
         @param inputImg the image where the cascade will be called
         @param runFrontal if True it looks for frontal faces
         @param runFrontalRotated if True it looks for frontal rotated faces
@@ -186,47 +231,287 @@ class HaarFaceDetector:
         @param rotationAngleCCW (positive) angle for rotated face detector
         @param rotationAngleCW (negative) angle for rotated face detector
         @param lastFaceType to speed up the chain of classifier
+        @param parallel if True the passes and the tiles are run in the pool of threads
+        @param tileSize the side of the tiles, 0 to disable the tiles
+        @param tileOverlap the overlap between the tiles (it must be smaller than tileSize)
+        @param rotationAngles list of angles (degrees) for the rotated face detector,
+            if None [rotationAngleCCW, rotationAngleCW] is used
+        @param timeBudget maximum time in seconds, when it is spent the detections
+            not yet started are skipped. None for no limit.
         @return list of coordinates (x, y, width, heigth) for all the faces found
 
         Return code for face_type variable: 1=Frontal, 2=FrontRotLeft, 
         3=FronRotRight, 4=ProfileLeft, 5=ProfileRight.
         """
-        allTheFaces = numpy.ndarray((0,4), numpy.int32)
-        #Cascade: frontal faces
+        if(tileSize > 0 and tileOverlap >= tileSize):
+            raise ValueError('[DEEPGAZE] face_detection.py: the tileOverlap must be smaller than the tileSize')
+        if(timeBudget is None): deadline = None
+        else: deadline = timer() + timeBudget
+        if(rotationAngles is None): rotationAngles = [rotationAngleCCW, rotationAngleCW]
+        #Each pass is a classifier applied to a version of the image,
+        #the last element is the rotation angle or the flip of the image.
+        #The rotated and flipped images are computed by the first job of
+        #the pass, in the pool and only if the deadline is not passed.
+        pass_list = list()
         if(runFrontal==True):
-            faces = self._findMultipleFrontalFaces(inputImg, frontalScaleFactor, minSizeX, minSizeY)
-            if(self.is_face_present == True):
-                allTheFaces = numpy.append(allTheFaces,faces,axis=0)
-        #Cascade: frontal faces rotated (Left)
-        if(runFrontalRotated==True):
-            rows, cols = numpy.shape(inputImg)
-            M = cv2.getRotationMatrix2D((cols/2,rows/2),rotationAngleCCW,1) #30 degrees ccw rotation
-            inputImgRot = cv2.warpAffine(inputImg, M, (cols,rows))
-            faces = self._findMultipleFrontalFaces(inputImgRot, rotatedFrontalScaleFactor, minSizeX, minSizeY)
-            if(self.is_face_present == True):
-                allTheFaces = numpy.append(allTheFaces, faces, axis=0)
-        #Cascade: frontal faces rotated (Right)
+            pass_list.append(('frontal', frontalScaleFactor, None))
+        #Cascade: frontal faces rotated
         if(runFrontalRotated==True):
-            rows, cols = numpy.shape(inputImg)
-            M = cv2.getRotationMatrix2D((cols/2,rows/2),rotationAngleCW,1) #30 degrees cw rotation
-            inputImgRot = cv2.warpAffine(inputImg, M, (cols,rows))
-            faces = self._findMultipleFrontalFaces(inputImgRot, rotatedFrontalScaleFactor, minSizeX, minSizeY)
-            if(self.is_face_present == True):
-                allTheFaces = numpy.append(allTheFaces, faces, axis=0)
+            for rotationAngle in rotationAngles:
+                pass_list.append(('frontal', rotatedFrontalScaleFactor, rotationAngle))
         #Cascade: left profiles
         if(runLeft==True):
-            faces = self._findMultipleProfileFaces(inputImg, leftScaleFactor, minSizeX, minSizeY)
-            if(self.is_face_present == True):
-                allTheFaces = numpy.append(allTheFaces, faces, axis=0)
+            pass_list.append(('profile', leftScaleFactor, None))
         #Cascade: right profiles
         if(runRight==True):
-            flipped_inputImg = cv2.flip(inputImg,1)
-            faces = self._findMultipleProfileFaces(flipped_inputImg, rightScaleFactor, minSizeX, minSizeY)
-            if(self.is_face_present == True):
-                allTheFaces = numpy.append(allTheFaces, faces, axis=0)
+            pass_list.append(('profile', rightScaleFactor, 'flip'))
+        #Split the passes in jobs (one for each tile)
+        job_list = list()
+        job_pass_list = list()
+        tiled_pass_list = list()
+        for pass_index, (cascadeName, scaleFactor, transform) in enumerate(pass_list):
+            image_function, image_shape = self._return_pass_image_function(inputImg, transform)
+            pass_job_list = self._return_jobs(cascadeName, image_function, image_shape, scaleFactor, minSizeX, minSizeY, tileSize, tileOverlap, deadline)
+            job_list.extend(pass_job_list)
+            job_pass_list.extend([pass_index] * len(pass_job_list))
+            #A single job means that the pass was not split in tiles
+            tiled_pass_list.append(len(pass_job_list) > 1)
+        if(parallel == True):
+            result_list = self._return_pool().map(self._run_job, job_list)
+        else:
+            result_list = [self._run_job(job) for job in job_list]
+        allTheFaces = numpy.ndarray((0,4), numpy.int32)
+        for pass_index in range(len(pass_list)):
+            faces_list = [faces for faces, job_pass in zip(result_list, job_pass_list) if job_pass == pass_index]
+            if(len(faces_list) == 0): continue
+            faces = numpy.concatenate(faces_list, axis=0)
+            if(tiled_pass_list[pass_index] == True): faces = self._suppress_overlapping_faces(faces)
+            #Back to the coordinates of the input image
+            transform = pass_list[pass_index][2]
+            if(transform is None): pass
+            elif(isinstance(transform, str) and transform == 'flip'):
+                faces[:, 0] = inputImg.shape[1] - (faces[:, 0] + faces[:, 2])
+            else:
+                M_inv = self._return_rotation(inputImg.shape[0], inputImg.shape[1], transform)[1]
+                faces = self._map_faces_back(faces, M_inv)
+            allTheFaces = numpy.append(allTheFaces, faces, axis=0)
+        self.is_face_present = allTheFaces.shape[0] > 0
         return allTheFaces.tolist()
 
+    def close(self):
+        """Stop the pool of threads used in the parallel mode.
+
+        The detector can still be used, the pool is created again
+        the next time the parallel mode is used.
+        """
+        if(self._pool is not None):
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _return_pool(self):
+        """Return the pool of threads, it is created at the first call.
+
+        """
+        if(self._pool is None):
+            self._pool = ThreadPool(self._numberOfThreads)
+        return self._pool
+
+    def _return_cascade(self, cascadeName):
+        """Return the classifier of the calling thread.
+
+        The cascade classifier is not safe to be shared between threads,
+        the classifiers are loaded again the first time a thread asks for them.
+        @param cascadeName 'frontal' or 'profile'
+        """
+        cascade_dict = getattr(self._threadData, 'cascade_dict', None)
+        if(cascade_dict is None):
+            if(threading.current_thread() is self._mainThread):
+                cascade_dict = {'frontal': self._frontalCascade, 'profile': self._profileCascade}
+            else:
+                cascade_dict = {'frontal': cv2.CascadeClassifier(self._frontalFacePath),
+                                'profile': cv2.CascadeClassifier(self._profileFacePath)}
+            self._threadData.cascade_dict = cascade_dict
+        return cascade_dict[cascadeName]
+
+    def _return_rotation(self, rows, cols, angle):
+        """Return the rotation matrix of an image, its inverse and the rotated size.
+
+        The image is rotated around its centre and translated into a canvas
+        as large as the bounding box of the rotated image, so that the corners
+        are not cropped. The matrices are computed once for each (rows, cols, angle).
+        @param rows the number of rows of the image
+        @param cols the number of columns of the image
+        @param angle the rotation angle in degrees (ccw)
+        @return (M, M_inv, (width, height)) where (width, height) is the size of the canvas
+        """
+        key = (rows, cols, angle)
+        if key not in self._rotationDict:
+            M = cv2.getRotationMatrix2D((cols/2.0,rows/2.0),angle,1)
+            cos = abs(M[0, 0])
+            sin = abs(M[0, 1])
+            width = int(numpy.ceil(rows * sin + cols * cos))
+            height = int(numpy.ceil(rows * cos + cols * sin))
+            #Move the centre of the image to the centre of the canvas
+            M[0, 2] += width / 2.0 - cols / 2.0
+            M[1, 2] += height / 2.0 - rows / 2.0
+            self._rotationDict[key] = (M, cv2.invertAffineTransform(M), (width, height))
+        return self._rotationDict[key]
+
+    def _return_rotated_image(self, inputImg, angle):
+        """Return the rotated image and the inverse rotation matrix.
+
+        The image is rotated around its centre into a buffer large enough to
+        contain the whole rotated image. The buffer is reused (one for each angle)
+        while the frame size does not change.
+        @param inputImg the image to rotate
+        @param angle the rotation angle in degrees (ccw)
+        """
+        rows, cols = inputImg.shape[0:2]
+        M, M_inv, (width, height) = self._return_rotation(rows, cols, angle)
+        shape = (height, width) + inputImg.shape[2:]
+        buffer = self._rotationBufferDict.get(angle)
+        if(buffer is None or buffer.shape != shape or buffer.dtype != inputImg.dtype):
+            buffer = numpy.empty(shape, dtype=inputImg.dtype)
+            self._rotationBufferDict[angle] = buffer
+        cv2.warpAffine(inputImg, M, (width,height), dst=buffer)
+        return buffer, M_inv
+
+    def _map_faces_back(self, faces, M_inv):
+        """Map the faces found in a rotated image back to the original image.
+
+        The centre of each box is rotated back, the size of the box does not change.
+        @param faces array of faces (x, y, width, height) in the rotated image
+        @param M_inv the inverse rotation matrix
+        """
+        faces = numpy.array(faces, dtype=numpy.int32).reshape(-1, 4)
+        center_x = faces[:, 0] + faces[:, 2] / 2.0
+        center_y = faces[:, 1] + faces[:, 3] / 2.0
+        original_x = M_inv[0, 0] * center_x + M_inv[0, 1] * center_y + M_inv[0, 2]
+        original_y = M_inv[1, 0] * center_x + M_inv[1, 1] * center_y + M_inv[1, 2]
+        faces[:, 0] = numpy.round(original_x - faces[:, 2] / 2.0)
+        faces[:, 1] = numpy.round(original_y - faces[:, 3] / 2.0)
+        return faces
+
+    def _return_pass_image_function(self, inputImg, transform):
+        """Return a function which gives the image of a pass, and the shape of that image.
+
+        The image is computed at the first call of the function and then reused,
+        the function can be called at the same time by different threads.
+        @param inputImg the input image
+        @param transform None, 'flip' or the rotation angle in degrees (ccw)
+        """
+        if(transform is None):
+            return (lambda: inputImg), inputImg.shape[0:2]
+        if(isinstance(transform, str) and transform == 'flip'):
+            compute = lambda: cv2.flip(inputImg,1)
+            image_shape = inputImg.shape[0:2]
+        else:
+            compute = lambda: self._return_rotated_image(inputImg, transform)[0]
+            width, height = self._return_rotation(inputImg.shape[0], inputImg.shape[1], transform)[2]
+            image_shape = (height, width)
+        lock = threading.Lock()
+        image_list = list()
+        def image_function():
+            with lock:
+                if(len(image_list) == 0): image_list.append(compute())
+            return image_list[0]
+        return image_function, image_shape
+
+    def _return_jobs(self, cascadeName, imageFunction, imageShape, scaleFactor, minSizeX, minSizeY, tileSize, tileOverlap, deadline=None):
+        """Return the list of detections needed for a pass.
+
+        A job is a tuple (cascadeName, imageFunction, tile, scaleFactor, minSize, maxSize, deadline)
+        where tile is (x, y, size) or None for the whole image.
+        Without tiles there is a single job on the whole image.
+        @param cascadeName 'frontal' or 'profile'
+        @param imageFunction the function which returns the image of the pass
+        @param imageShape the (rows, cols) of the image of the pass
+        @param scaleFactor the scale factor of the pass
+        @param minSizeX the minimum width of the faces
+        @param minSizeY the minimum height of the faces
+        @param tileSize the side of the tiles, 0 to disable the tiles
+        @param tileOverlap the overlap between the tiles
+        @param deadline the job is skipped if it starts after this time (None for no limit)
+        """
+        rows, cols = imageShape
+        if(tileSize <= 0 or (rows <= tileSize and cols <= tileSize) or (minSizeX >= tileOverlap and minSizeY >= tileOverlap)):
+            return [(cascadeName, imageFunction, None, scaleFactor, (minSizeX, minSizeY), (0, 0), deadline)]
+        job_list = list()
+        #A face smaller than the overlap is entirely inside at least one tile
+        step = tileSize - tileOverlap
+        for y in self._return_tile_starts(rows, tileSize, step):
+            for x in self._return_tile_starts(cols, tileSize, step):
+                job_list.append((cascadeName, imageFunction, (x, y, tileSize), scaleFactor,
+                                 (minSizeX, minSizeY), (tileOverlap, tileOverlap), deadline))
+        #The large faces are searched in the whole image
+        job_list.append((cascadeName, imageFunction, None, scaleFactor, (max(minSizeX, tileOverlap), max(minSizeY, tileOverlap)), (0, 0), deadline))
+        return job_list
+
+    def _return_tile_starts(self, length, tileSize, step):
+        """Return the start coordinates of the tiles along a dimension.
+
+        The last tile ends at the border of the image.
+        @param length the size of the image along the dimension
+        @param tileSize the side of the tiles
+        @param step the distance between two consecutive tiles
+        """
+        if(length <= tileSize): return [0]
+        start_list = list(range(0, length - tileSize, step))
+        start_list.append(length - tileSize)
+        return start_list
 
+    def _run_job(self, job):
+        """Run the detection of a job and return the faces in the coordinates of the pass image.
+
+        The image of the pass (rotated or flipped) is computed by the first job which needs it.
+        @param job the tuple (cascadeName, imageFunction, tile, scaleFactor, minSize, maxSize, deadline)
+        """
+        cascadeName, imageFunction, tile, scaleFactor, minSize, maxSize, deadline = job
+        if(deadline is not None and timer() > deadline): return numpy.ndarray((0,4), numpy.int32)
+        image = imageFunction()
+        if(tile is None):
+            x_offset, y_offset = 0, 0
+        else:
+            x_offset, y_offset, tileSize = tile
+            image = image[y_offset:y_offset+tileSize, x_offset:x_offset+tileSize]
+        faces = self._return_cascade(cascadeName).detectMultiScale(
+            image,
+            scaleFactor=scaleFactor,
+            minNeighbors=4,
+            minSize=minSize,
+            maxSize=maxSize,
+            flags=HAAR_SCALE_IMAGE
+        )
+        if(len(faces) == 0): return numpy.ndarray((0,4), numpy.int32)
+        faces = numpy.array(faces, dtype=numpy.int32).reshape(-1, 4)
+        faces[:, 0] += x_offset
+        faces[:, 1] += y_offset
+        return faces
+
+    def _suppress_overlapping_faces(self, faces, overlapThreshold=0.3):
+        """Merge the detections of the same face found in different tiles.
+
+        The faces are sorted by area and a face is removed if its intersection
+        over union with a larger face is higher than the threshold.
+        @param faces array of faces (x, y, width, height)
+        @param overlapThreshold the maximum intersection over union of two faces
+        """
+        if(faces.shape[0] < 2): return faces
+        area = faces[:, 2].astype(numpy.float64) * faces[:, 3]
+        x2 = faces[:, 0] + faces[:, 2]
+        y2 = faces[:, 1] + faces[:, 3]
+        intersection_w = numpy.minimum(x2[:, numpy.newaxis], x2[numpy.newaxis, :]) - numpy.maximum(faces[:, 0][:, numpy.newaxis], faces[:, 0][numpy.newaxis, :])
+        intersection_h = numpy.minimum(y2[:, numpy.newaxis], y2[numpy.newaxis, :]) - numpy.maximum(faces[:, 1][:, numpy.newaxis], faces[:, 1][numpy.newaxis, :])
+        intersection = numpy.maximum(intersection_w, 0) * numpy.maximum(intersection_h, 0).astype(numpy.float64)
+        iou = intersection / (area[:, numpy.newaxis] + area[numpy.newaxis, :] - intersection)
+        keep = numpy.ones(faces.shape[0], dtype=bool)
+        for index in numpy.argsort(-area, kind='stable'):
+            if(keep[index] == False): continue
+            overlapping = iou[index] > overlapThreshold
+            overlapping[index] = False
+            keep[overlapping] = False
+        return faces[keep]
 
     def _findFrontalFace(self, inputImg, scaleFactor=1.1, minSizeX=30, minSizeY=30, minNeighbors=4):
         """Find a frontal face in the input image
@@ -240,7 +525,7 @@ class HaarFaceDetector:
             scaleFactor=scaleFactor,
             minNeighbors=minNeighbors,
             minSize=(minSizeX, minSizeY),
-            flags=cv2.cv.CV_HAAR_SCALE_IMAGE
+            flags=HAAR_SCALE_IMAGE
         )
 
         if(len(faces) == 0):
@@ -287,7 +572,7 @@ class HaarFaceDetector:
             scaleFactor=scaleFactor,
             minNeighbors=minNeighbors,
             minSize=(minSizeX, minSizeY),
-            flags=cv2.cv.CV_HAAR_SCALE_IMAGE
+            flags=HAAR_SCALE_IMAGE
         )
 
         if(len(faces) == 0):
@@ -320,55 +605,3 @@ class HaarFaceDetector:
              self.face_h = faces[max_index][3]
              self.is_face_present = True
              return (faces[max_index][0], faces[max_index][1], faces[max_index][2], faces[max_index][3])
-
-    def _findMultipleFrontalFaces(self, inputImg, scaleFactor=1.1, minSizeX=30, minSizeY=30, minNeighbors=4):
-        """Find a frontal face in the input image
-
-        @param inputImg the image where the cascade will be called
-        """
-
-        # Cascade: frontal faces
-        faces = self._frontalCascade.detectMultiScale(
-            inputImg,
-            scaleFactor=scaleFactor,
-            minNeighbors=minNeighbors,
-            minSize=(minSizeX, minSizeY),
-            flags=cv2.cv.CV_HAAR_SCALE_IMAGE
-        )
-
-        if (len(faces) == 0):
-            self.face_x = 0
-            self.face_y = 0
-            self.face_w = 0
-            self.face_h = 0
-            self.is_face_present = False
-            return (0, 0, 0, 0)
-        else:
-            self.is_face_present = True
-            return faces
-
-    def _findMultipleProfileFaces(self, inputImg, scaleFactor=1.1, minSizeX=30, minSizeY=30, minNeighbors=4):
-        """Find a profile face in the input image
-
-        @param inputImg the image where the cascade will be called
-        """
-
-        # Cascade: left profile
-        faces = self._profileCascade.detectMultiScale(
-            inputImg,
-            scaleFactor=scaleFactor,
-            minNeighbors=minNeighbors,
-            minSize=(minSizeX, minSizeY),
-            flags=cv2.cv.CV_HAAR_SCALE_IMAGE
-        )
-
-        if (len(faces) == 0):
-            self.face_x = 0
-            self.face_y = 0
-            self.face_w = 0
-            self.face_h = 0
-            self.is_face_present = False
-            return (0, 0, 0, 0)
-        else:
-            self.is_face_present = True
-            return faces
@@ -10,9 +10,11 @@
 import numpy
 import sys
 import cv2
-import dlib
 import os.path
 
+#dlib is imported only when a faceLandmarkDetection object is created
+dlib = None
+
 RIGHT_SIDE = 0
 MENTON = 8
 LEFT_SIDE = 16
@@ -34,6 +36,11 @@ class faceLandmarkDetection:
         if(os.path.isfile(landmarkPath)==False):
             raise ValueError('haarCascade: the files specified do not exist.')
 
+        global dlib
+        if(dlib is None):
+            import dlib as dlib_module
+            dlib = dlib_module
+
         self._predictor = dlib.shape_predictor(landmarkPath)
 
 
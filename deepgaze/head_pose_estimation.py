@@ -9,25 +9,150 @@
 #SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import numpy as np
-import tensorflow as tf
 import cv2
 import os.path
-import imp #to check for missing modules
 import math
 
-#Check if dlib is installed
-try:
-    imp.find_module('dlib')
-    IS_DLIB_INSTALLED = True
-    import dlib
-    print('[DEEPGAZE] head_pose_estimation.py: the dlib library is installed.')
-except ImportError:
-    IS_DLIB_INSTALLED = False
-    print('[DEEPGAZE] head_pose_estimation.py: the dlib library is not installed.')
-
 #Enbale if you need printing utilities
 DEBUG = False
 
+#Tensorflow and dlib are heavy libraries, they are imported only
+#when a class which needs them is used (see _import_tensorflow and _import_dlib)
+tf = None
+dlib = None
+
+#Number of float32 elements converted at once when the numpy backend
+#multiplies by quantized weights (see _numpy_dense_tanh)
+DENSE_BLOCK_ELEMENTS = 2**16
+
+#Names of the variables stored for each network, the same names
+#are used in the checkpoints and in the exported numpy files.
+#For example the yaw conv1 weights are stored as "conv1_yaw_w".
+HEAD_POSE_VARIABLES = ("conv1_w", "conv1_b", "conv2_w", "conv2_b", "conv3_w", "conv3_b",
+                       "dense1_w", "dense1_b", "out_w", "out_b")
+
+#Names of the input and output nodes in the frozen graph, the nodes
+#are renamed during the export because tensorflow may uniquify them
+FROZEN_INPUT_NAME = "deepgaze_head_pose_input"
+FROZEN_OUTPUT_NAME = "deepgaze_head_pose_output"
+#Column of each angle in the output of the grouped graph and its scale
+GROUPED_ANGLES = {"roll": (0, 25.0), "pitch": (1, 45.0), "yaw": (2, 100.0)}
+
+
+def _import_tensorflow():
+    """ Import tensorflow the first time it is needed (for internal use)
+
+    """
+    global tf
+    if(tf is None):
+        import tensorflow
+        tf = tensorflow
+    return tf
+
+
+def _import_dlib():
+    """ Import dlib the first time it is needed (for internal use)
+
+    """
+    global dlib
+    if(dlib is None):
+        import dlib as dlib_module
+        dlib = dlib_module
+    return dlib
+
+
+def _numpy_dense_tanh(X, weights, biases, scales=None):
+    """ Fully connected layer followed by tanh (for internal use)
+
+    The weights can be float32, float16 or int8. The quantized weights are
+    kept in memory in their compact form: the product is accumulated over
+    blocks of input rows, each block is converted to float32 in a small
+    scratch buffer, and the per-channel scales are applied to the output.
+    The whole float32 matrix is never materialised.
+    @param X input array of shape (N, input_size)
+    @param weights array of shape (input_size, output_size)
+    @param biases array of shape (output_size)
+    @param scales per-channel scales of int8 weights, shape (output_size), or None
+    """
+    if(weights.dtype == np.float32):
+        output = np.dot(X, weights)
+    else:
+        input_size, output_size = weights.shape
+        block_rows = max(1, DENSE_BLOCK_ELEMENTS // output_size)
+        output = np.zeros((X.shape[0], output_size), dtype=np.float32)
+        scratch = np.empty((min(block_rows, input_size), output_size), dtype=np.float32)
+        for start in range(0, input_size, block_rows):
+            stop = min(start + block_rows, input_size)
+            block = scratch[0:stop-start]
+            block[...] = weights[start:stop]
+            output += np.dot(X[:, start:stop], block)
+    if(scales is not None): output *= scales
+    output += biases
+    return np.tanh(output, out=output)
+
+
+def _numpy_conv2d_tanh(X, weights, biases, scales=None):
+    """ Convolution (stride 1, padding SAME) followed by tanh (for internal use)
+
+    The convolution is done through im2col and a single matrix multiplication.
+    @param X input array of shape (N, H, W, C)
+    @param weights array of shape (patch_size, patch_size, C, depth)
+    @param biases array of shape (depth)
+    @param scales per-channel scales of int8 weights, shape (depth), or None
+    @return an array of shape (N, H, W, depth)
+    """
+    n, h, w, c = X.shape
+    kh, kw, _, depth = weights.shape
+    X_padded = np.pad(X, ((0, 0), (kh//2, kh//2), (kw//2, kw//2), (0, 0)), mode='constant')
+    s = X_padded.strides
+    patches = np.lib.stride_tricks.as_strided(X_padded, shape=(n, h, w, kh, kw, c),
+                                              strides=(s[0], s[1], s[2], s[1], s[2], s[3]))
+    columns = patches.reshape(n * h * w, kh * kw * c) #im2col
+    output = _numpy_dense_tanh(columns, weights.reshape(kh * kw * c, depth), biases, scales)
+    return output.reshape(n, h, w, depth)
+
+
+def _numpy_max_pool(X):
+    """ Max pooling with a 2x2 window and stride 2 (for internal use)
+
+    @param X input array of shape (N, H, W, C) with H and W even
+    """
+    n, h, w, c = X.shape
+    return X.reshape(n, h//2, 2, w//2, 2, c).max(axis=(2, 4))
+
+
+def _numpy_lrn(X, depth_radius=4, bias=1.0, alpha=0.001 / 9.0, beta=0.75):
+    """ Local response normalisation across channels (for internal use)
+
+    It follows the tensorflow definition:
+    sqr_sum[a, b, c, d] = sum(input[a, b, c, d - depth_radius : d + depth_radius + 1] ** 2)
+    output = input / (bias + alpha * sqr_sum) ** beta
+    """
+    squared = np.square(X)
+    sqr_sum = np.copy(squared)
+    for offset in range(1, depth_radius + 1):
+        sqr_sum[..., offset:] += squared[..., :-offset]
+        sqr_sum[..., :-offset] += squared[..., offset:]
+    sqr_sum *= alpha
+    sqr_sum += bias
+    return X / np.power(sqr_sum, beta, out=sqr_sum)
+
+
+def _numpy_tower(pool1, variables):
+    """ Forward pass of a pose network from the first pooling layer (for internal use)
+
+    @param pool1 the output of the first max pooling, shape (N, 32, 32, 64)
+    @param variables a dictionary containing the weights of the network
+    @return an array of shape (N, 1) with values in the range [-1, +1]
+    """
+    norm1 = _numpy_lrn(pool1)
+    conv2 = _numpy_conv2d_tanh(norm1, variables["conv2_w"], variables["conv2_b"], variables.get("conv2_w_scale"))
+    norm2 = _numpy_lrn(_numpy_max_pool(conv2))
+    conv3 = _numpy_conv2d_tanh(norm2, variables["conv3_w"], variables["conv3_b"], variables.get("conv3_w_scale"))
+    norm3 = _numpy_lrn(_numpy_max_pool(conv3))
+    dense1 = _numpy_dense_tanh(norm3.reshape(norm3.shape[0], -1), variables["dense1_w"], variables["dense1_b"], variables.get("dense1_w_scale"))
+    return _numpy_dense_tanh(dense1, variables["out_w"], variables["out_b"], variables.get("out_w_scale"))
+
 
 class CnnHeadPoseEstimator:
     """ Head pose estimation class which uses convolutional neural network
@@ -40,12 +165,24 @@ class CnnHeadPoseEstimator:
         YAW=[-100, +100] 
     """
 
-    def __init__(self, tf_session):
+    def __init__(self, tf_session=None, backend='tensorflow'):
         """ Init the class
 
-        @param tf_session An external tensorflow session
+        @param tf_session An external tensorflow session (only for the tensorflow backend)
+        @param backend the inference engine used to evaluate the networks:
+            tensorflow: (default) the networks are loaded from checkpoints and evaluated in the session
+            numpy: the networks are loaded from the .npz files created with export_variables()
+                and evaluated with vectorised numpy operations. Tensorflow is not required.
         """
+        if(backend == 'tensorflow'):
+            if(tf_session is None): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator: the tensorflow backend requires a tensorflow session.')
+            _import_tensorflow()
+        elif(backend != 'numpy'):
+            raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator: the backend ' + str(backend) + ' is not supported.')
         self._sess = tf_session
+        self._backend = backend
+        #Numpy weights of the networks, one dictionary for each angle
+        self._numpy_variables = dict()
 
     def print_allocated_variables(self):
         """ Print all the Tensorflow allocated variables
@@ -66,7 +203,7 @@ class CnnHeadPoseEstimator:
         """
         self._num_labels = 1
         # Input data [batch_size, image_size, image_size, channels]
-        self.tf_yaw_input_vector = tf.placeholder(tf.float32, shape=(64, 64, 3))
+        self.tf_yaw_input_vector = tf.placeholder(tf.float32, shape=(None, 64, 64, 3))
         
         # Variables.
         #Conv layer
@@ -160,9 +297,13 @@ class CnnHeadPoseEstimator:
         It must be called after the variable allocation.
         This function take the variables stored in a local file
         and assign them to pre-allocated variables.      
-        @param YawFilePath Path to a valid checkpoint
+        @param YawFilePath Path to a valid checkpoint (or to a .npz file for the numpy backend)
         """
 
+        if(self._backend == 'numpy'):
+            self._load_numpy_variables('yaw', YawFilePath, 'load_yaw_variables')
+            return
+
         #Allocate the variables in memory
         self._allocate_yaw_variables()
 
@@ -196,9 +337,8 @@ class CnnHeadPoseEstimator:
          h, w, d = image.shape
          #check if the image has the right shape
          if(h == w and h==64 and d==3):
-             image_normalised = np.add(image, -127) #normalisation of the input
-             feed_dict = {self.tf_yaw_input_vector : image_normalised}
-             yaw_raw = self._sess.run([self.cnn_yaw_output], feed_dict=feed_dict)
+             image_normalised = np.subtract(image, 127.0, dtype=np.float32) #normalisation of the input
+             yaw_raw = [self._evaluate_network('yaw', image_normalised[np.newaxis])]
              yaw_vector = np.multiply(yaw_raw, 100.0)
              #yaw = yaw_raw #* 100 #cnn out is in range [-1, +1] --> [-100, + 100]
              if(radians==True): return np.multiply(yaw_vector, np.pi/180.0) #to radians
@@ -206,9 +346,8 @@ class CnnHeadPoseEstimator:
          #If the image is > 64 pixel then resize it
          if(h == w and h>64 and d==3):
              image_resized = cv2.resize(image, (64, 64), interpolation = cv2.INTER_AREA)
-             image_normalised = np.add(image_resized, -127) #normalisation of the input
-             feed_dict = {self.tf_yaw_input_vector : image_normalised}
-             yaw_raw = self._sess.run([self.cnn_yaw_output], feed_dict=feed_dict)
+             image_normalised = np.subtract(image_resized, 127.0, dtype=np.float32) #normalisation of the input
+             yaw_raw = [self._evaluate_network('yaw', image_normalised[np.newaxis])]
              yaw_vector = np.multiply(yaw_raw, 100.0) #cnn-out is in range [-1, +1] --> [-100, + 100]
              if(radians==True): return np.multiply(yaw_vector, np.pi/180.0) #to radians
              else: return yaw_vector
@@ -231,7 +370,7 @@ class CnnHeadPoseEstimator:
         """
         self._num_labels = 1
         # Input data [batch_size, image_size, image_size, channels]
-        self.tf_pitch_input_vector = tf.placeholder(tf.float32, shape=(64, 64, 3))
+        self.tf_pitch_input_vector = tf.placeholder(tf.float32, shape=(None, 64, 64, 3))
         
         # Variables.
         #Conv layer
@@ -327,7 +466,7 @@ class CnnHeadPoseEstimator:
         """
         self._num_labels = 1
         # Input data [batch_size, image_size, image_size, channels]
-        self.tf_roll_input_vector = tf.placeholder(tf.float32, shape=(64, 64, 3))
+        self.tf_roll_input_vector = tf.placeholder(tf.float32, shape=(None, 64, 64, 3))
 
         # Variables
         #Conv layer
@@ -421,9 +560,13 @@ class CnnHeadPoseEstimator:
         It must be called after the variable allocation.
         This function take the variables stored in a local file
         and assign them to pre-allocated variables.      
-        @param pitchFilePath Path to a valid checkpoint
+        @param pitchFilePath Path to a valid checkpoint (or to a .npz file for the numpy backend)
         """
 
+        if(self._backend == 'numpy'):
+            self._load_numpy_variables('pitch', pitchFilePath, 'load_pitch_variables')
+            return
+
         #Allocate the variables in memory
         self._allocate_pitch_variables()
 
@@ -449,9 +592,13 @@ class CnnHeadPoseEstimator:
         It must be called after the variable allocation.
         This function take the variables stored in a local file
         and assign them to pre-allocated variables.      
-        @param rollFilePath Path to a valid checkpoint
+        @param rollFilePath Path to a valid checkpoint (or to a .npz file for the numpy backend)
         """
 
+        if(self._backend == 'numpy'):
+            self._load_numpy_variables('roll', rollFilePath, 'load_roll_variables')
+            return
+
         #Allocate the variables in memory
         self._allocate_roll_variables()
 
@@ -485,9 +632,8 @@ class CnnHeadPoseEstimator:
          h, w, d = image.shape
          #check if the image has the right shape
          if(h == w and h==64 and d==3):
-             image_normalised = np.add(image, -127) #normalisation of the input
-             feed_dict = {self.tf_pitch_input_vector : image_normalised}
-             pitch_raw = self._sess.run([self.cnn_pitch_output], feed_dict=feed_dict)
+             image_normalised = np.subtract(image, 127.0, dtype=np.float32) #normalisation of the input
+             pitch_raw = [self._evaluate_network('pitch', image_normalised[np.newaxis])]
              pitch_vector = np.multiply(pitch_raw, 45.0)
              #pitch = pitch_raw #* 40 #cnn out is in range [-1, +1] --> [-45, + 45]
              if(radians==True): return np.multiply(pitch_vector, np.pi/180.0) #to radians
@@ -495,9 +641,8 @@ class CnnHeadPoseEstimator:
          #If the image is > 64 pixel then resize it
          if(h == w and h>64 and d==3):
              image_resized = cv2.resize(image, (64, 64), interpolation = cv2.INTER_AREA)
-             image_normalised = np.add(image_resized, -127) #normalisation of the input
-             feed_dict = {self.tf_pitch_input_vector : image_normalised}
-             pitch_raw = self._sess.run([self.cnn_pitch_output], feed_dict=feed_dict)
+             image_normalised = np.subtract(image_resized, 127.0, dtype=np.float32) #normalisation of the input
+             pitch_raw = [self._evaluate_network('pitch', image_normalised[np.newaxis])]
              pitch_vector = np.multiply(pitch_raw, 45.0) #cnn-out is in range [-1, +1] --> [-45, + 45]
              if(radians==True): return np.multiply(pitch_vector, np.pi/180.0) #to radians
              else: return pitch_vector
@@ -521,9 +666,8 @@ class CnnHeadPoseEstimator:
          h, w, d = image.shape
          #check if the image has the right shape
          if(h == w and h==64 and d==3):
-             image_normalised = np.add(image, -127) #normalisation of the input
-             feed_dict = {self.tf_roll_input_vector : image_normalised}
-             roll_raw = self._sess.run([self.cnn_roll_output], feed_dict=feed_dict)
+             image_normalised = np.subtract(image, 127.0, dtype=np.float32) #normalisation of the input
+             roll_raw = [self._evaluate_network('roll', image_normalised[np.newaxis])]
              roll_vector = np.multiply(roll_raw, 25.0)
              #cnn out is in range [-1, +1] --> [-25, + 25]
              if(radians==True): return np.multiply(roll_vector, np.pi/180.0) #to radians
@@ -531,9 +675,8 @@ class CnnHeadPoseEstimator:
          #If the image is > 64 pixel then resize it
          if(h == w and h>64 and d==3):
              image_resized = cv2.resize(image, (64, 64), interpolation = cv2.INTER_AREA)
-             image_normalised = np.add(image_resized, -127) #normalisation of the input
-             feed_dict = {self.tf_roll_input_vector : image_normalised}
-             roll_raw = self._sess.run([self.cnn_roll_output], feed_dict=feed_dict)
+             image_normalised = np.subtract(image_resized, 127.0, dtype=np.float32) #normalisation of the input
+             roll_raw = [self._evaluate_network('roll', image_normalised[np.newaxis])]
              roll_vector = np.multiply(roll_raw, 25.0) #cnn-out is in range [-1, +1] --> [-45, + 45]
              if(radians==True): return np.multiply(roll_vector, np.pi/180.0) #to radians
              else: return roll_vector
@@ -544,6 +687,381 @@ class CnnHeadPoseEstimator:
          if(d!=3):
              raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(return_roll): the image given as input does not have 3 channels, this function accepts only colour images.')
 
+    def _return_normalised_batch(self, images, function_name):
+        """ Resize and normalise a batch of images (for internal use)
+
+        It returns a float32 array of shape (N, 64, 64, 3) which can be
+        fed to the networks in a single session run.
+        @param images an array of shape (N, 64, 64, 3) or a list of colour images
+            (the images in the list can have different sizes, each one must be >= 64 pixel)
+        @param function_name the name of the caller, used in the error messages
+        """
+        if(isinstance(images, np.ndarray) and images.ndim == 4 and images.shape[1:] == (64, 64, 3)):
+            return np.subtract(images, 127.0, dtype=np.float32) #normalisation of the input
+        images_batch = np.empty((len(images), 64, 64, 3), dtype=np.float32)
+        for i, image in enumerate(images):
+            if(image.ndim != 3 or image.shape[2] != 3):
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): the image ' + str(i) + ' does not have 3 channels, this function accepts only colour images.')
+            h, w, d = image.shape
+            if(h != w or h < 64):
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): the image ' + str(i) + ' has wrong shape. Height must equal Width and they must be >= 64 pixel. Height=%d,Width=%d'%(h,w))
+            if(h > 64): image = cv2.resize(image, (64, 64), interpolation = cv2.INTER_AREA)
+            np.subtract(image, 127.0, out=images_batch[i]) #normalisation of the input
+        return images_batch
+
+    def _load_numpy_variables(self, angle, file_path, function_name):
+        """ Load the weights of a network from a numpy .npz file (for internal use)
+
+        @param angle the network to load: 'roll', 'pitch' or 'yaw'
+        @param file_path path to a file created with export_variables() or export_quantized_variables()
+        @param function_name the name of the caller, used in the error messages
+        """
+        if(os.path.isfile(file_path)==False): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): the ' + angle + ' file path is incorrect.')
+        variables = dict()
+        with np.load(file_path) as npz_file:
+            for name in HEAD_POSE_VARIABLES:
+                layer, kind = name.split("_")
+                key = layer + "_" + angle + "_" + kind
+                if(key + "_q" in npz_file.files):
+                    #int8 weights with per-channel scales
+                    variables[name] = npz_file[key + "_q"].astype(np.int8)
+                    variables[name + "_scale"] = npz_file[key + "_scale"].astype(np.float32)
+                elif(key in npz_file.files):
+                    #float16 weights are kept in half precision
+                    if(npz_file[key].dtype == np.float16): variables[name] = npz_file[key]
+                    else: variables[name] = npz_file[key].astype(np.float32)
+                else:
+                    raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): the file does not contain the variable ' + key + '.')
+        self._numpy_variables[angle] = variables
+
+    def _return_float_variables(self, function_name):
+        """ Return the float32 weights of the loaded networks (for internal use)
+
+        @param function_name the name of the caller, used in the error messages
+        @return a dictionary with the same keys used in the checkpoints (ex: conv1_yaw_w)
+        """
+        variables = dict()
+        if(self._backend == 'numpy'):
+            for angle in self._numpy_variables:
+                if("conv1_w_scale" in self._numpy_variables[angle] or self._numpy_variables[angle]["conv1_w"].dtype != np.float32):
+                    raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): the ' + angle + ' variables are quantized, the float variables are required.')
+                for name in HEAD_POSE_VARIABLES:
+                    layer, kind = name.split("_")
+                    variables[layer + "_" + angle + "_" + kind] = self._numpy_variables[angle][name]
+        else:
+            for angle, prefix in (("roll", "hr"), ("pitch", "hp"), ("yaw", "hy")):
+                if(hasattr(self, "cnn_" + angle + "_output") == False): continue
+                for name in HEAD_POSE_VARIABLES:
+                    layer, kind = name.split("_")
+                    if(kind == "w"): attribute_name = prefix + "_" + layer + "_weights"
+                    else: attribute_name = prefix + "_" + layer + "_biases"
+                    variables[layer + "_" + angle + "_" + kind] = getattr(self, attribute_name)
+            if(len(variables) > 0): variables = self._sess.run(variables)
+        if(len(variables) == 0): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): there are no variables loaded.')
+        return variables
+
+    def export_variables(self, file_path):
+        """ Export the weights of the loaded networks in a compressed numpy file (.npz)
+
+        The checkpoints have to be loaded only once with the tensorflow backend,
+        then the file can be loaded by an estimator which uses the numpy backend.
+        Only the networks which have been loaded are exported.
+        @param file_path the path of the .npz file to write
+        """
+        np.savez_compressed(file_path, **self._return_float_variables('export_variables'))
+
+    def export_quantized_variables(self, file_path, precision='int8'):
+        """ Export the weights of the loaded networks with post-training quantization
+
+        The file can be loaded by an estimator which uses the numpy backend, the
+        weights are kept quantized in memory (the dense1 layer of each network
+        goes from 16 MB to 4 MB in int8) and converted block by block during
+        the forward pass. The biases are stored in float32.
+        @param file_path the path of the .npz file to write
+        @param precision the quantization to apply to the weights:
+            int8: (default) symmetric quantization with one scale for each output channel
+            float16: half precision weights
+        """
+        variables = self._return_float_variables('export_quantized_variables')
+        quantized_variables = dict()
+        for key, value in variables.items():
+            if(key.endswith("_w") == False):
+                quantized_variables[key] = value.astype(np.float32)
+            elif(precision == 'float16'):
+                quantized_variables[key] = value.astype(np.float16)
+            elif(precision == 'int8'):
+                #The output channels are on the last axis for both conv and dense weights
+                max_values = np.amax(np.abs(value.reshape(-1, value.shape[-1])), axis=0)
+                scales = np.where(max_values > 0, max_values / 127.0, 1.0).astype(np.float32)
+                quantized_variables[key + "_q"] = np.clip(np.round(value / scales), -127, 127).astype(np.int8)
+                quantized_variables[key + "_scale"] = scales
+            else:
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(export_quantized_variables): the precision ' + str(precision) + ' is not supported.')
+        np.savez_compressed(file_path, **quantized_variables)
+
+    def _numpy_forward(self, angles, images_batch, grouped=False, chunk_size=32):
+        """ Evaluate the networks with the numpy backend (for internal use)
+
+        The batch is processed in chunks to bound the memory used by im2col.
+        @param angles a tuple containing the networks to evaluate ('roll', 'pitch', 'yaw')
+        @param images_batch normalised float32 array of shape (N, 64, 64, 3)
+        @param grouped When True the first convolution of all the networks is fused in a single one
+        @param chunk_size the number of images evaluated at the same time
+        @return an array of shape (N, len(angles)) with values in the range [-1, +1]
+        """
+        for angle in angles:
+            if(angle not in self._numpy_variables): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator: the ' + angle + ' variables are not loaded.')
+        variables_list = [self._numpy_variables[angle] for angle in angles]
+        if(grouped == True):
+            conv1_weights = np.concatenate([variables["conv1_w"] for variables in variables_list], axis=3)
+            conv1_biases = np.concatenate([variables["conv1_b"] for variables in variables_list])
+            if(len(set(variables["conv1_w"].dtype for variables in variables_list)) > 1):
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator: the grouped graph requires the same precision for all the networks.')
+            conv1_scales = None
+            if("conv1_w_scale" in variables_list[0]):
+                conv1_scales = np.concatenate([variables["conv1_w_scale"] for variables in variables_list])
+        output = np.empty((images_batch.shape[0], len(angles)), dtype=np.float32)
+        for start in range(0, images_batch.shape[0], chunk_size):
+            X = images_batch[start:start+chunk_size]
+            if(grouped == True):
+                pool1 = _numpy_max_pool(_numpy_conv2d_tanh(X, conv1_weights, conv1_biases, conv1_scales))
+                pool1_list = np.split(pool1, len(angles), axis=3)
+            else:
+                pool1_list = [_numpy_max_pool(_numpy_conv2d_tanh(X, variables["conv1_w"], variables["conv1_b"], variables.get("conv1_w_scale"))) for variables in variables_list]
+            for i, variables in enumerate(variables_list):
+                output[start:start+chunk_size, i] = _numpy_tower(pool1_list[i], variables)[:, 0]
+        return output
+
+    def _evaluate_network(self, angle, images_batch):
+        """ Return the raw output of a network (for internal use)
+
+        @param angle the network to evaluate: 'roll', 'pitch' or 'yaw'
+        @param images_batch normalised array of shape (N, 64, 64, 3)
+        @return an array of shape (N, 1) with values in the range [-1, +1]
+        """
+        if(self._backend == 'numpy'):
+            return self._numpy_forward((angle,), np.asarray(images_batch, dtype=np.float32))
+        if(hasattr(self, 'cnn_' + angle + '_output') == False):
+            #When only the frozen graph has been loaded the angle is taken from the grouped output
+            if(hasattr(self, 'cnn_grouped_output') == False):
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator: the ' + angle + ' variables (or a frozen graph) must be loaded before estimating the ' + angle + ' angle.')
+            column, scale = GROUPED_ANGLES[angle]
+            angles_matrix = self._sess.run(self.cnn_grouped_output, feed_dict={self.tf_grouped_input_vector : images_batch})
+            return np.divide(angles_matrix[:, column:column+1], scale)
+        feed_dict = {getattr(self, 'tf_' + angle + '_input_vector') : images_batch}
+        return self._sess.run(getattr(self, 'cnn_' + angle + '_output'), feed_dict=feed_dict)
+
+    def _return_batch(self, images, angle, scale, radians, function_name):
+        """ Evaluate a batch of images with a single session run (for internal use)
+
+        @param images an array of shape (N, 64, 64, 3) or a list of colour images
+        @param angle the network to evaluate: 'roll', 'pitch' or 'yaw'
+        @param scale the value used to map the cnn output [-1, +1] in degrees
+        @param radians When True it returns the angles in radians, otherwise in degrees.
+        @param function_name the name of the caller, used in the error messages
+        """
+        images_batch = self._return_normalised_batch(images, function_name)
+        if(images_batch.shape[0] == 0): return np.zeros(0, dtype=np.float32)
+        angles_raw = self._evaluate_network(angle, images_batch) #shape (N, 1)
+        angles_vector = np.multiply(angles_raw[:, 0], scale)
+        if(radians==True): return np.multiply(angles_vector, np.pi/180.0) #to radians
+        else: return angles_vector
+
+    def return_yaw_batch(self, images, radians=False):
+         """ Return the yaw angles associated with a batch of images.
+
+         All the images are evaluated with a single session run, this is
+         much faster than calling return_yaw() for each face in the frame.
+         @param images It is an array of shape (N, 64, 64, 3) or a list of colour images.
+            The images in the list can have different sizes but each one must be squared and >= 64 pixel.
+         @param radians When True it returns the angle in radians, otherwise in degrees.
+         @return an array of shape (N,) containing the yaw angles
+         """
+         return self._return_batch(images, 'yaw', 100.0, radians, 'return_yaw_batch')
+
+    def return_pitch_batch(self, images, radians=False):
+         """ Return the pitch angles associated with a batch of images.
+
+         All the images are evaluated with a single session run, this is
+         much faster than calling return_pitch() for each face in the frame.
+         @param images It is an array of shape (N, 64, 64, 3) or a list of colour images.
+            The images in the list can have different sizes but each one must be squared and >= 64 pixel.
+         @param radians When True it returns the angle in radians, otherwise in degrees.
+         @return an array of shape (N,) containing the pitch angles
+         """
+         return self._return_batch(images, 'pitch', 45.0, radians, 'return_pitch_batch')
+
+    def return_roll_batch(self, images, radians=False):
+         """ Return the roll angles associated with a batch of images.
+
+         All the images are evaluated with a single session run, this is
+         much faster than calling return_roll() for each face in the frame.
+         @param images It is an array of shape (N, 64, 64, 3) or a list of colour images.
+            The images in the list can have different sizes but each one must be squared and >= 64 pixel.
+         @param radians When True it returns the angle in radians, otherwise in degrees.
+         @return an array of shape (N,) containing the roll angles
+         """
+         return self._return_batch(images, 'roll', 25.0, radians, 'return_roll_batch')
+
+    def _allocate_grouped_graph(self):
+        """ Allocate the graph which evaluates the three networks at once (for internal use)
+
+        The roll, pitch and yaw towers share a single input placeholder. The first
+        convolution of the three towers is fused in one convolution with 3*64 output
+        channels, then the towers are split before the first normalisation (the LRN
+        works across channels) and the three outputs are concatenated in a single
+        tensor of shape (N, 3) containing [roll, pitch, yaw] in degrees.
+        The roll, pitch and yaw variables must be loaded before calling this function.
+        """
+        self.tf_grouped_input_vector = tf.placeholder(tf.float32, shape=(None, 64, 64, 3), name=FROZEN_INPUT_NAME)
+
+        def tower(pool1, conv2_weights, conv2_biases, conv3_weights, conv3_biases,
+                  dense1_weights, dense1_biases, out_weights, out_biases):
+            norm1 = tf.nn.lrn(pool1, 4, bias=1.0, alpha=0.001 / 9.0, beta=0.75)
+            conv2 = tf.tanh(tf.nn.bias_add(tf.nn.conv2d(norm1, conv2_weights, strides=[1, 1, 1, 1], padding='SAME'), conv2_biases))
+            pool2 = tf.nn.max_pool(conv2, ksize=[1, 2, 2, 1], strides=[1, 2, 2, 1], padding='SAME')
+            norm2 = tf.nn.lrn(pool2, 4, bias=1.0, alpha=0.001 / 9.0, beta=0.75)
+            conv3 = tf.tanh(tf.nn.bias_add(tf.nn.conv2d(norm2, conv3_weights, strides=[1, 1, 1, 1], padding='SAME'), conv3_biases))
+            pool3 = tf.nn.max_pool(conv3, ksize=[1, 2, 2, 1], strides=[1, 2, 2, 1], padding='SAME')
+            norm3 = tf.nn.lrn(pool3, 4, bias=1.0, alpha=0.001 / 9.0, beta=0.75)
+            dense1 = tf.reshape(norm3, [-1, dense1_weights.get_shape().as_list()[0]])
+            dense1 = tf.tanh(tf.matmul(dense1, dense1_weights) + dense1_biases)
+            return tf.tanh(tf.matmul(dense1, out_weights) + out_biases)
+
+        #Fused convolution layer 1 for the three towers
+        conv1_weights = tf.concat([self.hr_conv1_weights, self.hp_conv1_weights, self.hy_conv1_weights], 3)
+        conv1_biases = tf.concat([self.hr_conv1_biases, self.hp_conv1_biases, self.hy_conv1_biases], 0)
+        conv1 = tf.tanh(tf.nn.bias_add(tf.nn.conv2d(self.tf_grouped_input_vector, conv1_weights, strides=[1, 1, 1, 1], padding='SAME'), conv1_biases))
+        pool1 = tf.nn.max_pool(conv1, ksize=[1, 2, 2, 1], strides=[1, 2, 2, 1], padding='SAME')
+        pool1_roll, pool1_pitch, pool1_yaw = tf.split(pool1, 3, axis=3)
+        if(DEBUG == True): print("SHAPE grouped pool1: " + str(pool1.get_shape()))
+
+        out_roll = tower(pool1_roll, self.hr_conv2_weights, self.hr_conv2_biases, self.hr_conv3_weights, self.hr_conv3_biases,
+                         self.hr_dense1_weights, self.hr_dense1_biases, self.hr_out_weights, self.hr_out_biases)
+        out_pitch = tower(pool1_pitch, self.hp_conv2_weights, self.hp_conv2_biases, self.hp_conv3_weights, self.hp_conv3_biases,
+                          self.hp_dense1_weights, self.hp_dense1_biases, self.hp_out_weights, self.hp_out_biases)
+        out_yaw = tower(pool1_yaw, self.hy_conv2_weights, self.hy_conv2_biases, self.hy_conv3_weights, self.hy_conv3_biases,
+                        self.hy_dense1_weights, self.hy_dense1_biases, self.hy_out_weights, self.hy_out_biases)
+        #cnn out is in range [-1, +1] --> roll [-25, +25], pitch [-45, +45], yaw [-100, +100]
+        self.cnn_grouped_output = tf.multiply(tf.concat([out_roll, out_pitch, out_yaw], 1), [25.0, 45.0, 100.0], name=FROZEN_OUTPUT_NAME)
+
+    def _return_roll_pitch_yaw(self, images, radians, grouped, function_name):
+        """ Evaluate roll, pitch and yaw of a batch with a single session run (for internal use)
+
+        @param images an array of shape (N, 64, 64, 3) or a list of colour images
+        @param radians When True it returns the angles in radians, otherwise in degrees.
+        @param grouped When True the three networks are evaluated as a single grouped graph
+        @param function_name the name of the caller, used in the error messages
+        """
+        if(self._backend == 'numpy'):
+            images_batch = self._return_normalised_batch(images, function_name)
+            angles_matrix = np.multiply(self._numpy_forward(('roll', 'pitch', 'yaw'), images_batch, grouped=grouped), [25.0, 45.0, 100.0])
+            if(radians==True): return np.multiply(angles_matrix, np.pi/180.0) #to radians
+            else: return angles_matrix
+        #When only the frozen graph has been loaded the grouped graph is the only option
+        if(hasattr(self, 'cnn_grouped_output') == True and hasattr(self, 'cnn_roll_output') == False): grouped = True
+        if(grouped == True and hasattr(self, 'cnn_grouped_output') == False):
+            if(hasattr(self, 'cnn_roll_output') == False or hasattr(self, 'cnn_pitch_output') == False or hasattr(self, 'cnn_yaw_output') == False):
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(' + function_name + '): the roll, pitch and yaw variables must be loaded before using the grouped graph.')
+            self._allocate_grouped_graph()
+        images_batch = self._return_normalised_batch(images, function_name)
+        if(images_batch.shape[0] == 0): return np.zeros((0, 3), dtype=np.float32)
+        if(grouped == True):
+            feed_dict = {self.tf_grouped_input_vector : images_batch}
+            angles_matrix = self._sess.run(self.cnn_grouped_output, feed_dict=feed_dict)
+        else:
+            #The same preprocessed tensor is fed to the three networks
+            feed_dict = {self.tf_roll_input_vector : images_batch,
+                         self.tf_pitch_input_vector : images_batch,
+                         self.tf_yaw_input_vector : images_batch}
+            roll_raw, pitch_raw, yaw_raw = self._sess.run([self.cnn_roll_output, self.cnn_pitch_output, self.cnn_yaw_output], feed_dict=feed_dict)
+            angles_matrix = np.hstack((np.multiply(roll_raw, 25.0), np.multiply(pitch_raw, 45.0), np.multiply(yaw_raw, 100.0)))
+        if(radians==True): return np.multiply(angles_matrix, np.pi/180.0) #to radians
+        else: return angles_matrix
+
+    def return_roll_pitch_yaw(self, image, radians=False, grouped=False):
+         """ Return the roll, pitch and yaw angles associated with the input image.
+
+         The image is resized and normalised only once and the three networks
+         are evaluated with a single session run.
+         @param image It is a colour image. It must be >= 64 pixel.
+         @param radians When True it returns the angle in radians, otherwise in degrees.
+         @param grouped When True the three towers are evaluated as one grouped graph
+            (shared input and fused first convolution) which is built at the first call.
+         @return an array [roll, pitch, yaw]
+         """
+         return self._return_roll_pitch_yaw([image], radians, grouped, 'return_roll_pitch_yaw')[0]
+
+    def return_roll_pitch_yaw_batch(self, images, radians=False, grouped=False):
+         """ Return the roll, pitch and yaw angles associated with a batch of images.
+
+         @param images It is an array of shape (N, 64, 64, 3) or a list of colour images.
+            The images in the list can have different sizes but each one must be squared and >= 64 pixel.
+         @param radians When True it returns the angle in radians, otherwise in degrees.
+         @param grouped When True the three towers are evaluated as one grouped graph
+            (shared input and fused first convolution) which is built at the first call.
+         @return an array of shape (N, 3) where each row is [roll, pitch, yaw]
+         """
+         return self._return_roll_pitch_yaw(images, radians, grouped, 'return_roll_pitch_yaw_batch')
+
+    def export_frozen_graph(self, file_path):
+        """ Freeze the three networks in a single serialized graph.
+
+        The grouped graph is built (if necessary), the variables are converted
+        into constants and the constant subgraphs are folded. The resulting file
+        can be loaded with load_frozen_graph(), without variables initialisation
+        and without a Saver. The roll, pitch and yaw variables must be loaded.
+        @param file_path the path of the file to write (ex: head_pose_frozen.pb)
+        """
+        if(self._backend != 'tensorflow'): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(export_frozen_graph): the graph can be frozen only with the tensorflow backend.')
+        if(hasattr(self, 'cnn_grouped_output') == False):
+            if(hasattr(self, 'cnn_roll_output') == False or hasattr(self, 'cnn_pitch_output') == False or hasattr(self, 'cnn_yaw_output') == False):
+                raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(export_frozen_graph): the roll, pitch and yaw variables must be loaded before freezing the graph.')
+            self._allocate_grouped_graph()
+        input_name = self.tf_grouped_input_vector.op.name
+        output_name = self.cnn_grouped_output.op.name
+        graph_def = tf.graph_util.convert_variables_to_constants(self._sess, self._sess.graph.as_graph_def(), [output_name])
+        try:
+            from tensorflow.tools.graph_transforms import TransformGraph
+            graph_def = TransformGraph(graph_def, [input_name], [output_name], ['fold_constants(ignore_errors=true)'])
+        except ImportError:
+            if(DEBUG == True): print("[DEEPGAZE] CnnHeadPoseEstimator: graph_transforms not available, the constants are not folded.")
+        #The placeholder and the output can have a uniquified name (ex: deepgaze_head_pose_input_1)
+        #if the grouped graph was built more than once, they are stored with the fixed names
+        #(only the subgraph of the output is kept, the fixed names can not be taken by other nodes)
+        renaming_dict = {input_name: FROZEN_INPUT_NAME, output_name: FROZEN_OUTPUT_NAME}
+        for node in graph_def.node:
+            if node.name in renaming_dict: node.name = renaming_dict[node.name]
+            for index, node_input in enumerate(node.input):
+                control = node_input.startswith('^')
+                name, separator, port = node_input.lstrip('^').partition(':')
+                if name in renaming_dict:
+                    node.input[index] = ('^' if control else '') + renaming_dict[name] + separator + port
+        with open(file_path, 'wb') as frozen_file:
+            frozen_file.write(graph_def.SerializeToString())
+
+    def load_frozen_graph(self, frozenFilePath):
+        """ Load the three networks from a file created with export_frozen_graph()
+
+        The graph is imported in the session graph, it does not contain variables
+        therefore it is not necessary to initialise them or to use a Saver.
+        After loading, the angles can be obtained through return_roll_pitch_yaw()
+        and return_roll_pitch_yaw_batch(). The single angle functions (ex: return_yaw)
+        evaluate the grouped graph and return one of its outputs.
+        @param frozenFilePath Path to a valid frozen graph
+        """
+        if(self._backend != 'tensorflow'): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(load_frozen_graph): the frozen graph can be loaded only with the tensorflow backend.')
+        if(os.path.isfile(frozenFilePath)==False): raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(load_frozen_graph): the frozen graph file path is incorrect.')
+        graph_def = tf.GraphDef()
+        with open(frozenFilePath, 'rb') as frozen_file:
+            graph_def.ParseFromString(frozen_file.read())
+        node_name_set = set(node.name for node in graph_def.node)
+        if(FROZEN_INPUT_NAME not in node_name_set or FROZEN_OUTPUT_NAME not in node_name_set):
+            raise ValueError('[DEEPGAZE] CnnHeadPoseEstimator(load_frozen_graph): the frozen graph does not contain the nodes ' + FROZEN_INPUT_NAME + ' and ' + FROZEN_OUTPUT_NAME + ', it must be created with export_frozen_graph().')
+        with self._sess.graph.as_default():
+            self.tf_grouped_input_vector, self.cnn_grouped_output = tf.import_graph_def(graph_def,
+                return_elements=[FROZEN_INPUT_NAME + ":0", FROZEN_OUTPUT_NAME + ":0"], name="deepgaze_frozen")
+
 
 
 class PnpHeadPoseEstimator:
@@ -560,7 +1078,10 @@ class PnpHeadPoseEstimator:
         @param cam_h the camera height. If you are using a 640x480 resolution it is 480
         @dlib_shape_predictor_file_path path to the dlib file for shape prediction (look in: deepgaze/etc/dlib/shape_predictor_68_face_landmarks.dat)
         """
-        if(IS_DLIB_INSTALLED == False): raise ValueError('[DEEPGAZE] PnpHeadPoseEstimator: the dlib libray is not installed. Please install dlib if you want to use the PnpHeadPoseEstimator class.')
+        try:
+            _import_dlib()
+        except ImportError:
+            raise ValueError('[DEEPGAZE] PnpHeadPoseEstimator: the dlib libray is not installed. Please install dlib if you want to use the PnpHeadPoseEstimator class.')
         if(os.path.isfile(dlib_shape_predictor_file_path)==False): raise ValueError('[DEEPGAZE] PnpHeadPoseEstimator: the files specified do not exist.') 
 
         #Defining the camera matrix.
@@ -12,6 +12,364 @@ import numpy as np
 import cv2
 import sys
 
+#In OpenCV before 3.2 findContours modifies the source image
+CV_VERSION = tuple(int(v) for v in cv2.__version__.split('.')[0:2])
+FIND_CONTOURS_COPY = CV_VERSION < (3, 2)
+
+
+ENGINES = ["contours", "components"]
+ASSOCIATION_METHODS = ["iou", "distance"]
+#One record for each blob returned by returnBlobArray()
+BLOB_DTYPE = np.dtype([('area', np.float64), ('cx', np.float64), ('cy', np.float64),
+                       ('x', np.int32), ('y', np.int32), ('w', np.int32), ('h', np.int32),
+                       ('circularity', np.float64)])
+
+
+def _find_contours(mask, mode=1):
+    """Return the contours and the hierarchy of a binary mask.
+
+    The mask is converted to gray if it has three channels. The call works
+    with OpenCV 2 and 4 (two return values) and OpenCV 3 (three values).
+    @param mask the binary image (single channel or BGR)
+    @param mode the contour retrieval mode (default 1, all the contours)
+    @return the list of contours and the hierarchy
+    """
+    if(len(mask.shape) == 3):
+        mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
+    elif(FIND_CONTOURS_COPY == True):
+        mask = np.copy(mask)
+    return cv2.findContours(mask, mode, 2)[-2:]
+
+
+class MaskAnalysis:
+    """The result of the analysis of a binary mask.
+
+    It is returned by BinaryMaskAnalyser.analyse() and it contains the
+    contours found in the mask. The area, the centre and the bounding
+    rectangle of all the contours are computed at once with vectorised
+    operations. The area and the centre of an external contour are the
+    ones of the region it encloses, the area of its holes is subtracted.
+    The enclosing circle and the convex hull are computed
+    only when requested and then stored. Contours are identified by their
+    index in the contour list; returnTopAreaIndices() returns the indices
+    of the contours with the largest areas.
+    """
+
+    def __init__(self, contours, hierarchy, min_area=0, scale=1):
+        """Init the analysis from the output of findContours.
+
+        @param contours the list of contours
+        @param hierarchy the hierarchy of all the contours (before the min_area filter)
+        @param min_area the contours with a smaller area are discarded
+        @param scale the downsampling factor of the mask, the results are
+            scaled back to the coordinates of the original mask
+        """
+        self.contours = list(contours)
+        self.hierarchy = hierarchy
+        contours_number = len(self.contours)
+        #With a two-level hierarchy (RETR_CCOMP) the contours with a parent are holes
+        if(hierarchy is None or contours_number == 0):
+            self.hole_array = np.zeros(contours_number, dtype=bool)
+        else:
+            self.hole_array = hierarchy.reshape(-1, 4)[:, 3] != -1
+        self.area_array = np.zeros(contours_number)
+        self.center_array = np.full((contours_number, 2), np.nan)
+        self.perimeter_array = np.zeros(contours_number)
+        self.rectangle_array = np.zeros((contours_number, 4), dtype=np.int64)
+        self.circle_dict = dict()
+        self.hull_dict = dict()
+        if(contours_number == 0): return
+        #All the points in a single array, start is the first point of each contour
+        points = np.concatenate([cnt.reshape(-1, 2) for cnt in self.contours]).astype(np.int64)
+        lengths = np.array([cnt.shape[0] for cnt in self.contours])
+        start = np.zeros(contours_number, dtype=np.intp)
+        np.cumsum(lengths[:-1], out=start[1:])
+        #The next point of each point, the last point of a contour goes back to the first
+        next_index = np.arange(1, points.shape[0] + 1)
+        next_index[start + lengths - 1] = start
+        x = points[:, 0]
+        y = points[:, 1]
+        x_next = x[next_index]
+        y_next = y[next_index]
+        #Green's theorem, the same used by cv2.contourArea and cv2.moments
+        cross = x * y_next - x_next * y
+        m00 = np.add.reduceat(cross, start)
+        m10 = np.add.reduceat((x + x_next) * cross, start)
+        m01 = np.add.reduceat((y + y_next) * cross, start)
+        #The moments are made positive (the holes have the opposite orientation)
+        #and the moments of the holes are subtracted from their parent, so the
+        #area and the centre of an external contour are the ones of the region
+        orientation = np.sign(m00)
+        m00 = m00 * orientation
+        m10 = m10 * orientation
+        m01 = m01 * orientation
+        if(np.any(self.hole_array)):
+            parent_array = hierarchy.reshape(-1, 4)[:, 3][self.hole_array]
+            np.subtract.at(m00, parent_array, m00[self.hole_array])
+            np.subtract.at(m10, parent_array, m10[self.hole_array])
+            np.subtract.at(m01, parent_array, m01[self.hole_array])
+        self.area_array = np.maximum(m00, 0) / 2.0
+        self.perimeter_array = np.add.reduceat(np.hypot(x_next - x, y_next - y), start)
+        valid = m00 > 0
+        self.center_array[valid, 0] = m10[valid] / (3.0 * m00[valid])
+        self.center_array[valid, 1] = m01[valid] / (3.0 * m00[valid])
+        #Bounding rectangles (x, y, width, height)
+        self.rectangle_array[:, 0] = np.minimum.reduceat(x, start)
+        self.rectangle_array[:, 1] = np.minimum.reduceat(y, start)
+        self.rectangle_array[:, 2] = np.maximum.reduceat(x, start) - self.rectangle_array[:, 0] + 1
+        self.rectangle_array[:, 3] = np.maximum.reduceat(y, start) - self.rectangle_array[:, 1] + 1
+        if(scale != 1):
+            self.contours = [cnt * scale for cnt in self.contours]
+            self._scale(scale)
+        if(min_area > 0): self._filter(self.area_array >= min_area)
+
+    def _scale(self, scale):
+        """Scale the area, the centre and the rectangle of the contours.
+
+        @param scale the downsampling factor of the mask
+        """
+        self.area_array *= scale * scale
+        if(self.perimeter_array is not None): self.perimeter_array *= scale
+        #The centre of a downsampled pixel is in the middle of the scale x scale block
+        self.center_array = self.center_array * scale + (scale - 1) / 2.0
+        self.rectangle_array *= scale
+
+    def _filter(self, keep):
+        """Keep only a part of the contours.
+
+        @param keep boolean array, True for the contours to keep
+        """
+        self.contours = [cnt for cnt, k in zip(self.contours, keep) if k]
+        self.hole_array = self.hole_array[keep]
+        self.area_array = self.area_array[keep]
+        self.perimeter_array = self.perimeter_array[keep]
+        self.center_array = self.center_array[keep]
+        self.rectangle_array = self.rectangle_array[keep]
+
+    def returnNumberOfContours(self):
+        """it returns the total number of contours present on the mask
+
+        """
+        return len(self.contours)
+
+    def returnAreaArray(self):
+        """it returns the area of each contour
+
+        """
+        return self.area_array
+
+    def returnMaxAreaIndex(self):
+        """it returns the index of the contour with the largest area
+
+        @return the index or None if there are no contours
+        """
+        if(self.area_array.size == 0): return None
+        return int(np.argmax(self.area_array))
+
+    def returnTopAreaIndices(self, k):
+        """it returns the indices of the k contours with the largest area
+
+        @param k the number of contours to return
+        @return the indices ordered from the largest area
+        """
+        return np.argsort(-self.area_array, kind='stable')[0:k]
+
+    def returnContour(self, index):
+        """it returns a contour
+
+        @param index the index of the contour
+        """
+        return self.contours[index]
+
+    def _return_perimeter_array(self, index_array):
+        """Return the perimeter of some contours.
+
+        @param index_array the indices of the contours
+        """
+        return self.perimeter_array[index_array]
+
+    def returnBlobArray(self, min_area=0):
+        """it returns all the blobs with an area greater or equal than min_area
+
+        The holes are not blobs, only the external contours are returned (the
+        same regions found by the components engine) and their area does not
+        include the holes, like the number of pixels of a component. The blobs are returned as a structured array with dtype BLOB_DTYPE and
+        fields area, cx, cy (centre), x, y, w, h (rectangle) and circularity,
+        which is 4*pi*area/perimeter^2 (1 for a circle). The blobs are ordered
+        from the largest area. The centre of a blob with zero area is NaN.
+        @param min_area the minimum area of the blobs
+        @return the structured array of the blobs
+        """
+        index_array = np.argsort(-self.area_array, kind='stable')
+        index_array = index_array[(self.area_array[index_array] >= min_area) & (self.hole_array[index_array] == False)]
+        blob_array = np.zeros(index_array.size, dtype=BLOB_DTYPE)
+        blob_array['area'] = self.area_array[index_array]
+        blob_array['cx'] = self.center_array[index_array, 0]
+        blob_array['cy'] = self.center_array[index_array, 1]
+        blob_array['x'] = self.rectangle_array[index_array, 0]
+        blob_array['y'] = self.rectangle_array[index_array, 1]
+        blob_array['w'] = self.rectangle_array[index_array, 2]
+        blob_array['h'] = self.rectangle_array[index_array, 3]
+        perimeter_array = self._return_perimeter_array(index_array)
+        valid = perimeter_array > 0
+        blob_array['circularity'][valid] = 4.0 * np.pi * blob_array['area'][valid] / (perimeter_array[valid] ** 2)
+        return blob_array
+
+    def returnCenter(self, index):
+        """it returns the centre of a contour
+
+        @param index the index of the contour
+        @return the x and y center coords, (None, None) if the contour has zero area
+        """
+        cx, cy = self.center_array[index]
+        if(np.isnan(cx)): return (None, None)
+        return (int(cx), int(cy))
+
+    def returnRectangle(self, index):
+        """it returns the rectangle sorrounding a contour
+
+        @param index the index of the contour
+        @return the upper corner of the rectangle (x, y) and its size (width, height)
+        """
+        x, y, w, h = self.rectangle_array[index]
+        return (int(x), int(y), int(w), int(h))
+
+    def returnCircle(self, index):
+        """it returns the circle sorrounding a contour
+
+        @param index the index of the contour
+        @return the center (x, y) and the radius of the circle
+        """
+        if index not in self.circle_dict:
+            (x,y),radius = cv2.minEnclosingCircle(self.returnContour(index))
+            self.circle_dict[index] = (int(x),int(y), int(radius))
+        return self.circle_dict[index]
+
+    def returnConvexHull(self, index):
+        """it returns the convex hull sorrounding a contour
+
+        @param index the index of the contour
+        @return the coords of the convex hull
+        """
+        if index not in self.hull_dict:
+            self.hull_dict[index] = cv2.convexHull(self.returnContour(index))
+        return self.hull_dict[index]
+
+    def returnMaxAreaContour(self):
+        """it returns the contour with largest area, None if there are no contours
+
+        """
+        index = self.returnMaxAreaIndex()
+        if(index is None): return None
+        return self.returnContour(index)
+
+    def returnMaxAreaCenter(self):
+        """it returns the centre of the contour with largest area, (None, None) in case of error
+
+        """
+        index = self.returnMaxAreaIndex()
+        if(index is None): return (None, None)
+        return self.returnCenter(index)
+
+    def returnMaxAreaRectangle(self):
+        """it returns the rectangle of the contour with largest area, (None, None, None, None) in case of error
+
+        """
+        index = self.returnMaxAreaIndex()
+        if(index is None): return (None, None, None, None)
+        return self.returnRectangle(index)
+
+    def returnMaxAreaCircle(self):
+        """it returns the circle of the contour with largest area, (None, None, None) in case of error
+
+        """
+        index = self.returnMaxAreaIndex()
+        if(index is None): return (None, None, None)
+        return self.returnCircle(index)
+
+    def returnMaxAreaConvexHull(self):
+        """it returns the convex hull of the contour with largest area, None if there are no contours
+
+        """
+        index = self.returnMaxAreaIndex()
+        if(index is None): return None
+        return self.returnConvexHull(index)
+
+
+class ComponentsAnalysis(MaskAnalysis):
+    """The result of the analysis of a binary mask with the connected components.
+
+    The blobs are the 8-connected components of the mask, the area (number
+    of pixels), the bounding rectangle and the centroid of all the blobs are
+    returned by cv2.connectedComponentsWithStats in a single pass. There is
+    one blob for each connected region, holes do not count as blobs like in
+    the contours analysis. The contour of a blob is found only when requested,
+    from the label image inside its rectangle, and then stored.
+    """
+
+    def __init__(self, labels, stats, centroids, min_area=0, scale=1):
+        """Init the analysis from the output of connectedComponentsWithStats.
+
+        @param labels the label image
+        @param stats the statistics of the components (the first is the background)
+        @param centroids the centroids of the components
+        @param min_area the blobs with a smaller area are discarded
+        @param scale the downsampling factor of the mask, the results are
+            scaled back to the coordinates of the original mask
+        """
+        self.labels = labels
+        self.scale = scale
+        self.label_array = np.arange(1, stats.shape[0])
+        self.area_array = stats[1:, cv2.CC_STAT_AREA].astype(np.float64)
+        self.center_array = centroids[1:].astype(np.float64)
+        self.rectangle_array = stats[1:, 0:4].astype(np.int64)
+        self.hole_array = np.zeros(self.label_array.size, dtype=bool)
+        self.perimeter_array = None
+        self.contour_dict = dict()
+        self.circle_dict = dict()
+        self.hull_dict = dict()
+        if(scale != 1): self._scale(scale)
+        if(min_area > 0): self._filter(self.area_array >= min_area)
+
+    def _filter(self, keep):
+        """Keep only a part of the blobs.
+
+        @param keep boolean array, True for the blobs to keep
+        """
+        self.label_array = self.label_array[keep]
+        self.hole_array = self.hole_array[keep]
+        self.area_array = self.area_array[keep]
+        self.center_array = self.center_array[keep]
+        self.rectangle_array = self.rectangle_array[keep]
+
+    def returnNumberOfContours(self):
+        """it returns the total number of blobs present on the mask
+
+        """
+        return self.label_array.size
+
+    def returnContour(self, index):
+        """it returns the external contour of a blob
+
+        @param index the index of the blob
+        """
+        if index not in self.contour_dict:
+            x, y, w, h = self.rectangle_array[index] // self.scale
+            roi = (self.labels[y:y+h, x:x+w] == self.label_array[index]).astype(np.uint8)
+            contours, hierarchy = _find_contours(roi, mode=cv2.RETR_EXTERNAL)
+            self.contour_dict[index] = (contours[0] + np.array([x, y], dtype=np.int32)) * self.scale
+        return self.contour_dict[index]
+
+    def _return_perimeter_array(self, index_array):
+        """Return the perimeter of some blobs.
+
+        The perimeter is the length of the external contour of the blob,
+        the contours are found only for the requested blobs.
+        @param index_array the indices of the blobs
+        """
+        return np.array([cv2.arcLength(self.returnContour(index), True) for index in index_array], dtype=np.float64)
+
+
 class BinaryMaskAnalyser:
     """This class analyses binary masks, like the ones returned by
        the color detection classes.
@@ -19,8 +377,61 @@ class BinaryMaskAnalyser:
     The class implements function for finding the contour with the
     largest area and its properties (centre, sorrounding rectangle).
     There are also functions for noise removal.
+    Each returnMaxArea method finds the contours of the mask again, when
+    more than one property of the same mask is needed it is faster to
+    call analyse() once and read the properties from the result.
     """
 
+    def __init__(self, engine='contours', min_area=0, downsample=1):
+        """Init the analyser.
+
+        With the 'contours' engine the blobs are the contours returned by
+        cv2.findContours (holes included, but returnBlobArray() skips them). With the 'components' engine the
+        blobs are the connected components of the mask, their area, rectangle
+        and centroid are returned by a single call to OpenCV and it is faster
+        when only these properties are needed. The area of a component is its
+        number of pixels, while the area of a contour is the area of the polygon
+        minus the area of its holes (the two differ by about half the perimeter).
+        @param engine the backend used in the analysis ('contours' or 'components')
+        @param min_area the blobs with a smaller area (in pixels of the original mask) are discarded
+        @param downsample integer factor used to subsample large masks before the analysis,
+            the results are returned in the coordinates of the original mask
+        """
+        if engine not in ENGINES:
+            raise ValueError('[DEEPGAZE] mask_analysis.py: the engine must be one of ' + str(ENGINES))
+        if(int(downsample) < 1):
+            raise ValueError('[DEEPGAZE] mask_analysis.py: the downsample factor must be an integer greater than zero')
+        self.engine = engine
+        self.min_area = min_area
+        self.downsample = int(downsample)
+
+    def analyse(self, mask):
+        """it finds the blobs of the mask and returns their properties
+ 
+        The contours (or the connected components) are extracted only once,
+        the area, the centre and the rectangle of all the blobs are computed
+        at the same time.
+        @param mask the binary image to use in the function
+        @return a MaskAnalysis object, None if the mask is None
+        """
+        if(mask is None): return None
+        if(self.downsample > 1):
+            mask = mask[::self.downsample, ::self.downsample]
+        if(self.engine == 'components'):
+            if(len(mask.shape) == 3):
+                mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
+            mask = np.ascontiguousarray(mask)
+            #The block-based algorithm (Grana) is faster than the default one on single-threaded builds
+            if(hasattr(cv2, 'connectedComponentsWithStatsWithAlgorithm')):
+                components_number, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, cv2.CV_32S, cv2.CCL_GRANA)
+            else:
+                components_number, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            return ComponentsAnalysis(labels, stats, centroids, min_area=self.min_area, scale=self.downsample)
+        if(self.downsample > 1): mask = np.ascontiguousarray(mask)
+        #All the contours are found, the hierarchy tells apart the holes
+        contours, hierarchy = _find_contours(mask, mode=cv2.RETR_CCOMP)
+        return MaskAnalysis(contours, hierarchy, min_area=self.min_area, scale=self.downsample)
+
     def returnNumberOfContours(self, mask):
         """it returns the total number of contours present on the mask
  
@@ -30,12 +441,7 @@ class BinaryMaskAnalyser:
         @return get the number of contours 
         """
         if(mask is None): return None
-        mask = np.copy(mask) #doing a copy otherwise findContours modify the original(?)
-        if(len(mask.shape) == 3):
-            mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-        contours, hierarchy = cv2.findContours(mask, 1, 2)
-        if(hierarchy is None): return 0
-        else: return len(hierarchy)
+        return self.analyse(mask).returnNumberOfContours()
 
     def returnMaxAreaCenter(self, mask):
         """it returns the centre of the contour with largest area.
@@ -46,27 +452,7 @@ class BinaryMaskAnalyser:
             In case of error it returns a tuple (None, None)
         """
         if(mask is None): return (None, None)
-        mask = np.copy(mask)
-        if(len(mask.shape) == 3):
-            mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-        contours, hierarchy = cv2.findContours(mask, 1, 2)
-        area_array = np.zeros(len(contours)) #contains the area of the contours
-        counter = 0
-        for cnt in contours:   
-                #cv2.drawContours(image, [cnt], 0, (0,255,0), 3)
-                #print("Area: " + str(cv2.contourArea(cnt)))
-                area_array[counter] = cv2.contourArea(cnt)
-                counter += 1
-        if(area_array.size==0): return (None, None) #the array is empty
-        max_area_index = np.argmax(area_array) #return the index of the max_area element
-        #cv2.drawContours(image, [contours[max_area_index]], 0, (0,255,0), 3)
-        #Get the centre of the max_area element
-        cnt = contours[max_area_index]
-        M = cv2.moments(cnt) #calculate the moments
-        if(M['m00'] == 0): return (None, None)
-        cx = int(M['m10']/M['m00']) #get the center from the moments
-        cy = int(M['m01']/M['m00'])
-        return (cx, cy) #return the center coords
+        return self.analyse(mask).returnMaxAreaCenter()
 
     def returnMaxAreaContour(self, mask):
         """it returns the contour with largest area.
@@ -76,21 +462,7 @@ class BinaryMaskAnalyser:
         @return get the x and y center coords of the contour whit the largest area 
         """
         if(mask is None): return None
-        mask = np.copy(mask)
-        if(len(mask.shape) == 3):
-            mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-        contours, hierarchy = cv2.findContours(mask, 1, 2)
-        area_array = np.zeros(len(contours)) #contains the area of the contours
-        counter = 0
-        for cnt in contours:   
-                #cv2.drawContours(image, [cnt], 0, (0,255,0), 3)
-                #print("Area: " + str(cv2.contourArea(cnt)))
-                area_array[counter] = cv2.contourArea(cnt)
-                counter += 1
-        if(area_array.size==0): return None #the array is empty
-        max_area_index = np.argmax(area_array) #return the index of the max_area element
-        cnt = contours[max_area_index]
-        return cnt #return the max are contour
+        return self.analyse(mask).returnMaxAreaContour()
 
     def drawMaxAreaContour(self, frame, mask, color=[0,255,0], thickness=3):
         """it draws the contour with largest area.
@@ -159,20 +531,7 @@ class BinaryMaskAnalyser:
             In case of error it returns a tuple (None, None, None, None) 
         """
         if(mask is None): return (None, None, None, None)
-        mask = np.copy(mask)
-        if(len(mask.shape) == 3):
-            mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-        contours, hierarchy = cv2.findContours(mask, 1, 2)
-        area_array = np.zeros(len(contours)) #contains the area of the contours
-        counter = 0
-        for cnt in contours:   
-                area_array[counter] = cv2.contourArea(cnt)
-                counter += 1
-        if(area_array.size==0): return (None, None, None, None) #the array is empty
-        max_area_index = np.argmax(area_array) #return the index of the max_area element
-        cnt = contours[max_area_index]
-        (x, y, w, h) = cv2.boundingRect(cnt)
-        return (x, y, w, h)
+        return self.analyse(mask).returnMaxAreaRectangle()
 
     def drawMaxAreaRectangle(self, frame, mask, color=[0,255,0], thickness=3):
         """it draws the rectangle with largest area.
@@ -185,6 +544,16 @@ class BinaryMaskAnalyser:
         x, y, w, h = self.returnMaxAreaRectangle(mask)
         cv2.rectangle(frame, (x,y), (x+w,y+h), color, thickness)
 
+    def returnBlobArray(self, mask, min_area=0):
+        """it returns all the blobs of the mask with an area greater or equal than min_area
+
+        @param mask the binary image to use in the function
+        @param min_area the minimum area of the blobs
+        @return a structured array with dtype BLOB_DTYPE (see MaskAnalysis.returnBlobArray)
+        """
+        if(mask is None): return None
+        return self.analyse(mask).returnBlobArray(min_area)
+
     def returnMaxAreaCircle(self, mask):
         """it returns the circle sorrounding the contour with the largest area.
  
@@ -192,20 +561,7 @@ class BinaryMaskAnalyser:
         @return get the center (x, y) and the radius of the circle
         """
         if(mask is None): return (None, None, None)
-        mask = np.copy(mask)
-        if(len(mask.shape) == 3):
-            mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-        contours, hierarchy = cv2.findContours(mask, 1, 2)
-        area_array = np.zeros(len(contours)) #contains the area of the contours
-        counter = 0
-        for cnt in contours:   
-                area_array[counter] = cv2.contourArea(cnt)
-                counter += 1
-        if(area_array.size==0): return (None, None, None) #the array is empty
-        max_area_index = np.argmax(area_array) #return the index of the max_area element
-        cnt = contours[max_area_index]
-        (x,y),radius = cv2.minEnclosingCircle(cnt)
-        return (int(x),int(y), int(radius))
+        return self.analyse(mask).returnMaxAreaCircle()
 
     def drawMaxAreaCircle(self, frame, mask, color=[0,255,0], thickness=3):
         """it draws the circle with largest area.
@@ -218,3 +574,103 @@ class BinaryMaskAnalyser:
         x, y, r = self.returnMaxAreaCircle(mask)
         cv2.circle(frame, (x,y), r, color, thickness)
 
+
+class BlobAssociator:
+    """It associates the blobs of consecutive frames and assigns them stable IDs.
+
+    The blobs are the structured arrays returned by returnBlobArray(). The
+    blobs of a new frame are matched with the tracked blobs using the
+    intersection over union (IoU) of their rectangles or the distance of
+    their centres. The score of all the pairs is computed with matrix
+    operations and the pairs are assigned greedily starting from the best
+    one. A blob without a match gets a new ID. A track which is not matched
+    is kept for max_missed frames before being removed.
+    """
+
+    def __init__(self, method='iou', threshold=0.3, max_missed=0):
+        """Init the associator.
+
+        @param method the score used in the matching ('iou' or 'distance')
+        @param threshold with 'iou' the minimum IoU of a match, with 'distance'
+            the maximum distance (in pixels) between the centres of a match
+        @param max_missed number of frames a track is kept without matches
+        """
+        if method not in ASSOCIATION_METHODS:
+            raise ValueError('[DEEPGAZE] mask_analysis.py: the method must be one of ' + str(ASSOCIATION_METHODS))
+        self.method = method
+        self.threshold = threshold
+        self.max_missed = max_missed
+        self.reset()
+
+    def reset(self):
+        """Remove all the tracks.
+
+        """
+        self.track_id_array = np.zeros(0, dtype=np.int64)
+        self.track_blob_array = np.zeros(0, dtype=BLOB_DTYPE)
+        self.track_missed_array = np.zeros(0, dtype=np.int64)
+        self.next_id = 0
+
+    def _return_score_matrix(self, blob_array):
+        """Return the score of each pair track-blob, -inf for the pairs which can not be matched.
+
+        @param blob_array the blobs of the new frame
+        """
+        tracks = self.track_blob_array
+        if(self.method == 'iou'):
+            x1 = np.maximum(tracks['x'][:, np.newaxis], blob_array['x'][np.newaxis, :])
+            y1 = np.maximum(tracks['y'][:, np.newaxis], blob_array['y'][np.newaxis, :])
+            x2 = np.minimum((tracks['x'] + tracks['w'])[:, np.newaxis], (blob_array['x'] + blob_array['w'])[np.newaxis, :])
+            y2 = np.minimum((tracks['y'] + tracks['h'])[:, np.newaxis], (blob_array['y'] + blob_array['h'])[np.newaxis, :])
+            intersection = np.maximum(x2 - x1, 0).astype(np.float64) * np.maximum(y2 - y1, 0)
+            union = (tracks['w'] * tracks['h'].astype(np.float64))[:, np.newaxis] + (blob_array['w'] * blob_array['h'].astype(np.float64))[np.newaxis, :] - intersection
+            score_matrix = intersection / np.maximum(union, 1.0)
+            score_matrix[score_matrix < self.threshold] = -np.inf
+        else:
+            distance = np.hypot(tracks['cx'][:, np.newaxis] - blob_array['cx'][np.newaxis, :],
+                                tracks['cy'][:, np.newaxis] - blob_array['cy'][np.newaxis, :])
+            score_matrix = -distance
+            #NaN centres (blobs with zero area) are never matched
+            score_matrix[~(distance <= self.threshold)] = -np.inf
+        return score_matrix
+
+    def update(self, blob_array):
+        """Associate the blobs of a new frame with the tracks.
+
+        @param blob_array the blobs of the new frame (dtype BLOB_DTYPE)
+        @return an array with the ID of each blob
+        """
+        blob_id_array = np.full(blob_array.size, -1, dtype=np.int64)
+        track_matched = np.zeros(self.track_id_array.size, dtype=bool)
+        if(self.track_id_array.size > 0 and blob_array.size > 0):
+            score_matrix = self._return_score_matrix(blob_array)
+            #Greedy assignment: the valid pairs are sorted once from the best score
+            #and a pair is taken if its track and its blob are both still free
+            track_index_array, blob_index_array = np.nonzero(score_matrix != -np.inf)
+            order = np.argsort(-score_matrix[track_index_array, blob_index_array], kind='stable')
+            blob_matched = np.zeros(blob_array.size, dtype=bool)
+            matches_number = min(score_matrix.shape)
+            for track_index, blob_index in zip(track_index_array[order], blob_index_array[order]):
+                if(track_matched[track_index] == True or blob_matched[blob_index] == True): continue
+                blob_id_array[blob_index] = self.track_id_array[track_index]
+                track_matched[track_index] = True
+                blob_matched[blob_index] = True
+                matches_number -= 1
+                if(matches_number == 0): break
+        #New IDs for the blobs without a match
+        new_blobs = blob_id_array == -1
+        blob_id_array[new_blobs] = np.arange(self.next_id, self.next_id + np.count_nonzero(new_blobs))
+        self.next_id += np.count_nonzero(new_blobs)
+        #The unmatched tracks are kept for max_missed frames
+        self.track_missed_array += 1
+        keep = (~track_matched) & (self.track_missed_array <= self.max_missed)
+        self.track_id_array = np.concatenate((blob_id_array, self.track_id_array[keep]))
+        self.track_blob_array = np.concatenate((blob_array, self.track_blob_array[keep]))
+        self.track_missed_array = np.concatenate((np.zeros(blob_array.size, dtype=np.int64), self.track_missed_array[keep]))
+        return blob_id_array
+
+    def returnTrackIdArray(self):
+        """it returns the IDs of the tracks (including the ones missed in the last frames)
+
+        """
+        return self.track_id_array
@@ -137,7 +137,11 @@ class Mog2MotionDetector:
         """Init the color detector object.
 
         """
-        self.BackgroundSubtractorMOG2 = cv2.BackgroundSubtractorMOG2()
+        #In OpenCV 3 and later the constructor is replaced by a factory function
+        if(hasattr(cv2, 'createBackgroundSubtractorMOG2')):
+            self.BackgroundSubtractorMOG2 = cv2.createBackgroundSubtractorMOG2()
+        else:
+            self.BackgroundSubtractorMOG2 = cv2.BackgroundSubtractorMOG2()
 
 
     def returnMask(self, foreground_image):
@@ -13,10 +13,46 @@
 #https://github.com/rlabbe/Kalman-and-Bayesian-Filters-in-Python
 
 import numpy as np
-from numpy.random import uniform
 import cv2
 import sys
 
+
+def _sample_probability_map(probability_map, coords, box_width=0, box_height=0, x_offset=0, y_offset=0):
+    """Return the value of a probability map at the given coords.
+
+    The map is sampled with a vectorised gather. When a box size is given
+    each coord is the center of a box and the value is the mean of the map
+    inside the box, obtained from the integral image with four gathers.
+    Coords (and box areas) outside the map get zero probability.
+    @param probability_map a single channel image (e.g. backprojection or saliency map)
+    @param coords array of shape (..., 2) containing (x,y) coords in the frame
+    @param box_width the width of the box centred on each coord (0 for a single pixel)
+    @param box_height the height of the box centred on each coord (0 for a single pixel)
+    @param x_offset the X coord in the frame of the first column of the map
+    @param y_offset the Y coord in the frame of the first row of the map
+    @return an array of shape (...) containing the values
+    """
+    if(probability_map.ndim != 2):
+        raise ValueError('[DEEPGAZE] motion_tracking.py: the probability map must be a single channel image')
+    if((box_width > 0) != (box_height > 0)):
+        raise ValueError('[DEEPGAZE] motion_tracking.py: the box_width and box_height must be both greater than zero (box) or both zero (single pixel)')
+    rows, cols = probability_map.shape
+    x = np.floor(coords[..., 0] - x_offset).astype(np.intp)
+    y = np.floor(coords[..., 1] - y_offset).astype(np.intp)
+    if(box_width <= 0):
+        inside = (x >= 0) & (x < cols) & (y >= 0) & (y < rows)
+        values = np.zeros(x.shape)
+        values[inside] = probability_map[y[inside], x[inside]]
+        return values
+    integral = cv2.integral(probability_map, sdepth=cv2.CV_64F)
+    x_min = np.clip(x - box_width//2, 0, cols)
+    x_max = np.clip(x - box_width//2 + box_width, 0, cols)
+    y_min = np.clip(y - box_height//2, 0, rows)
+    y_max = np.clip(y - box_height//2 + box_height, 0, rows)
+    box_sum = integral[y_max, x_max] - integral[y_min, x_max] - integral[y_max, x_min] + integral[y_min, x_min]
+    return box_sum / float(box_width * box_height)
+
+
 class ParticleFilter:
     """Particle filter motion tracking.
 
@@ -24,20 +60,42 @@ class ParticleFilter:
     in a image. It can be used to predict the position of a
     landmark for example when tracking some face features, or
     to track the corner of a bounding box.
+    Two state models are available:
+    'position' the state of each particle is [x, y] and the velocity is given to predict()
+    'constant_velocity' the state is [x, y, x_velocity, y_velocity, scale], the velocity
+        and the scale of each particle are part of the state and they are estimated by the filter
     """
 
-    def __init__(self, width, height, N):
+    def __init__(self, width, height, N, state_model='position', box_width=0, box_height=0, dtype=np.float32, seed=None):
         """Init the particle filter.
 
         @param width the width of the frame
         @param height the height of the frame
         @param N the number of particles
+        @param state_model the state of the particles, 'position' or 'constant_velocity'
+        @param box_width the width of the tracked object at scale 1.0 (returned by estimate)
+        @param box_height the height of the tracked object at scale 1.0 (returned by estimate)
+        @param dtype the type used to store the particles (np.float32 or np.float64)
+        @param seed the seed of the random generator used in the initialisation, prediction and resampling
         """
         if(N <= 0 or N>(width*height)): 
             raise ValueError('[DEEPGAZE] motion_tracking.py: the ParticleFilter class does not accept a value of N which is <= 0 or >(widht*height)')
-        self.particles = np.empty((N, 2))
-        self.particles[:, 0] = uniform(0, width, size=N) #init the X coord
-        self.particles[:, 1] = uniform(0, height, size=N) #init the Y coord
+        if(state_model == 'position'): state_size = 2
+        elif(state_model == 'constant_velocity'): state_size = 5
+        else:
+            raise ValueError("[DEEPGAZE] motion_tracking.py: the state model '" + str(state_model) + "' is not implemented")
+        self.width = width
+        self.height = height
+        self.state_model = state_model
+        self.box_width = box_width
+        self.box_height = box_height
+        #The generator and the noise buffer are reused at each prediction
+        self.generator = np.random.default_rng(seed)
+        self.noise = np.empty((N, state_size), dtype=dtype)
+        self.particles = np.zeros((N, state_size), dtype=dtype)
+        self.particles[:, 0] = self.generator.uniform(0, width, size=N) #init the X coord
+        self.particles[:, 1] = self.generator.uniform(0, height, size=N) #init the Y coord
+        if(state_model == 'constant_velocity'): self.particles[:, 4] = 1.0 #init the scale
         #Init the weiths vector as a uniform distribution
         #at the begining each particle has the same probability
         #to represent the point we are following
@@ -45,21 +103,36 @@ class ParticleFilter:
         self.weights = np.array([1.0/N]*N)
         #self.weights.fill(1.0/N) #normalised values
 
-    def predict(self, x_velocity, y_velocity, std ):
+    def predict(self, x_velocity, y_velocity, std, velocity_std=0.0, scale_std=0.0):
         """Predict the position of the point in the next frame.
         Move the particles based on how the real system is predicted to behave.
  
         The position of the point at the next time step is predicted using the 
         estimated velocity along X and Y axis and adding Gaussian noise sampled 
         from a distribution with MEAN=0.0 and STD=std. It is a linear model.
+        With the 'constant_velocity' model the velocity of each particle is
+        added to the velocity given as argument, then Gaussian noise is
+        added to the velocity (velocity_std) and to the scale (scale_std).
         @param x_velocity the velocity of the object along the X axis in terms of pixels/frame
         @param y_velocity the velocity of the object along the Y axis in terms of pixels/frame
         @param std the standard deviation of the gaussian distribution used to add noise
+        @param velocity_std the standard deviation of the noise on the velocity ('constant_velocity' only)
+        @param scale_std the standard deviation of the noise on the scale ('constant_velocity' only)
         """
+        #The noise is generated in place in the buffer, without allocations
+        self.generator.standard_normal(out=self.noise, dtype=self.noise.dtype)
+        self.noise[:, 0:2] *= std
         #To predict the position of the point at the next step we take the
         #previous position and we add the estimated speed and Gaussian noise
-        self.particles[:, 0] += x_velocity + (np.random.randn(len(self.particles)) * std) #predict the X coord
-        self.particles[:, 1] += y_velocity + (np.random.randn(len(self.particles)) * std) #predict the Y coord
+        self.particles[:, 0] += x_velocity #predict the X coord
+        self.particles[:, 1] += y_velocity #predict the Y coord
+        if(self.state_model == 'constant_velocity'):
+            self.noise[:, 2:4] *= velocity_std
+            self.noise[:, 4] *= scale_std
+            self.particles[:, 0:2] += self.particles[:, 2:4]
+        self.particles += self.noise
+        if(self.state_model == 'constant_velocity'):
+            np.maximum(self.particles[:, 4], 0.0, out=self.particles[:, 4]) #the scale can not be negative
 
     def update(self, x, y):
         """Update the weights associated which each particle based on the (x,y) coords measured.
@@ -78,7 +151,7 @@ class ParticleFilter:
         position[:, 1].fill(y)
         #1- We can take the difference between each particle new
         #position and the measurement. In this case is the Euclidean Distance.
-        distance = np.linalg.norm(self.particles - position, axis=1)
+        distance = np.linalg.norm(self.particles[:, 0:2] - position, axis=1)
         #2- Particles which are closer to the real position have smaller
         #Euclidean Distance, here we subtract the maximum distance in order
         #to get the opposite (particles close to the real position have
@@ -92,18 +165,46 @@ class ParticleFilter:
         #4- after the multiplication the sum of the weights won't be 1. 
         #Renormalize by dividing all the weights by the sum of all the weights.
         self.weights += 1.e-300 #avoid zeros
-        self.weights /= sum(self.weights) #normalize
+        self.weights /= np.sum(self.weights) #normalize
+
+    def updateFromMap(self, probability_map, box_width=0, box_height=0, x_offset=0, y_offset=0):
+        """Update the weights of the particles using a probability map.
+
+        Each particle is scored with the value of the map at its coords, for
+        example the output of BackProjectionColorDetector.returnMask() or
+        FasaSaliencyMapping.returnMask(). With box_width and box_height the
+        particle is the center of a box scored with the mean of the map in
+        the box (obtained from the integral image). The map can cover only the
+        neighbourhood of the particles (see returnParticlesBoundingBox), in this
+        case x_offset and y_offset are the position of the map in the frame.
+        @param probability_map a single channel image
+        @param box_width the width of the box centred on each particle (0 for a single pixel)
+        @param box_height the height of the box centred on each particle (0 for a single pixel)
+        @param x_offset the X coord in the frame of the first column of the map
+        @param y_offset the Y coord in the frame of the first row of the map
+        """
+        self.weights[:] = _sample_probability_map(probability_map, self.particles[:, 0:2], box_width, box_height, x_offset, y_offset)
+        self.weights += 1.e-300 #avoid zeros
+        self.weights /= np.sum(self.weights) #normalize
 
     def estimate(self):
         """Estimate the position of the point given the particle weights.
  
-        This function get the mean and variance associated with the point to estimate.
-        @return get the x_mean, y_mean and the x_var, y_var 
+        This function get the mean position of the point and the size of the
+        tracked object (box_width and box_height multiplied by the mean scale
+        with the 'constant_velocity' model).
+        @return get the x_mean, y_mean and the width, height
         """
         #Using the weighted average of the particles
         #gives an estimation of the position of the point
         x_mean = np.average(self.particles[:, 0], weights=self.weights, axis=0).astype(int)
         y_mean = np.average(self.particles[:, 1], weights=self.weights, axis=0).astype(int)
+        if(self.state_model == 'constant_velocity'):
+            scale_mean = np.average(self.particles[:, 4], weights=self.weights, axis=0)
+        else:
+            scale_mean = 1.0
+        width = int(self.box_width * scale_mean)
+        height = int(self.box_height * scale_mean)
 
         #mean = np.average(self.particles[:, 0:2], weights=self.weights, axis=0)
         #var  = np.average((self.particles[:, 0:2] - mean)**2, weights=self.weights, axis=0)
@@ -111,7 +212,7 @@ class ParticleFilter:
         #y_mean = int(mean[1])
         #x_var = int(var[0])
         #y_var = int(var[1])
-        return x_mean, y_mean, 0, 0
+        return x_mean, y_mean, width, height
 
     def resample(self, method='residual'):
         """Resample the particle based on their weights.
@@ -150,49 +251,35 @@ class ParticleFilter:
             #that most closely matches that number. Large weights occupy 
             #more space than low weights, so they will be more likely 
             #to be selected.
-            indices = np.searchsorted(cumulative_sum, np.random.uniform(low=0.0, high=1.0, size=N))      
+            indices = np.searchsorted(cumulative_sum, self.generator.uniform(low=0.0, high=1.0, size=N))      
         elif(method == 'residual'):
-            indices = np.zeros(N, dtype=np.int32)
             # take int(N*w) copies of each weight
             num_copies = (N*np.asarray(self.weights)).astype(int)
-            k = 0
-            for i in range(N):
-                for _ in range(num_copies[i]): # make n copies
-                    indices[k] = i
-                    k += 1
-            #multinormial resample
-            residual = self.weights - num_copies     # get fractional part
-            residual /= sum(residual)     # normalize
-            cumulative_sum = np.cumsum(residual)
-            cumulative_sum[-1] = 1. # ensures sum is exactly one
-            indices[k:N] = np.searchsorted(cumulative_sum, np.random.random(N-k))
+            indices = np.zeros(N, dtype=np.int32)
+            k = np.sum(num_copies)
+            indices[0:k] = np.repeat(np.arange(N), num_copies) # make n copies
+            if(k < N):
+                #multinormial resample on the fractional part
+                residual = N*np.asarray(self.weights) - num_copies     # get fractional part
+                residual /= np.sum(residual)     # normalize
+                cumulative_sum = np.cumsum(residual)
+                cumulative_sum[-1] = 1. # ensures sum is exactly one
+                indices[k:N] = np.searchsorted(cumulative_sum, self.generator.random(N-k))
         elif(method == 'stratified'):
             #N subsets, chose a random position within each one
             #and generate a vector containing this positions
-            positions = (np.random.random(N) + range(N)) / N
-            #generate the empty indices vector
-            indices = np.zeros(N, dtype=np.int32)
+            positions = (self.generator.random(N) + np.arange(N)) / N
             #get the cumulative sum
             cumulative_sum = np.cumsum(self.weights)
-            i, j = 0, 0
-            while i < N:
-                if positions[i] < cumulative_sum[j]:
-                    indices[i] = j
-                    i += 1
-                else:
-                    j += 1
+            cumulative_sum[-1] = 1. #avoid round-off error
+            #index of the first cumulative weight greater than each position
+            indices = np.searchsorted(cumulative_sum, positions, side='right')
         elif(method == 'systematic'):
             # make N subsets, choose positions with a random offset
-            positions = (np.arange(N) + np.random.random()) / N
-            indices = np.zeros(N, dtype=np.int32)
+            positions = (np.arange(N) + self.generator.random()) / N
             cumulative_sum = np.cumsum(self.weights)
-            i, j = 0, 0
-            while i < N:
-                if positions[i] < cumulative_sum[j]:
-                    indices[i] = j
-                    i += 1
-                else:
-                    j += 1
+            cumulative_sum[-1] = 1. #avoid round-off error
+            indices = np.searchsorted(cumulative_sum, positions, side='right')
         else:
             raise ValueError("[DEEPGAZE] motion_tracking.py: the resempling method selected '" + str(method) + "' is not implemented")
         #Create a new set of particles by randomly choosing particles 
@@ -224,9 +311,25 @@ class ParticleFilter:
         @return a single coordinate (x,y) or the entire array
         """
         if(index<0):
-            return self.particles.astype(int)
+            return self.particles[:, 0:2].astype(int)
         else:
-            return self.particles[index,:].astype(int)
+            return self.particles[index, 0:2].astype(int)
+
+    def returnParticlesBoundingBox(self, margin=0):
+        """It returns the rectangle containing all the particles.
+
+        The rectangle is clipped to the frame and it can be used to evaluate
+        a probability map only in the neighbourhood of the particles.
+        @param margin the number of pixels added on each side of the rectangle
+        @return the rectangle as x, y, w, h
+        """
+        x_min, y_min = np.floor(np.amin(self.particles[:, 0:2], axis=0) - margin).astype(int)
+        x_max, y_max = np.ceil(np.amax(self.particles[:, 0:2], axis=0) + margin).astype(int)
+        x_min = int(min(max(x_min, 0), self.width))
+        y_min = int(min(max(y_min, 0), self.height))
+        x_max = int(min(max(x_max, x_min), self.width))
+        y_max = int(min(max(y_max, y_min), self.height))
+        return x_min, y_min, x_max - x_min, y_max - y_min
 
     def drawParticles(self, frame, color=[0,0,255], radius=2):
         """Draw the particles on a frame and return it.
@@ -236,7 +339,332 @@ class ParticleFilter:
         @param radius is the radius of the particles
         @return the frame with particles
         """
-        for x_particle, y_particle in self.particles.astype(int):
-            cv2.circle(frame, (x_particle, y_particle), radius, color, -1) #RED: Particles
+        for x_particle, y_particle in self.particles[:, 0:2].astype(int):
+            cv2.circle(frame, (int(x_particle), int(y_particle)), radius, color, -1) #RED: Particles
+
+
+
+
+def _batched_searchsorted(cumulative_sum, positions, rows):
+    """Search each position in the cumulative sum of its own row.
+
+    Row t is shifted by t (an exact integer offset in float64) so that a
+    single call to np.searchsorted is enough for all the rows. The shift is
+    done in place on both arrays, which are temporaries of the caller, then
+    the positions are sorted to make the search faster (the rows do not
+    change since they are sorted too) and the indices are clipped to their row.
+    @param cumulative_sum float64 array of shape (T, N), each row ending with 1.0 (modified)
+    @param positions float64 array of shape (M,) with values in [0.0, 1.0) (modified)
+    @param rows the sorted row of each position, integer array of shape (M,)
+    @return a sorted array of shape (M,) containing flat indices in the range [t*N, t*N+N-1]
+    """
+    T, N = cumulative_sum.shape
+    cumulative_sum += np.arange(T, dtype=np.float64)[:, np.newaxis]
+    positions += rows
+    positions.sort()
+    indices = np.searchsorted(cumulative_sum.ravel(), positions)
+    first = rows * N
+    return np.clip(indices, first, first + N - 1)
+
+
+def _batched_copies(cumulative_sum, positions_below):
+    """Return the number of copies of each particle from the positions below each cumulative weight.
+
+    @param cumulative_sum array of shape (T, N)
+    @param positions_below array of shape (T, N), the number of positions lower than each cumulative weight
+    @return an integer array of shape (T, N), each row sums to N
+    """
+    N = cumulative_sum.shape[1]
+    positions_below = np.clip(positions_below, 0, N).astype(np.intp)
+    positions_below[:, -1] = N #the last cumulative weight is 1.0
+    return np.diff(positions_below, axis=1, prepend=0)
+
+
+class MultiParticleFilter:
+    """Particle filter motion tracking of multiple points.
+
+    This class estimates the position of multiple points in a image,
+    using the same model of the ParticleFilter class. The particles of all
+    the targets are stored in a single array of shape (capacity, N, 2) and
+    the predict, update, estimate and resample steps are batched operations
+    on the targets. The targets occupy the first slots of the array, the order
+    is the one returned by returnTargetIdList(). The array grows by doubling
+    its capacity, a removed target is replaced by the last one.
+    """
+
+    def __init__(self, width, height, N, capacity=8, seed=None, dtype=np.float32):
+        """Init the particle filter.
+
+        @param width the width of the frame
+        @param height the height of the frame
+        @param N the number of particles of each target
+        @param capacity the number of targets which can be added before growing the arrays
+        @param seed the seed of the random generator used for all the targets
+        @param dtype the type used to store the particles (np.float32 or np.float64)
+        """
+        if(N <= 0 or N>(width*height)):
+            raise ValueError('[DEEPGAZE] motion_tracking.py: the MultiParticleFilter class does not accept a value of N which is <= 0 or >(widht*height)')
+        if(capacity <= 0):
+            raise ValueError('[DEEPGAZE] motion_tracking.py: the MultiParticleFilter class does not accept a capacity <= 0')
+        self.width = width
+        self.height = height
+        self.N = N
+        self.generator = np.random.default_rng(seed)
+        #The noise buffer is reused at each prediction
+        self.particles = np.empty((capacity, N, 2), dtype=dtype)
+        self.noise = np.empty((capacity, N, 2), dtype=dtype)
+        self.weights = np.empty((capacity, N))
+        self.targets_number = 0
+        #id of the target in each slot, and slot of each target id
+        self.target_id_list = list()
+        self.target_slot_dict = dict()
+        self.next_target_id = 0
+
+    def _grow(self):
+        """Double the capacity of the particles and weights arrays.
+
+        """
+        capacity = self.particles.shape[0]
+        self.particles = np.concatenate((self.particles, np.empty_like(self.particles)), axis=0)
+        self.noise = np.concatenate((self.noise, np.empty_like(self.noise)), axis=0)
+        self.weights = np.concatenate((self.weights, np.empty((capacity, self.N))), axis=0)
+
+    def addTarget(self, x=None, y=None, std=25):
+        """Add a new target to the filter.
+
+        The particles of the new target are sampled uniformly on the frame
+        (as in the ParticleFilter class) or from a Gaussian distribution
+        centred in (x,y) if the position is given.
+        @param x the position of the target in the X axis (optional)
+        @param y the position of the target in the Y axis (optional)
+        @param std the standard deviation of the gaussian distribution used with (x,y)
+        @return the id of the new target
+        """
+        if(self.targets_number == self.particles.shape[0]): self._grow()
+        slot = self.targets_number
+        if(x is None or y is None):
+            self.particles[slot, :, 0] = self.generator.uniform(0, self.width, size=self.N) #init the X coord
+            self.particles[slot, :, 1] = self.generator.uniform(0, self.height, size=self.N) #init the Y coord
+        else:
+            self.particles[slot, :, 0] = x + (self.generator.standard_normal(self.N) * std)
+            self.particles[slot, :, 1] = y + (self.generator.standard_normal(self.N) * std)
+        self.weights[slot, :] = 1.0/self.N
+        target_id = self.next_target_id
+        self.next_target_id += 1
+        self.target_id_list.append(target_id)
+        self.target_slot_dict[target_id] = slot
+        self.targets_number += 1
+        return target_id
+
+    def removeTarget(self, target_id):
+        """Remove a target from the filter.
+
+        The last target is moved in the slot of the removed one,
+        the arrays are never reallocated.
+        @param target_id the id returned by addTarget
+        """
+        if(target_id not in self.target_slot_dict):
+            raise ValueError('[DEEPGAZE] motion_tracking.py: the target id ' + str(target_id) + ' is not in the MultiParticleFilter')
+        slot = self.target_slot_dict.pop(target_id)
+        last = self.targets_number - 1
+        if(slot != last):
+            self.particles[slot] = self.particles[last]
+            self.weights[slot] = self.weights[last]
+            last_id = self.target_id_list[last]
+            self.target_id_list[slot] = last_id
+            self.target_slot_dict[last_id] = slot
+        self.target_id_list.pop()
+        self.targets_number -= 1
+
+    def returnTargetIdList(self):
+        """Return the ids of the targets, in the order used by the arrays.
+
+        @return a list of ids
+        """
+        return list(self.target_id_list)
+
+    def returnTargetsNumber(self):
+        """Return the number of targets.
+
+        @return the number of targets
+        """
+        return self.targets_number
+
+    def predict(self, x_velocity, y_velocity, std):
+        """Predict the position of the points in the next frame.
+
+        Same linear model of ParticleFilter.predict applied to all the targets.
+        @param x_velocity the velocity along the X axis, a scalar or an array with one value per target
+        @param y_velocity the velocity along the Y axis, a scalar or an array with one value per target
+        @param std the standard deviation of the gaussian noise, a scalar or an array with one value per target
+        """
+        T = self.targets_number
+        if(T == 0): return
+        #The noise is generated in place in the buffer, without allocations
+        noise = self.noise[0:T]
+        self.generator.standard_normal(out=noise, dtype=noise.dtype)
+        if(np.ndim(std) == 0): noise *= std
+        else: noise *= np.reshape(np.asarray(std, dtype=noise.dtype), (T, 1, 1))
+        self.particles[0:T, :, 0] += np.reshape(x_velocity, (-1, 1))
+        self.particles[0:T, :, 1] += np.reshape(y_velocity, (-1, 1))
+        self.particles[0:T] += noise
+
+    def update(self, x, y):
+        """Update the weights of the particles based on the (x,y) coords measured.
+
+        Same model of ParticleFilter.update applied to all the targets.
+        The targets with a NaN measurement keep their weights.
+        @param x array with the position of each target in the X axis
+        @param y array with the position of each target in the Y axis
+        """
+        T = self.targets_number
+        if(T == 0): return
+        x = np.broadcast_to(np.asarray(x, dtype=np.float64), (T,))
+        y = np.broadcast_to(np.asarray(y, dtype=np.float64), (T,))
+        measured = np.logical_not(np.isnan(x) | np.isnan(y))
+        particles = self.particles[0:T]
+        if(np.all(measured) == False):
+            particles = particles[measured]
+            x = x[measured]
+            y = y[measured]
+        #Euclidean distance of each particle from the measurement
+        distance = np.hypot(particles[:, :, 0] - x[:, np.newaxis], particles[:, :, 1] - y[:, np.newaxis])
+        #Particles closer to the measurement get an higher weight
+        distance = np.amax(distance, axis=1, keepdims=True) - distance
+        distance += 1.e-300 #avoid zeros
+        distance /= np.sum(distance, axis=1, keepdims=True) #normalize
+        self.weights[0:T][measured] = distance
+
+    def updateFromMap(self, probability_map, box_width=0, box_height=0, x_offset=0, y_offset=0):
+        """Update the weights of the particles of all the targets using a probability map.
+
+        Same model of ParticleFilter.updateFromMap, the map is sampled
+        at the coords of all the particles with a single gather.
+        @param probability_map a single channel image
+        @param box_width the width of the box centred on each particle (0 for a single pixel)
+        @param box_height the height of the box centred on each particle (0 for a single pixel)
+        @param x_offset the X coord in the frame of the first column of the map
+        @param y_offset the Y coord in the frame of the first row of the map
+        """
+        T = self.targets_number
+        if(T == 0): return
+        weights = _sample_probability_map(probability_map, self.particles[0:T], box_width, box_height, x_offset, y_offset)
+        weights += 1.e-300 #avoid zeros
+        weights /= np.sum(weights, axis=1, keepdims=True) #normalize
+        self.weights[0:T] = weights
+
+    def estimate(self):
+        """Estimate the position of the points given the particle weights.
+
+        @return an array of shape (T, 2) containing the (x,y) position of each target
+        """
+        T = self.targets_number
+        mean = np.einsum('tn,tnk->tk', self.weights[0:T], self.particles[0:T])
+        mean /= np.sum(self.weights[0:T], axis=1)[:, np.newaxis]
+        return mean.astype(int)
+
+    def resample(self, method='residual'):
+        """Resample the particles of all the targets based on their weights.
+
+        The methods are the same of ParticleFilter.resample and they are
+        applied to all the targets at once. Each method returns the number
+        of copies of each particle, the particles of a target are then
+        gathered in the order of their index.
+        'multinomal' and 'residual' search the random draws in the cumulative
+        sums of their own target, 'residual' draws only the particles which
+        are not copied. 'stratified' and 'systematic' do not need a search:
+        the number of positions lower than each cumulative weight is computed
+        directly from the position of the weight in the N subsets.
+        @param method the algorithm to use for the resampling.
+            'multinomal', 'residual' (default value), 'stratified', 'systematic'
+        """
+        T = self.targets_number
+        N = self.N
+        if(T == 0): return
+        weights = self.weights[0:T]
+        if(method == 'multinomal'):
+            cumulative_sum = np.cumsum(weights, axis=1)
+            cumulative_sum[:, -1] = 1. #avoid round-off error
+            rows = np.repeat(np.arange(T), N)
+            indices = _batched_searchsorted(cumulative_sum, self.generator.random(T*N), rows)
+        elif(method == 'residual'):
+            # take int(N*w) copies of each weight
+            scaled_weights = N*weights
+            num_copies = scaled_weights.astype(np.intp)
+            #multinormial resample on the fractional part, only N-k draws for each target
+            residual = scaled_weights - num_copies
+            residual_sum = np.sum(residual, axis=1, keepdims=True)
+            residual /= np.where(residual_sum > 0, residual_sum, 1.0)
+            cumulative_sum = np.cumsum(residual, axis=1)
+            cumulative_sum[:, -1] = 1. # ensures sum is exactly one
+            rows = np.repeat(np.arange(T), N - np.sum(num_copies, axis=1))
+            residual_indices = _batched_searchsorted(cumulative_sum, self.generator.random(rows.size), rows)
+            copies = num_copies.ravel() + np.bincount(residual_indices, minlength=T*N)
+            indices = np.repeat(np.arange(T*N), copies)
+        elif(method == 'stratified' or method == 'systematic'):
+            #The positions are (k + u)/N, the particle j is selected by the
+            #positions in [cumulative_sum[j-1], cumulative_sum[j])
+            scaled_sum = np.cumsum(weights, axis=1)
+            scaled_sum *= N
+            if(method == 'stratified'):
+                #N subsets, chose a random position u_k within each one: the positions
+                #of the subsets before floor(N*c) are lower than c, the one of the
+                #subset floor(N*c) is lower if u_k < N*c - floor(N*c)
+                offsets = self.generator.random((T, N))
+                subset = np.floor(scaled_sum)
+                subset_index = np.minimum(subset, N-1).astype(np.intp)
+                positions_below = subset + (np.take_along_axis(offsets, subset_index, axis=1) < scaled_sum - subset)
+            else:
+                #N subsets, same random offset u for all the subsets of a target:
+                #the positions lower than c are the ones with k < N*c - u
+                positions_below = np.ceil(scaled_sum - self.generator.random((T, 1)))
+            copies = _batched_copies(scaled_sum, positions_below)
+            indices = np.repeat(np.arange(T*N), copies.ravel())
+        else:
+            raise ValueError("[DEEPGAZE] motion_tracking.py: the resempling method selected '" + str(method) + "' is not implemented")
+        #Gather on the flat arrays of particles and weights (np.take is faster than fancy indexing)
+        self.particles[0:T] = np.take(self.particles[0:T].reshape(T*N, 2), indices, axis=0).reshape(T, N, 2)
+        self.weights[0:T] = np.take(weights.ravel(), indices).reshape(T, N)
+        self.weights[0:T] /= np.sum(self.weights[0:T], axis=1, keepdims=True)
+
+    def returnParticlesContribution(self):
+        """Return the effective N of each target (see ParticleFilter.returnParticlesContribution).
+
+        @return an array containing the effective N value of each target
+        """
+        return 1.0 / np.sum(np.square(self.weights[0:self.targets_number]), axis=1)
 
+    def returnParticlesCoordinates(self, target_id):
+        """It returns the (x,y) coords of the particles of a target.
 
+        @param target_id the id returned by addTarget
+        @return an array of shape (N, 2)
+        """
+        if(target_id not in self.target_slot_dict):
+            raise ValueError('[DEEPGAZE] motion_tracking.py: the target id ' + str(target_id) + ' is not in the MultiParticleFilter')
+        return self.particles[self.target_slot_dict[target_id]].astype(int)
+
+    def returnParticlesBoundingBox(self, margin=0):
+        """It returns the rectangle containing the particles of each target.
+
+        @param margin the number of pixels added on each side of the rectangles
+        @return an array of shape (T, 4) containing the rectangles as x, y, w, h
+        """
+        T = self.targets_number
+        xy_min = np.floor(np.amin(self.particles[0:T], axis=1) - margin).astype(int)
+        xy_max = np.ceil(np.amax(self.particles[0:T], axis=1) + margin).astype(int)
+        xy_min = np.clip(xy_min, 0, [self.width, self.height])
+        xy_max = np.clip(np.maximum(xy_max, xy_min), 0, [self.width, self.height])
+        return np.hstack((xy_min, xy_max - xy_min))
+
+    def drawParticles(self, frame, color=[0,0,255], radius=2):
+        """Draw the particles of all the targets on a frame and return it.
+
+        @param frame the image to draw
+        @param color the color in BGR format, ex: [0,0,255] (red)
+        @param radius is the radius of the particles
+        @return the frame with particles
+        """
+        for x_particle, y_particle in self.particles[0:self.targets_number].reshape(-1, 2).astype(int):
+            cv2.circle(frame, (int(x_particle), int(y_particle)), radius, color, -1)
+        return frame
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of the HistogramColorClassifier with a large number of models.
+#The models are random images made of a few colours, the comparison of a batch of query images
+#with the matrix operations is compared against a cv2.compareHist call
+#for each pair image-model (the previous implementation).
+#The top-k search is run with and without the approximate index, the recall
+#is the fraction of the exact top-k models returned by the approximate search.
+#The last test compares the dense classification of a frame (returnBestMatchMap)
+#against a call to returnHistogramComparisonArray for each window.
+
+import numpy as np
+import cv2
+from timeit import default_timer as timer
+from deepgaze.color_classification import HistogramColorClassifier
+
+MODELS = [1000, 20000]
+QUERIES = 16
+METHODS = ['intersection', 'correlation', 'chisqr', 'bhattacharyya']
+TOP_K = 5
+DENSE_MODELS = 200
+DENSE_FRAME_SIZE = (640, 480)
+DENSE_WINDOW_SIZE = (64, 64)
+DENSE_STEP = 16
+
+
+def return_random_image(size):
+    """Return an image made of four random colours with some noise.
+
+    """
+    palette = np.random.randint(0, 256, size=(4, 3))
+    image = palette[np.random.randint(0, 4, size=(size, size))] + np.random.randint(-10, 10, size=(size, size, 3))
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def main():
+    image_list = [return_random_image(64) for _ in range(QUERIES)]
+    for M in MODELS:
+        print("=== " + str(M) + " models ===")
+        my_classifier = HistogramColorClassifier(channels=[0, 1, 2], hist_size=[10, 10, 10], hist_range=[0, 256, 0, 256, 0, 256], hist_type='BGR')
+        for i in range(M):
+            my_classifier.addModelHistogram(return_random_image(16))
+        query_hist_list = [my_classifier._return_histogram(image) for image in image_list]
+        for method in METHODS:
+            start = timer()
+            comparison_loop = np.array([[my_classifier.returnHistogramComparison(query_hist, model_hist, method=method)
+                                         for model_hist in my_classifier.returnModelMatrix()]
+                                        for query_hist in query_hist_list])
+            time_loop = timer() - start
+            my_classifier.returnHistogramComparisonMatrix(image_list[0:1], method=method) #fill the model cache
+            start = timer()
+            comparison_matrix = my_classifier.returnHistogramComparisonMatrix(image_list, method=method)
+            time_matrix = timer() - start
+            print("%-14s cv2.compareHist loop %.4f seconds, matrix %.4f seconds (x%.1f), max difference %.2e"
+                  % (method, time_loop, time_matrix, time_loop / time_matrix, np.amax(np.absolute(comparison_loop - comparison_matrix))))
+        my_classifier.buildApproximateIndex()
+        for method in METHODS:
+            start = timer()
+            exact_list = [my_classifier.returnTopMatches(image, k=TOP_K, method=method)[0] for image in image_list]
+            time_exact = (timer() - start) / QUERIES
+            start = timer()
+            approximate_list = [my_classifier.returnTopMatches(image, k=TOP_K, method=method, approximate=True)[0] for image in image_list]
+            time_approximate = (timer() - start) / QUERIES
+            recall = np.mean([len(set(exact) & set(approximate)) / float(TOP_K) for exact, approximate in zip(exact_list, approximate_list)])
+            print("%-14s top-%d exact %.4f seconds, approximate %.4f seconds, recall %.2f"
+                  % (method, TOP_K, time_exact, time_approximate, recall))
+        print("")
+    print("=== dense classification, " + str(DENSE_MODELS) + " models ===")
+    my_classifier = HistogramColorClassifier(channels=[0, 1, 2], hist_size=[10, 10, 10], hist_range=[0, 256, 0, 256, 0, 256], hist_type='BGR')
+    for i in range(DENSE_MODELS):
+        my_classifier.addModelHistogram(return_random_image(16))
+    frame = cv2.resize(return_random_image(32), DENSE_FRAME_SIZE, interpolation=cv2.INTER_NEAREST)
+    window_width, window_height = DENSE_WINDOW_SIZE
+    for method in METHODS:
+        start = timer()
+        index_map, _ = my_classifier.returnBestMatchMap(frame, window_size=DENSE_WINDOW_SIZE, step=DENSE_STEP, method=method)
+        time_dense = timer() - start
+        start = timer()
+        index_map_loop = np.zeros(index_map.shape, dtype=np.intp)
+        for i in range(index_map.shape[0]):
+            for j in range(index_map.shape[1]):
+                window = frame[i*DENSE_STEP:i*DENSE_STEP+window_height, j*DENSE_STEP:j*DENSE_STEP+window_width]
+                comparison_array = my_classifier.returnHistogramComparisonArray(window, method=method)
+                if(method in ['chisqr', 'bhattacharyya']): index_map_loop[i, j] = np.argmin(comparison_array)
+                else: index_map_loop[i, j] = np.argmax(comparison_array)
+        time_loop = timer() - start
+        print("%-14s %d windows: loop %.4f seconds, integral histogram %.4f seconds (x%.1f), same best match %.3f"
+              % (method, index_map.size, time_loop, time_dense, time_loop / time_dense, np.mean(index_map == index_map_loop)))
+
+
+if __name__ == "__main__":
+    main()
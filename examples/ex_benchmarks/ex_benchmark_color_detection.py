@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of the BackProjectionColorDetector on a stream of frames.
+#The tiger image is resized to 640x480 and 1920x1080 and the mask is
+#returned with and without a caller-provided output buffer, as a single
+#channel image and with the H/S lookup table (no filtering).
+#The MultiBackProjectionColorDetector is run with the five models with and
+#without the fused histogram, the difference is the fraction of pixels
+#where the two masks are different.
+
+import os
+import numpy as np
+import cv2
+from timeit import default_timer as timer
+from deepgaze.color_detection import BackProjectionColorDetector
+from deepgaze.color_detection import MultiBackProjectionColorDetector
+
+FRAME_SIZES = [(640, 480), (1920, 1080)]
+FRAMES = 100
+DIR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ex_color_detection_image')
+
+
+def main():
+    image = cv2.imread(os.path.join(DIR_PATH, 'tiger.jpg'))
+    template_list = [cv2.imread(os.path.join(DIR_PATH, 'model_' + str(i) + '.jpg')) for i in range(1, 6)]
+    my_back_detector = BackProjectionColorDetector()
+    my_back_detector.setTemplate(template_list[0])
+    my_multi_detector = MultiBackProjectionColorDetector()
+    my_multi_detector.setTemplateList(template_list)
+    for frame_size in FRAME_SIZES:
+        print("=== " + str(frame_size[0]) + "x" + str(frame_size[1]) + " ===")
+        frame = cv2.resize(image, frame_size)
+        mask = np.empty(frame.shape, dtype=np.uint8)
+        my_back_detector.returnMask(frame, morph_opening=True, blur=True, kernel_size=5, iterations=2)
+        start = timer()
+        for _ in range(FRAMES):
+            my_back_detector.returnMask(frame, morph_opening=True, blur=True, kernel_size=5, iterations=2)
+        print("returnMask: " + str((timer() - start) / FRAMES) + " s")
+        start = timer()
+        for _ in range(FRAMES):
+            my_back_detector.returnMask(frame, morph_opening=True, blur=True, kernel_size=5, iterations=2, dst=mask)
+        print("returnMask (dst): " + str((timer() - start) / FRAMES) + " s")
+        single_mask = np.empty(frame.shape[0:2], dtype=np.uint8)
+        start = timer()
+        for _ in range(FRAMES):
+            my_back_detector.returnMask(frame, morph_opening=True, blur=True, kernel_size=5, iterations=2, single_channel=True, dst=single_mask)
+        print("returnMask (single channel, dst): " + str((timer() - start) / FRAMES) + " s")
+        start = timer()
+        for _ in range(FRAMES):
+            my_back_detector.returnMaskLUT(frame, threshold=50, single_channel=True, dst=single_mask)
+        print("returnMaskLUT (single channel, dst): " + str((timer() - start) / FRAMES) + " s")
+        for fused in [False, True]:
+            my_multi_detector.returnMask(frame, kernel_size=5, fused=fused, dst=mask)
+            start = timer()
+            for _ in range(FRAMES):
+                my_multi_detector.returnMask(frame, kernel_size=5, fused=fused, dst=mask)
+            print("multi returnMask (fused=" + str(fused) + "): " + str((timer() - start) / FRAMES) + " s")
+        mask_exact = my_multi_detector.returnMask(frame, kernel_size=5, fused=False)
+        mask_fused = my_multi_detector.returnMask(frame, kernel_size=5, fused=True)
+        print("multi fused difference: " + str(np.mean(mask_exact[:, :, 0] != mask_fused[:, :, 0])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of the HaarFaceDetector on a 1920x1080 grayscale frame made
+#of four copies of the example image. The five passes (frontal, rotated
+#frontal, left and right profiles) are run one after another, in the pool
+#of threads, and in the pool of threads with overlapping tiles.
+#The last test searches a single face in the rotated images with a
+#list of angles from -90 to 90 degrees, with and without a time budget.
+
+import os
+import numpy as np
+import cv2
+from timeit import default_timer as timer
+from deepgaze.face_detection import HaarFaceDetector
+
+FRAMES = 10
+TILE_SIZE = 512
+TILE_OVERLAP = 256
+ROTATION_ANGLES = [15, -15, 30, -30, 45, -45, 60, -60, 75, -75, 90, -90]
+TIME_BUDGET = 0.1
+DIR_PATH = os.path.dirname(os.path.abspath(__file__))
+IMAGE_PATH = os.path.join(DIR_PATH, '..', 'ex_haar_face_detection', 'bellucci.jpg')
+FRONTAL_PATH = os.path.join(DIR_PATH, '..', '..', 'etc', 'xml', 'haarcascade_frontalface_alt.xml')
+PROFILE_PATH = os.path.join(DIR_PATH, '..', '..', 'etc', 'xml', 'haarcascade_profileface.xml')
+
+
+def main():
+    image = cv2.resize(cv2.imread(IMAGE_PATH, 0), (480, 1080))
+    frame = np.concatenate([image, image, image, image], axis=1)
+    my_face_detector = HaarFaceDetector(FRONTAL_PATH, PROFILE_PATH)
+    mode_list = [("sequential", False, 0), ("parallel", True, 0), ("parallel + tiles", True, TILE_SIZE)]
+    for name, parallel, tile_size in mode_list:
+        faces = my_face_detector.returnMultipleFacesPosition(frame, minSizeX=64, minSizeY=64, parallel=parallel,
+                                                             tileSize=tile_size, tileOverlap=TILE_OVERLAP)
+        start = timer()
+        for _ in range(FRAMES):
+            my_face_detector.returnMultipleFacesPosition(frame, minSizeX=64, minSizeY=64, parallel=parallel,
+                                                         tileSize=tile_size, tileOverlap=TILE_OVERLAP)
+        print(name + ": " + str((timer() - start) / FRAMES) + " s, faces: " + str(len(faces)))
+    my_face_detector.close()
+    #The face is rotated by 90 degrees, it can not be found by the frontal classifier
+    rotated_image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    for time_budget in [None, TIME_BUDGET]:
+        start = timer()
+        for _ in range(FRAMES):
+            face = my_face_detector.returnFacePosition(rotated_image, runLeft=False, runRight=False, minSizeX=64, minSizeY=64,
+                                                       rotationAngles=ROTATION_ANGLES, timeBudget=time_budget)
+        print("rotated (time budget " + str(time_budget) + "): " + str((timer() - start) / FRAMES) + " s, face: " +
+              str(face) + ", angle: " + str(my_face_detector.face_angle))
+
+
+if __name__ == "__main__":
+    main()
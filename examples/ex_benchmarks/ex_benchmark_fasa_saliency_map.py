@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2017 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Per-stage benchmark of the FASA saliency map on 640x480 and 1920x1080 frames.
+#The frames are obtained resizing one of the images in the ex_fasa_saliency_map
+#folder. The last stage (per-pixel lookup) is compared against the old
+#per-pixel loop, which is only run once because it takes seconds on HD frames.
+#The streaming API is timed on a sequence of frames with a small amount of noise,
+#recomputing the distance matrices at every frame and reusing them.
+
+import os
+import numpy as np
+import cv2
+from timeit import default_timer as timer
+from deepgaze.saliency_map import FasaSaliencyMapping
+
+REPETITIONS = 10
+STREAM_FRAMES = 30
+RANGE_TOLERANCE = 2.0
+RESOLUTIONS = [(640, 480), (1920, 1080)]
+IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ex_fasa_saliency_map", "horse.jpg")
+
+
+def loop_fill_salient_image(my_map):
+    """The per-pixel loop used before the vectorised lookup.
+
+    """
+    salient_image = np.zeros((my_map.image_rows, my_map.image_cols), dtype=np.uint8)
+    it = np.nditer(salient_image, flags=['multi_index'], op_flags=['writeonly'])
+    while not it.finished:
+        index = my_map.image_quantized[it.multi_index[0], it.multi_index[1]]
+        index = my_map.map_3d_1d[index[0], index[1], index[2]]
+        it[0] = my_map.saliency[index]
+        it.iternext()
+    return salient_image
+
+
+def main():
+    image_original = cv2.imread(IMAGE_PATH)
+    if image_original is None:
+        print("Error: impossible to load the image " + IMAGE_PATH)
+        return
+    for width, height in RESOLUTIONS:
+        image = cv2.resize(image_original, (width, height))
+        image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        my_map = FasaSaliencyMapping(height, width)
+        stages = [("cvtColor", lambda: cv2.cvtColor(image, cv2.COLOR_BGR2LAB)),
+                  ("calculate_histogram", lambda: my_map._calculate_histogram(image_lab, tot_bins=8)),
+                  ("precompute_parameters", my_map._precompute_parameters),
+                  ("bilateral_filtering", my_map._bilateral_filtering),
+                  ("calculate_probability", my_map._calculate_probability),
+                  ("compute_saliency_map", my_map._compute_saliency_map),
+                  ("fill_salient_image", my_map._fill_salient_image)]
+        timings = dict((name, list()) for name, _ in stages)
+        for _ in range(REPETITIONS):
+            for name, stage in stages:
+                start = timer()
+                stage()
+                timings[name].append(timer() - start)
+        print("=== " + str(width) + "x" + str(height) + " (" + str(my_map.number_of_colors) + " colours) ===")
+        total = 0.0
+        for name, _ in stages:
+            stage_time = np.median(timings[name])
+            total += stage_time
+            print("%-24s %.6f seconds" % (name, stage_time))
+        print("%-24s %.6f seconds (%.1f FPS)" % ("total", total, 1.0 / total))
+        start = timer()
+        salient_image_loop = loop_fill_salient_image(my_map)
+        loop_time = timer() - start
+        print("%-24s %.6f seconds (old per-pixel loop, x%.0f slower)"
+              % ("fill_salient_image", loop_time, loop_time / np.median(timings["fill_salient_image"])))
+        print("Same output: " + str(np.array_equal(salient_image_loop, my_map.salient_image)))
+        # Streaming API on noisy copies of the frame (the set of colours changes at every frame)
+        noise = np.random.randint(-2, 3, size=(STREAM_FRAMES,) + image.shape)
+        frames = np.clip(image + noise, 0, 255).astype(np.uint8)
+        for range_tolerance in [None, RANGE_TOLERANCE]:
+            start = timer()
+            for _ in my_map.returnMaskStream(frames, tot_bins=8, format='BGR2LAB', range_tolerance=range_tolerance):
+                pass
+            stream_time = (timer() - start) / STREAM_FRAMES
+            print("%-24s %.6f seconds per frame (%.1f FPS, range_tolerance=%s)"
+                  % ("returnMaskStream", stream_time, 1.0 / stream_time, str(range_tolerance)))
+        print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of the import time of the deepgaze modules.
+#Each module is imported in a fresh python process (numpy and cv2 are
+#imported before starting the timer) and the script checks that the heavy
+#libraries (tensorflow, dlib) are not loaded at import time. The cost of
+#importing tensorflow and dlib is printed as a reference, it is the time
+#that was paid by every worker before the lazy imports.
+
+import os
+import sys
+import subprocess
+
+REPETITIONS = 5
+
+MODULES = ["deepgaze.saliency_map", "deepgaze.motion_detection", "deepgaze.motion_tracking",
+           "deepgaze.color_detection", "deepgaze.color_classification", "deepgaze.mask_analysis",
+           "deepgaze.face_detection", "deepgaze.face_landmark_detection",
+           "deepgaze.head_pose_estimation", "deepgaze.cnn_head_pose_estimator"]
+
+HEAVY_MODULES = ["tensorflow", "dlib"]
+
+CODE = """
+import sys
+import numpy, cv2
+from timeit import default_timer as timer
+start = timer()
+import %s
+end = timer()
+print(end - start)
+print(' '.join(m for m in %r if m in sys.modules))
+"""
+
+def time_import(module_name):
+    """Return the median import time and the heavy modules loaded."""
+    times = list()
+    loaded = ""
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(REPETITIONS):
+            output = subprocess.check_output([sys.executable, "-c", CODE % (module_name, HEAVY_MODULES)], stderr=devnull)
+            lines = output.decode("utf-8").strip().split("\n")
+            times.append(float(lines[0]))
+            if(len(lines) > 1): loaded = lines[1]
+    times.sort()
+    return times[len(times) // 2], loaded
+
+def main():
+    print("%-36s %12s   %s" % ("module", "import (ms)", "heavy modules loaded"))
+    for module_name in MODULES:
+        try:
+            import_time, loaded = time_import(module_name)
+        except subprocess.CalledProcessError:
+            print("%-36s %12s" % (module_name, "error"))
+            continue
+        print("%-36s %12.2f   %s" % (module_name, import_time * 1000.0, loaded if loaded else "-"))
+    print("")
+    print("Reference cost of the heavy modules:")
+    for module_name in HEAVY_MODULES:
+        try:
+            import_time, _ = time_import(module_name)
+            print("%-36s %12.2f" % (module_name, import_time * 1000.0))
+        except subprocess.CalledProcessError:
+            print("%-36s %12s" % (module_name, "not installed"))
+
+if __name__ == "__main__":
+    main()
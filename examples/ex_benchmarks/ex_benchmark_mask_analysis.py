@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of the BinaryMaskAnalyser on masks with a growing number of blobs.
+#The number of contours, the rectangle and the centre of the largest blob
+#are returned with three calls of the analyser (the contours are found
+#three times) and with a single call to analyse().
+#The second part compares the contours and the connected components engines
+#on the 1080p motion masks returned by the Mog2MotionDetector on the cars
+#video, with and without minimum area and downsampling.
+#The last part returns the blob arrays of masks with blobs moving by a few pixels
+#and associates them between frames with the BlobAssociator. The blobs never
+#overlap and never leave the frame, so a new ID after the first frame is an error.
+
+import os
+import numpy as np
+import cv2
+from timeit import default_timer as timer
+from deepgaze.mask_analysis import BinaryMaskAnalyser
+from deepgaze.mask_analysis import BlobAssociator
+from deepgaze.motion_detection import Mog2MotionDetector
+
+FRAME_SIZE = (1080, 1920)
+BLOBS = [10, 100, 1000]
+FRAMES = 50
+VIDEO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ex_motion_detectors_comparison_video', 'cars.avi')
+VIDEO_FRAMES = 100
+#engine, min_area, downsample
+TRACKING_BLOBS = 100
+ENGINE_LIST = [('contours', 0, 1), ('components', 0, 1), ('components', 100, 1), ('components', 100, 2), ('components', 100, 4)]
+
+
+def return_random_mask(blobs_number):
+    """Return a binary mask with random circular blobs.
+
+    """
+    mask = np.zeros(FRAME_SIZE, dtype=np.uint8)
+    for _ in range(blobs_number):
+        center = (int(np.random.randint(0, FRAME_SIZE[1])), int(np.random.randint(0, FRAME_SIZE[0])))
+        cv2.circle(mask, center, int(np.random.randint(2, 40)), 255, -1)
+    return mask
+
+
+def return_moving_masks(blobs_number, frames_number):
+    """Return a list of masks with circular blobs moving on a grid.
+
+    """
+    rows = int(np.ceil(np.sqrt(blobs_number)))
+    step_y = FRAME_SIZE[0] // (rows + 1)
+    step_x = FRAME_SIZE[1] // (rows + 1)
+    center_array = np.array([((i % rows + 1) * step_x, (i // rows + 1) * step_y) for i in range(blobs_number)], dtype=np.float64)
+    velocity_array = np.random.uniform(-0.5, 0.5, size=(blobs_number, 2))
+    radius = max(2, min(step_x, step_y) // 4)
+    mask_list = list()
+    for t in range(frames_number):
+        mask = np.zeros(FRAME_SIZE, dtype=np.uint8)
+        for cx, cy in center_array + velocity_array * t:
+            cv2.circle(mask, (int(cx), int(cy)), radius, 255, -1)
+        mask_list.append(mask)
+    return mask_list
+
+
+def main():
+    my_mask_analyser = BinaryMaskAnalyser()
+    for blobs_number in BLOBS:
+        print("=== " + str(blobs_number) + " blobs ===")
+        mask = return_random_mask(blobs_number)
+        start = timer()
+        for _ in range(FRAMES):
+            my_mask_analyser.returnNumberOfContours(mask)
+            my_mask_analyser.returnMaxAreaRectangle(mask)
+            my_mask_analyser.returnMaxAreaCenter(mask)
+        print("three calls: " + str((timer() - start) / FRAMES) + " s")
+        start = timer()
+        for _ in range(FRAMES):
+            mask_analysis = my_mask_analyser.analyse(mask)
+            mask_analysis.returnNumberOfContours()
+            mask_analysis.returnMaxAreaRectangle()
+            mask_analysis.returnMaxAreaCenter()
+        print("analyse: " + str((timer() - start) / FRAMES) + " s")
+    print("=== Mog2 motion masks ===")
+    my_motion_detector = Mog2MotionDetector()
+    video_capture = cv2.VideoCapture(VIDEO_PATH)
+    mask_list = list()
+    while(len(mask_list) < VIDEO_FRAMES):
+        ret, frame = video_capture.read()
+        if(frame is None): break
+        mask_list.append(my_motion_detector.returnMask(frame))
+    video_capture.release()
+    print("frames: " + str(len(mask_list)) + ", size: " + str(mask_list[0].shape))
+    for engine, min_area, downsample in ENGINE_LIST:
+        my_mask_analyser = BinaryMaskAnalyser(engine=engine, min_area=min_area, downsample=downsample)
+        blobs_number = 0
+        start = timer()
+        for mask in mask_list:
+            mask_analysis = my_mask_analyser.analyse(mask)
+            blobs_number += mask_analysis.returnNumberOfContours()
+            mask_analysis.returnMaxAreaRectangle()
+            mask_analysis.returnMaxAreaCenter()
+        print(engine + " (min_area=" + str(min_area) + ", downsample=" + str(downsample) + "): " +
+              str((timer() - start) / len(mask_list)) + " s, blobs per frame: " + str(blobs_number / float(len(mask_list))))
+    print("=== Blob association (" + str(TRACKING_BLOBS) + " blobs) ===")
+    mask_list = return_moving_masks(TRACKING_BLOBS, FRAMES)
+    my_mask_analyser = BinaryMaskAnalyser(engine='contours')
+    start = timer()
+    blob_array_list = [my_mask_analyser.returnBlobArray(mask, min_area=10) for mask in mask_list]
+    print("returnBlobArray: " + str((timer() - start) / FRAMES) + " s")
+    for method, threshold in [('iou', 0.3), ('distance', 20.0)]:
+        my_blob_associator = BlobAssociator(method=method, threshold=threshold)
+        start = timer()
+        for blob_array in blob_array_list:
+            my_blob_associator.update(blob_array)
+        new_ids = my_blob_associator.next_id - blob_array_list[0].size
+        print("BlobAssociator (" + method + "): " + str((timer() - start) / FRAMES) + " s, new IDs after the first frame: " + str(new_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of a full predict/update/estimate/resample step when tracking
+#multiple targets. One ParticleFilter object per target is compared against
+#a single MultiParticleFilter containing all the targets.
+
+import numpy as np
+from timeit import default_timer as timer
+from deepgaze.motion_tracking import ParticleFilter
+from deepgaze.motion_tracking import MultiParticleFilter
+
+WIDTH = 1920
+HEIGHT = 1080
+PARTICLES = [300, 3000]
+TARGETS = [1, 10, 50]
+STEPS = 20
+STD = 25
+
+
+def main():
+    for N, T in [(N, T) for N in PARTICLES for T in TARGETS]:
+        x_measured = np.random.uniform(0, WIDTH, size=T)
+        y_measured = np.random.uniform(0, HEIGHT, size=T)
+        particle_filter_list = [ParticleFilter(WIDTH, HEIGHT, N) for _ in range(T)]
+        start = timer()
+        for _ in range(STEPS):
+            for i, my_particle in enumerate(particle_filter_list):
+                my_particle.predict(x_velocity=0, y_velocity=0, std=STD)
+                my_particle.estimate()
+                my_particle.update(x_measured[i], y_measured[i])
+                my_particle.resample()
+        time_single = (timer() - start) / STEPS
+        my_multi_particle = MultiParticleFilter(WIDTH, HEIGHT, N)
+        for _ in range(T): my_multi_particle.addTarget()
+        start = timer()
+        for _ in range(STEPS):
+            my_multi_particle.predict(x_velocity=0, y_velocity=0, std=STD)
+            my_multi_particle.estimate()
+            my_multi_particle.update(x_measured, y_measured)
+            my_multi_particle.resample()
+        time_multi = (timer() - start) / STEPS
+        print("%5d particles, %3d targets: ParticleFilter list %.6f seconds, MultiParticleFilter %.6f seconds (x%.1f)"
+              % (N, T, time_single, time_multi, time_single / time_multi))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Benchmark of the resampling methods of the ParticleFilter class.
+#Each method is compared against the previous (loop based) implementation
+#for different numbers of particles. The generator of the filter and the
+#generator of the loop implementation are seeded in the same way, for 'multinomal', 'stratified' and
+#'systematic' the resampled particles must be identical. The old 'residual'
+#method used the weights instead of N*weights for the fractional part, for
+#this method the script prints the largest difference between the average
+#number of copies of each particle and its expected value N*w.
+
+import numpy as np
+from timeit import default_timer as timer
+from deepgaze.motion_tracking import ParticleFilter
+
+WIDTH = 640
+HEIGHT = 480
+PARTICLES = [1000, 5000, 20000]
+METHODS = ['multinomal', 'residual', 'stratified', 'systematic']
+REPETITIONS = 20
+
+
+def loop_resample_indices(weights, method, generator):
+    """The resampling indices as returned by the previous implementation.
+
+    The random numbers are drawn from the given generator, in the same
+    order of ParticleFilter.resample.
+    """
+    N = len(weights)
+    if(method == 'multinomal'):
+        cumulative_sum = np.cumsum(weights)
+        cumulative_sum[-1] = 1.
+        indices = np.searchsorted(cumulative_sum, generator.uniform(low=0.0, high=1.0, size=N))
+    elif(method == 'residual'):
+        indices = np.zeros(N, dtype=np.int32)
+        num_copies = (N*np.asarray(weights)).astype(int)
+        k = 0
+        for i in range(N):
+            for _ in range(num_copies[i]):
+                indices[k] = i
+                k += 1
+        residual = weights - num_copies
+        residual /= sum(residual)
+        cumulative_sum = np.cumsum(residual)
+        cumulative_sum[-1] = 1.
+        indices[k:N] = np.searchsorted(cumulative_sum, generator.random(N-k))
+    else:
+        if(method == 'stratified'):
+            positions = (generator.random(N) + range(N)) / N
+        else:
+            positions = (np.arange(N) + generator.random()) / N
+        indices = np.zeros(N, dtype=np.int32)
+        cumulative_sum = np.cumsum(weights)
+        i, j = 0, 0
+        while i < N:
+            if positions[i] < cumulative_sum[j]:
+                indices[i] = j
+                i += 1
+            else:
+                j += 1
+    return indices
+
+
+def main():
+    for N in PARTICLES:
+        print("=== N = " + str(N) + " ===")
+        my_particle = ParticleFilter(WIDTH, HEIGHT, N)
+        my_particle.update(WIDTH/2, HEIGHT/2)
+        weights = np.copy(my_particle.weights)
+        #The X coord of each particle is replaced with its index, in this
+        #way the resampled particles give back the resampling indices
+        particles = np.zeros((N, 2))
+        particles[:, 0] = np.arange(N)
+        for method in METHODS:
+            time_loop = 0.0
+            time_vectorised = 0.0
+            copies_loop = np.zeros(N)
+            copies_vectorised = np.zeros(N)
+            for repetition in range(REPETITIONS):
+                generator = np.random.default_rng(repetition)
+                start = timer()
+                indices = loop_resample_indices(np.copy(weights), method, generator)
+                time_loop += timer() - start
+                my_particle.particles[:] = particles
+                my_particle.weights[:] = weights
+                my_particle.generator = np.random.default_rng(repetition)
+                start = timer()
+                my_particle.resample(method)
+                time_vectorised += timer() - start
+                indices_vectorised = my_particle.particles[:, 0].astype(int)
+                copies_loop += np.bincount(indices, minlength=N)
+                copies_vectorised += np.bincount(indices_vectorised, minlength=N)
+                if(method != 'residual' and not np.array_equal(indices, indices_vectorised)):
+                    print("Error: the particles resampled with '" + method + "' are different")
+            print("%-12s loop %.6f seconds, vectorised %.6f seconds (x%.1f)"
+                  % (method, time_loop / REPETITIONS, time_vectorised / REPETITIONS, time_loop / time_vectorised))
+            if(method == 'residual'):
+                print("%-12s max |copies - N*w|: loop %.3f, vectorised %.3f"
+                      % ("", np.amax(np.absolute(copies_loop / REPETITIONS - N * weights)),
+                         np.amax(np.absolute(copies_vectorised / REPETITIONS - N * weights))))
+        print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#In this example the roll, pitch and yaw networks are frozen in a single
+#constant-folded graph. The checkpoints are loaded only once, then the frozen
+#file can be loaded by any process with load_frozen_graph(), without
+#variables initialisation and without a Saver (fast cold start).
+
+import os
+from timeit import default_timer as timer
+import tensorflow as tf
+import cv2
+from deepgaze.head_pose_estimation import CnnHeadPoseEstimator
+
+FROZEN_FILE_PATH = os.path.realpath("../../etc/tensorflow/head_pose/head_pose_frozen.pb")
+
+def main():
+    #Freeze the graph using the checkpoints
+    sess = tf.Session()
+    my_head_pose_estimator = CnnHeadPoseEstimator(sess)
+    my_head_pose_estimator.load_roll_variables(os.path.realpath("../../etc/tensorflow/head_pose/roll/cnn_cccdd_30k.tf"))
+    my_head_pose_estimator.load_pitch_variables(os.path.realpath("../../etc/tensorflow/head_pose/pitch/cnn_cccdd_30k.tf"))
+    my_head_pose_estimator.load_yaw_variables(os.path.realpath("../../etc/tensorflow/head_pose/yaw/cnn_cccdd_30k.tf"))
+    my_head_pose_estimator.export_frozen_graph(FROZEN_FILE_PATH)
+    print("The frozen graph has been saved in: " + FROZEN_FILE_PATH)
+
+    #Load the frozen graph in a new session and check the output
+    start = timer()
+    frozen_sess = tf.Session(graph=tf.Graph())
+    my_frozen_estimator = CnnHeadPoseEstimator(frozen_sess)
+    my_frozen_estimator.load_frozen_graph(FROZEN_FILE_PATH)
+    end = timer()
+    print("Frozen graph loaded in %s seconds" % (end - start))
+    image = cv2.imread(os.path.realpath("../ex_cnn_head_pose_axes/1.jpg"))
+    print("Checkpoint [roll, pitch, yaw] ..... " + str(my_head_pose_estimator.return_roll_pitch_yaw(image)))
+    print("Frozen     [roll, pitch, yaw] ..... " + str(my_frozen_estimator.return_roll_pitch_yaw(image)))
+
+if __name__ == "__main__":
+    main()
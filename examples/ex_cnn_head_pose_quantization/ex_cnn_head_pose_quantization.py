@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#In this example the head pose networks are quantized (int8 and float16)
+#and an accuracy-delta report is printed. The quantized networks are compared
+#against the float networks on a held-out set of face images. The held-out
+#set must be a folder of square face crops (>= 64 pixel), the same input
+#given to the estimator by the other examples; the images which are not
+#square are skipped instead of being distorted.
+#The float weights must be exported first with export_variables(), for example:
+#
+#   my_head_pose_estimator = CnnHeadPoseEstimator(sess)
+#   my_head_pose_estimator.load_roll_variables(...)
+#   my_head_pose_estimator.load_pitch_variables(...)
+#   my_head_pose_estimator.load_yaw_variables(...)
+#   my_head_pose_estimator.export_variables("head_pose.npz")
+#
+#Usage: python ex_cnn_head_pose_quantization.py head_pose.npz held_out_folder
+
+import os
+import sys
+import glob
+from timeit import default_timer as timer
+import numpy as np
+import cv2
+from deepgaze.head_pose_estimation import CnnHeadPoseEstimator
+
+def load_estimator(file_path):
+    estimator = CnnHeadPoseEstimator(backend='numpy')
+    estimator.load_roll_variables(file_path)
+    estimator.load_pitch_variables(file_path)
+    estimator.load_yaw_variables(file_path)
+    return estimator
+
+def main():
+    if(len(sys.argv) < 3):
+        print("Usage: python ex_cnn_head_pose_quantization.py head_pose.npz held_out_folder")
+        return
+    float_file_path = sys.argv[1]
+    held_out_folder = sys.argv[2]
+
+    #Load the held-out set, the images are given to the estimator as they are
+    #(it resizes them to 64x64), only square faces >= 64 pixel are accepted
+    image_list = list()
+    for file_name in sorted(glob.glob(os.path.join(held_out_folder, "*.jpg")) + glob.glob(os.path.join(held_out_folder, "*.png"))):
+        image = cv2.imread(file_name)
+        if(image is None): continue
+        h, w, d = image.shape
+        if(h != w or h < 64):
+            print("Skipping " + file_name + " (" + str(w) + "x" + str(h) + "), the face must be square and >= 64 pixel")
+            continue
+        image_list.append(image)
+    print("Held-out images ..... " + str(len(image_list)))
+    if(len(image_list) == 0):
+        print("The held-out folder does not contain any valid image")
+        return
+
+    float_estimator = load_estimator(float_file_path)
+    start = timer()
+    float_angles = float_estimator.return_roll_pitch_yaw_batch(image_list)
+    float_time = timer() - start
+
+    print("")
+    print("precision | size (MB) | time (s) | mean abs delta [roll, pitch, yaw] | max abs delta [roll, pitch, yaw]")
+    print("float32   | %9.2f | %8.4f | %s | %s" % (os.path.getsize(float_file_path) / 1e6, float_time, "-", "-"))
+    for precision in ('float16', 'int8'):
+        quantized_file_path = os.path.splitext(float_file_path)[0] + "_" + precision + ".npz"
+        float_estimator.export_quantized_variables(quantized_file_path, precision=precision)
+        quantized_estimator = load_estimator(quantized_file_path)
+        start = timer()
+        quantized_angles = quantized_estimator.return_roll_pitch_yaw_batch(image_list)
+        quantized_time = timer() - start
+        delta = np.abs(quantized_angles - float_angles)
+        print("%-9s | %9.2f | %8.4f | %s | %s" % (precision, os.path.getsize(quantized_file_path) / 1e6, quantized_time,
+                                                  np.array2string(np.mean(delta, axis=0), precision=3),
+                                                  np.array2string(np.amax(delta, axis=0), precision=3)))
+
+if __name__ == "__main__":
+    main()
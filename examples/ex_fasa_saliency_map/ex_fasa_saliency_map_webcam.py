@@ -11,6 +11,8 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 # In this example the FASA algorithm is used in order to process the webcam stream.
+# The frames are given to the streaming API (returnMaskStream) which reuses the buffers
+# and the colour distance matrices between consecutive frames.
 
 import numpy as np
 import cv2
@@ -25,14 +27,34 @@ PRINT_TIME = False
 RESOLUTION_WIDTH = 320
 RESOLUTION_HEIGHT = 180
 
+# Max shift of the quantization ranges for reusing the distance matrices (None = always recompute)
+RANGE_TOLERANCE = 2.0
+
+
+def read_frames(video_capture):
+    """Generator returning the frames of the video capture.
+
+    """
+    while True:
+        start = timer()
+        ret, frame = video_capture.read()
+        if ret == False:
+            break
+        yield frame
+        end = timer()
+        # Print the time for processing the frame
+        if PRINT_TIME:
+            print("--- %s Tot seconds ---" % (end - start))
+            print("")
+
 def main():
     # Open the video stream and set the webcam resolution.
     # It may give problem if your webcam does not support the particular resolution used.
     video_capture = cv2.VideoCapture(0)
-    video_capture.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, RESOLUTION_WIDTH)
-    video_capture.set(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, RESOLUTION_HEIGHT)
-    print video_capture.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH)
-    print video_capture.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT)
+    video_capture.set(3, RESOLUTION_WIDTH)
+    video_capture.set(4, RESOLUTION_HEIGHT)
+    print(video_capture.get(3))
+    print(video_capture.get(4))
 
     if(video_capture.isOpened() == False):
         print("Error: the resource is busy or unvailable")
@@ -51,16 +73,8 @@ def main():
     # Defining the FASA object using the camera resolution
     my_map = FasaSaliencyMapping(cam_h, cam_w)
 
-    while True:
-        start = timer()
-        # Capture frame-by-frame
-        ret, frame = video_capture.read()
-        image_salient = my_map.returnMask(frame, tot_bins=8, format='BGR2LAB')
-        end = timer()
-        # Print the time for processing the frame
-        if PRINT_TIME: 
-            print("--- %s Tot seconds ---" % (end - start))
-            print("")
+    for image_salient in my_map.returnMaskStream(read_frames(video_capture), tot_bins=8, format='BGR2LAB',
+                                                 range_tolerance=RANGE_TOLERANCE):
         cv2.imshow('Video', image_salient)
         # Press Q to exit
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#In this example the Particle Filter is updated directly with the Backprojection of a template.
+#Differently from ex_particle_filter_object_tracking_video.py the contour with the largest
+#area is not used. The Backprojection is computed only in the rectangle containing the
+#particles (blue rectangle), and each particle is scored with the mean of the Backprojection
+#inside a box centred on the particle (updateFromMap).
+
+#COLOR CODE:
+#BLUE: the region of the frame where the Backprojection is evaluated.
+#GREEN: the point estimated from the Particle Filter.
+#RED: the particles generated by the filter.
+
+import cv2
+from deepgaze.color_detection import BackProjectionColorDetector
+from deepgaze.motion_tracking import ParticleFilter
+
+template = cv2.imread('template.png') #Load the image
+video_capture = cv2.VideoCapture("./cows.avi")
+
+#Defining the deepgaze color detector object
+my_back_detector = BackProjectionColorDetector()
+my_back_detector.setTemplate(template) #Set the template 
+
+#Filter parameters
+tot_particles = 3000
+#Standard deviation which represent how to spread the particles
+#in the prediction phase.
+std = 25
+#Size of the box used to score each particle
+box_size = 15
+#Pixels added around the particles when evaluating the Backprojection
+margin = 50
+my_particle = ParticleFilter(1920, 1080, tot_particles)
+
+while(True):
+
+    # Capture frame-by-frame
+    ret, frame = video_capture.read()
+    if(frame is None): break #check for empty frames
+
+    #Predict the position of the target
+    my_particle.predict(x_velocity=0, y_velocity=0, std=std)
+
+    #Backprojection only in the neighbourhood of the particles
+    x_roi, y_roi, w_roi, h_roi = my_particle.returnParticlesBoundingBox(margin=margin)
+    roi = frame[y_roi:y_roi+h_roi, x_roi:x_roi+w_roi]
+    #The region is empty when all the particles are outside the frame
+    roi_is_valid = roi.shape[0] > 0 and roi.shape[1] > 0
+    if(roi_is_valid == True):
+        roi_mask = my_back_detector.returnMask(roi, morph_opening=True, blur=True, kernel_size=5, iterations=2)
+        cv2.rectangle(frame, (x_roi,y_roi), (x_roi+roi.shape[1],y_roi+roi.shape[0]), [255,0,0], 2) #BLUE rect
+
+    #Drawing the particles.
+    my_particle.drawParticles(frame)
+
+    #Estimate the next position using the internal model
+    x_estimated, y_estimated, _, _ = my_particle.estimate()
+    cv2.circle(frame, (x_estimated, y_estimated), 3, [0,255,0], 5) #GREEN dot
+
+    #Update the filter with the Backprojection of the region
+    #and resample the particles (only if there is a region)
+    if(roi_is_valid == True):
+        my_particle.updateFromMap(roi_mask[:, :, 0], box_width=box_size, box_height=box_size, x_offset=x_roi, y_offset=y_roi)
+        my_particle.resample()
+
+    #Showing the frame and waiting
+    #for the exit command
+    cv2.imshow('Original', frame) #show on window
+    if cv2.waitKey(1) & 0xFF == ord('q'): break #Exit when Q is pressed
+
+#Release the camera
+video_capture.release()
+print("Bye...")
@@ -67,12 +67,14 @@ while(True):
     #Return the binary mask from the backprojection algorithm
     frame_mask = my_back_detector.returnMask(frame, morph_opening=True, blur=True, kernel_size=5, iterations=2)
 
-    if(my_mask_analyser.returnNumberOfContours(frame_mask) > 0):
+    #Find the contours only once and read all the properties from the result
+    mask_analysis = my_mask_analyser.analyse(frame_mask)
+    if(mask_analysis.returnNumberOfContours() > 0):
         #Use the binary mask to find the contour with largest area
         #and the center of this contour which is the point we
         #want to track with the particle filter
-        x_rect,y_rect,w_rect,h_rect = my_mask_analyser.returnMaxAreaRectangle(frame_mask)
-        x_center, y_center = my_mask_analyser.returnMaxAreaCenter(frame_mask)
+        x_rect,y_rect,w_rect,h_rect = mask_analysis.returnMaxAreaRectangle()
+        x_center, y_center = mask_analysis.returnMaxAreaCenter()
         #Adding noise to the coords
         coin = np.random.uniform()
         if(coin >= 1.0-noise_probability): 
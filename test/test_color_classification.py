@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT)
+#Copyright (c) 2016 Massimiliano Patacchiola
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
+#MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
+#CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
+#SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from deepgaze.color_classification import HistogramColorClassifier
+
+
+def return_random_image(size, seed):
+    """Return an image made of random colours.
+
+    """
+    generator = np.random.RandomState(seed)
+    return generator.randint(0, 256, size=(size, size, 3)).astype(np.uint8)
+
+
+class TestHistogramColorClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_empty_load_add(self):
+        file_prefix = os.path.join(self.directory, 'models')
+        HistogramColorClassifier().saveModels(file_prefix)
+        my_classifier = HistogramColorClassifier()
+        my_classifier.loadModels(file_prefix)
+        self.assertEqual(my_classifier.returnSize(), 0)
+        for i in range(3):
+            my_classifier.addModelHistogram(return_random_image(16, i), name='model_' + str(i))
+        self.assertEqual(my_classifier.returnSize(), 3)
+        self.assertEqual(my_classifier.returnBestMatchName(return_random_image(16, 1)), 'model_1')
+
+    def test_save_empty_load_add_with_index(self):
+        file_prefix = os.path.join(self.directory, 'models')
+        my_classifier = HistogramColorClassifier()
+        my_classifier.buildApproximateIndex(projection_size=8)
+        my_classifier.saveModels(file_prefix)
+        my_classifier = HistogramColorClassifier()
+        my_classifier.loadModels(file_prefix)
+        for i in range(3):
+            my_classifier.addModelHistogram(return_random_image(16, i), name='model_' + str(i))
+        names, values = my_classifier.returnTopMatches(return_random_image(16, 2), k=1, approximate=True, candidates_number=3)
+        self.assertEqual(list(names), ['model_2'])
+
+
+if __name__ == "__main__":
+    unittest.main()